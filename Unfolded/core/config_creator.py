@@ -23,30 +23,42 @@ import datetime
 import json
 import locale
 import logging
+import os
 import tempfile
 import time
+import tracemalloc
 import uuid
 import zipfile
 from functools import partial
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Set, Iterable
 from zipfile import ZipFile
 
 from PyQt5.QtCore import pyqtSignal, QObject
 from PyQt5.QtGui import QColor
-from qgis.core import (QgsVectorLayer, QgsApplication, QgsPointXY)
+from qgis.core import (QgsVectorLayer, QgsApplication, QgsPointXY, QgsRectangle, QgsCoordinateReferenceSystem,
+                       QgsCoordinateTransform, QgsProject, QgsRenderContext)
 
 from .exceptions import InvalidInputException
+from .export_profile import ExportProfile, EXPORT_PROFILE_FILE_NAME
+from .processing.base_config_creator_task import BaseConfigCreatorTask
+from .processing.dataset_archive import DatasetArchive
 from .processing.layer2dataset import LayerToDatasets
 from .processing.layer2layer_config import LayerToLayerConfig
+from .processing.layer_snapshot import LayerSnapshot
+from .processing.process_export import ProcessExporter, ProcessLayerToDatasets
+from .processing.task_scheduler import TaskScheduler
+from .utils import zoom_level_to_tolerance
+from ..definitions.settings import Settings
 from ..model.map_config import (MapConfig, MapState, MapStyle, Layer,
                                 ConfigConfig, Config, Info)
 from ..model.map_config import (VisState, InteractionConfig, AnimationConfig, Datasets,
                                 FieldDisplayNames, AnyDict, VisibleLayerGroups, Globe, Tooltip, FieldsToShow, Brush,
-                                Coordinate, Dataset)
+                                Coordinate, Dataset, UnfoldedDataset)
+from ..model.map_config_writer import write_map_config
 from ..qgis_plugin_tools.tools.custom_logging import bar_msg
 from ..qgis_plugin_tools.tools.i18n import tr
-from ..qgis_plugin_tools.tools.resources import plugin_name, resources_path
+from ..qgis_plugin_tools.tools.resources import plugin_name
 
 ENGLISH_LOCALE = 'en_US.utf8'
 
@@ -61,7 +73,7 @@ class ConfigCreator(QObject):
 
     UNFOLDED_CONFIG_FILE_NAME = 'config.json'
 
-    progress_bar_changed = pyqtSignal([int, int])
+    progress_bar_changed = pyqtSignal([int, int, str])
     finished = pyqtSignal(dict)
     canceled = pyqtSignal()
     completed = pyqtSignal()
@@ -89,8 +101,26 @@ class ConfigCreator(QObject):
         self._interaction_config_values = {}
         self._map_state: Optional[MapState] = None
         self._map_style: Optional[MapStyle] = None
-        self._temp_dir_obj = tempfile.TemporaryDirectory(dir=resources_path())
-        self._temp_dir = Path(self._temp_dir_obj.name)
+        # Extent in the crs of the datasets
+        self._extent: Optional[QgsRectangle] = None
+        self._clip_to_extent = False
+
+        # Datasets are streamed into the zip file unless they are staged in a temporary directory. Staged datasets are
+        # added to the zip file as soon as their task is completed.
+        self._archive: Optional[DatasetArchive] = DatasetArchive(self.created_configuration_path)
+        self._base_configuration: Optional[Path] = None
+        self._base_datasets: Dict[str, Dataset] = {}
+        self._reused_datasets: Dict[uuid.UUID, Dataset] = {}
+        self._scheduler: Optional[TaskScheduler] = None
+        self._exporter: Optional[ProcessExporter] = None
+        self._profile = ExportProfile()
+        self._profile_destination = Settings.export_profile.get()
+        self._tracing_memory = False
+        self._temp_dir_obj: Optional[tempfile.TemporaryDirectory] = None
+        self._temp_dir: Optional[Path] = None
+        if Settings.stage_datasets.get():
+            self._temp_dir_obj = tempfile.TemporaryDirectory()
+            self._temp_dir = Path(self._temp_dir_obj.name)
 
     def __enter__(self, *args):
         return self
@@ -99,9 +129,18 @@ class ConfigCreator(QObject):
         self.__cleanup()
 
     def __cleanup(self):
-        """ Remove temporary directory """
+        """ Remove temporary directory and incomplete output """
         LOGGER.debug("Cleaning up")
-        self._temp_dir_obj.cleanup()
+        # Archive stops reading the staged datasets before they are removed
+        if self._archive is not None:
+            self._archive.discard()
+        if self._exporter is not None:
+            self._exporter.shutdown()
+        if self._temp_dir_obj is not None:
+            self._temp_dir_obj.cleanup()
+        if self._tracing_memory:
+            tracemalloc.stop()
+            self._tracing_memory = False
 
     def _validate_inputs(self):
         """ Validate user given input """
@@ -125,7 +164,27 @@ class ConfigCreator(QObject):
             self.canceled.emit()
             raise InvalidInputException(error_message_title, bar_msg=bar_msg_)
 
-    def set_animation_config(self, current_time: any = None, speed: int = AnimationConfig.speed):
+    def _preflight(self) -> None:
+        """
+        Convert the styles and map the field types of every layer before any data is extracted. All problems are
+        reported at once and no task is started if there are any.
+        """
+        LOGGER.info('Checking layers')
+        problems = []
+        with self._profile.stage(None, 'preflight'):
+            for task_dict in self.tasks.values():
+                task = task_dict['task']
+                try:
+                    task.preflight()
+                except Exception as e:
+                    problems.append(f'{task.layer.name()}: {e}')
+        if problems:
+            # noinspection PyUnresolvedReferences
+            self.canceled.emit()
+            raise InvalidInputException(tr('{} problems found in the layers', len(problems)),
+                                        bar_msg=bar_msg('\n'.join(problems)))
+
+    def set_animation_config(self, current_time: any = None, speed: int = AnimationConfig.DEFAULT_SPEED):
         """ Set animation configuration with current time and speed """
         try:
             self._vis_state_values['animation_config'] = AnimationConfig(current_time, speed)
@@ -151,7 +210,7 @@ class ConfigCreator(QObject):
                                            "tooltip_enabled": tooltip_enabled}
 
     def set_map_state(self, center: QgsPointXY, zoom: float, bearing: int = 0, drag_rotate: bool = False,
-                      pitch: int = 0, is_split: bool = False, map_view_mode: str = MapState.map_view_mode):
+                      pitch: int = 0, is_split: bool = False, map_view_mode: str = MapState.DEFAULT_MAP_VIEW_MODE):
         """ Set map state values """
 
         try:
@@ -160,22 +219,68 @@ class ConfigCreator(QObject):
         except Exception as e:
             raise InvalidInputException(tr('Check the map state configuration values'), bar_msg=bar_msg(e))
 
+    def set_extent(self, extent: QgsRectangle, crs: QgsCoordinateReferenceSystem, clip: bool = False) -> None:
+        """
+        Export only the features intersecting the extent. Should be called before the layers are added.
+        :param crs: Crs of the extent
+        :param clip: Whether lines and polygons are clipped to the extent
+        """
+        if extent.isNull() or extent.isEmpty():
+            raise InvalidInputException(tr('Extent is empty'), bar_msg=bar_msg(tr('Choose a valid extent')))
+        # noinspection PyArgumentList
+        transform = QgsCoordinateTransform(crs, QgsCoordinateReferenceSystem(Settings.crs.get()),
+                                           QgsProject.instance().transformContext())
+        try:
+            self._extent = transform.transformBoundingBox(extent)
+        except Exception as e:
+            raise InvalidInputException(tr('Could not transform the extent'), bar_msg=bar_msg(e))
+        self._clip_to_extent = clip
+
     def set_map_style(self, style_type: str):
         """ Set map style values """
         try:
-            self._map_style = MapStyle(style_type, MapStyle.top_layer_groups, VisibleLayerGroups.create_default(),
-                                       MapStyle.three_d_building_color, MapStyle.map_styles)
+            self._map_style = MapStyle(style_type, MapStyle.DEFAULT_TOP_LAYER_GROUPS,
+                                       VisibleLayerGroups.create_default(), MapStyle.DEFAULT_THREE_D_BUILDING_COLOR,
+                                       MapStyle.DEFAULT_MAP_STYLES)
         except Exception as e:
             raise InvalidInputException(tr('Check the map style configuration values'), bar_msg=bar_msg(e))
 
-    def add_layer(self, layer_uuid: uuid.UUID, layer: QgsVectorLayer, layer_color: QColor, is_visible: bool):
-        """ Add layer to the config creation """
-        color = (layer_color.red(), layer_color.green(), layer_color.blue())
-        output_dir = self._temp_dir
-        self.layers[layer_uuid] = layer
-        self.tasks[uuid.uuid4()] = {'task': LayerToDatasets(layer_uuid, layer, color, output_dir), 'finished': False}
-        self.tasks[uuid.uuid4()] = {'task': LayerToLayerConfig(layer_uuid, layer, is_visible), 'finished': False}
+    def set_base_configuration(self, configuration_path: Path) -> None:
+        """
+        Reuse the datasets of an existing exported configuration. Only the layer configurations are created and the
+        dataset files are copied to the new configuration as they are. Should be called before adding the layers.
+        """
+        try:
+            with ZipFile(configuration_path) as zip_file:
+                map_config = MapConfig.from_dict(
+                    json.loads(zip_file.read(self.UNFOLDED_CONFIG_FILE_NAME).decode('utf-8')))
+        except Exception as e:
+            raise InvalidInputException(tr('Could not read the existing configuration {}', configuration_path),
+                                        bar_msg=bar_msg(e))
+        # Datasets are matched to the layers by their labels, which are the names of the layers
+        labels = [dataset.data.label for dataset in map_config.datasets]
+        duplicate_labels = sorted({label for label in labels if labels.count(label) > 1})
+        if duplicate_labels:
+            raise InvalidInputException(tr('Layer names {} are not unique in the existing configuration',
+                                           ', '.join(duplicate_labels)),
+                                        bar_msg=bar_msg(tr('Export the whole map to update it')))
+        self._base_configuration = configuration_path
+        self._base_datasets = {dataset.data.label: dataset for dataset in map_config.datasets}
+        # Output is written only after the layer configurations are ready
+        self._archive = None
+
+    def add_layer(self, layer_uuid: uuid.UUID, layer: QgsVectorLayer, layer_color: QColor, is_visible: bool,
+                  selected_fields: Iterable[str] = ()):
+        """
+        Add layer to the config creation. If a base configuration is set, the layer is identified by the id of its
+        existing dataset instead of the given uuid.
 
+        Everything the tasks need from the layer is copied here in the main thread, so that the tasks never use the
+        layer itself.
+
+        :param selected_fields: Names of the fields exported in addition to the used ones if only the used attributes
+        are exported
+        """
         # Save information about shown fields based
         shown_fields = []
         for column in layer.attributeTableConfig().columns():
@@ -183,24 +288,108 @@ class ConfigCreator(QObject):
             if name:
                 if not column.hidden:
                     shown_fields.append(name)
+
+        snapshot = LayerSnapshot(layer)
+        if self._base_configuration is not None:
+            dataset = self._base_datasets.get(layer.name())
+            if dataset is None:
+                raise InvalidInputException(tr('Layer {} is not in the existing configuration', layer.name()),
+                                            bar_msg=bar_msg(tr('Export the whole map to add new layers')))
+            layer_uuid = dataset.data.id
+            if layer_uuid in self._reused_datasets:
+                raise InvalidInputException(tr('Layer name {} is not unique', layer.name()),
+                                            bar_msg=bar_msg(tr('Rename the layers or export the whole map')))
+            self.layers[layer_uuid] = layer
+            self._reused_datasets[layer_uuid] = dataset
+        else:
+            color = (layer_color.red(), layer_color.green(), layer_color.blue())
+            self.layers[layer_uuid] = layer
+            archive = self._archive if self._temp_dir is None else None
+            attribute_names = self._get_exported_attribute_names(layer, shown_fields, selected_fields)
+            if self._use_worker_process(layer):
+                self._add_task(ProcessLayerToDatasets(layer_uuid, layer, color, self._get_exporter(), self._temp_dir,
+                                                      self._get_simplification_tolerance(), archive, snapshot,
+                                                      self._extent, self._clip_to_extent, attribute_names))
+            else:
+                self._add_task(LayerToDatasets(layer_uuid, layer, color, self._temp_dir,
+                                               self._get_simplification_tolerance(), archive, snapshot,
+                                               self._extent, self._clip_to_extent, attribute_names))
+        self._add_task(LayerToLayerConfig(layer_uuid, layer, is_visible, snapshot))
+
         self._shown_fields[str(layer_uuid)] = shown_fields
 
+    @staticmethod
+    def _get_exported_attribute_names(layer: QgsVectorLayer, shown_fields: List[str],
+                                      selected_fields: Iterable[str]) -> Optional[Set[str]]:
+        """
+        Get the names of the attributes written to the dataset, None if all attributes are written
+        """
+        if Settings.attribute_projection.get() == 'all':
+            return None
+        attribute_names = set(shown_fields) | set(selected_fields)
+        renderer = layer.renderer()
+        if renderer is not None:
+            # Includes the class attribute and the fields used in the expressions of the renderer
+            attribute_names |= set(renderer.usedAttributes(QgsRenderContext()))
+        LOGGER.debug(f'Exporting {len(attribute_names)} of {len(layer.fields())} attributes of layer {layer.name()}')
+        return attribute_names
+
+    @staticmethod
+    def _use_worker_process(layer: QgsVectorLayer) -> bool:
+        """ Whether the dataset of the layer is written in a worker process, other layers fall back to the tasks """
+        return (Settings.export_engine.get() == 'processes' and ProcessExporter.is_available()
+                and ProcessExporter.supports(layer))
+
+    def _get_exporter(self) -> ProcessExporter:
+        if self._exporter is None:
+            self._exporter = ProcessExporter(Settings.max_dataset_tasks.get() or os.cpu_count() or 1)
+        return self._exporter
+
+    def _add_task(self, task: BaseConfigCreatorTask) -> None:
+        task.profile = self._profile
+        self.tasks[uuid.uuid4()] = {'task': task, 'finished': False}
+
+    def _start_profiling(self) -> None:
+        """ Trace the memory usage of the stages if the profile of the export is written """
+        if self._profile_destination != 'off' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing_memory = True
+
+    def _get_simplification_tolerance(self) -> Optional[float]:
+        """ Get the tolerance used to simplify lines and polygons based on the simplification settings """
+        simplification = Settings.simplification.get()
+        if simplification == 'tolerance':
+            return Settings.simplification_tolerance.get()
+        elif simplification == 'zoom' and self._map_state is not None:
+            return zoom_level_to_tolerance(self._map_state.zoom)
+        return None
+
     def start_config_creation(self) -> None:
-        """ Start config creation using background processing tasks """
+        """ Start config creation using background processing tasks submitted by the task scheduler """
 
         self._validate_inputs()
+        self._start_profiling()
+        self._preflight()
         LOGGER.info('Started config creation')
         LOGGER.debug(f"Tasks are: {self.tasks}")
 
+        # noinspection PyArgumentList
+        self._scheduler = TaskScheduler(QgsApplication.taskManager().addTask, Settings.max_dataset_tasks.get(),
+                                        Settings.dataset_memory_budget.get() * 1024 * 1024)
         for task_id, task_dict in self.tasks.items():
-            # noinspection PyArgumentList
-            QgsApplication.taskManager().addTask(task_dict['task'])
-            task_dict['task'].progressChanged.connect(partial(self._progress_changed, task_id))
-            task_dict['task'].taskCompleted.connect(partial(self._task_completed, task_id))
-            task_dict['task'].taskTerminated.connect(partial(self._task_terminated, task_id))
+            task = task_dict['task']
+            if isinstance(task, LayerToDatasets):
+                self._scheduler.add_dataset_task(task, task.estimated_memory)
+            else:
+                self._scheduler.add_style_task(task)
+            task.progressChanged.connect(partial(self._progress_changed, task_id))
+            task.taskCompleted.connect(partial(self._task_completed, task_id))
+            task.taskTerminated.connect(partial(self._task_terminated, task_id))
+        self._scheduler.start()
 
     def abort(self) -> None:
         """ Aborts config creation manually """
+        self._cancel_queued_tasks()
         for task_id, task_dict in self.tasks.items():
             if not task_dict['finished'] and not task_dict['task'].isCanceled():
                 LOGGER.warning(f"Cancelling task {task_id}")
@@ -209,14 +398,17 @@ class ConfigCreator(QObject):
 
     def _progress_changed(self, task_id: uuid.UUID):
         """ Increments progress """
+        task = self.tasks[task_id]['task']
         # noinspection PyUnresolvedReferences
-        self.progress_bar_changed.emit(list(self.tasks.keys()).index(task_id), self.tasks[task_id]['task'].progress())
+        self.progress_bar_changed.emit(list(self.tasks.keys()).index(task_id), task.progress(), task.progress_status())
 
     def _task_completed(self, task_id: uuid.UUID) -> None:
         """ One of the background processing tasks if finished succesfully """
         LOGGER.debug(f"Task {task_id} completed!")
         self.tasks[task_id]['finished'] = True
         self.tasks[task_id]['successful'] = True
+        self._add_staged_dataset(self.tasks[task_id]['task'])
+        self._scheduler.task_finished(self.tasks[task_id]['task'])
         at_least_one_running = False
         for id_, task_dict in self.tasks.items():
             if id_ != task_id and not task_dict['finished']:
@@ -232,6 +424,7 @@ class ConfigCreator(QObject):
 
         LOGGER.warning(tr("Task {} terminated", task_id))
         self.tasks[task_id]['finished'] = True
+        self._cancel_queued_tasks()
         at_least_one_running = False
         for id_, task_dict in self.tasks.items():
             if id_ != task_id and not task_dict['finished'] and not task_dict['task'].isCanceled():
@@ -242,6 +435,21 @@ class ConfigCreator(QObject):
             # noinspection PyUnresolvedReferences
             self.canceled.emit()
 
+    def _add_staged_dataset(self, task: BaseConfigCreatorTask) -> None:
+        """ Start compressing the staged dataset of the completed task while the other tasks are running """
+        if self._temp_dir is not None and self._archive is not None and isinstance(task, LayerToDatasets):
+            source = task.result_dataset.source
+            self._archive.write_async(self._temp_dir / source, source)
+
+    def _cancel_queued_tasks(self) -> None:
+        """ Mark the tasks that were never submitted as finished so that only the running tasks are waited for """
+        if self._scheduler is None:
+            return
+        queued = self._scheduler.cancel_queued()
+        for task_dict in self.tasks.values():
+            if task_dict['task'] in queued:
+                task_dict['finished'] = True
+
     def _create_map_config(self):
         """ Generates map configuration file """
 
@@ -255,6 +463,9 @@ class ConfigCreator(QObject):
 
             layer_uuids = list(self.layers.keys())
 
+            for layer_uuid, dataset in self._reused_datasets.items():
+                datasets[layer_uuids.index(layer_uuid)] = dataset
+
             for id_, task_dict in self.tasks.items():
                 task = task_dict['task']
                 if isinstance(task, LayerToDatasets):
@@ -277,8 +488,8 @@ class ConfigCreator(QObject):
 
             tooltip = Tooltip(
                 FieldsToShow(AnyDict(tooltip_data)),
-                Tooltip.compare_mode,
-                Tooltip.compare_type,
+                Tooltip.DEFAULT_COMPARE_MODE,
+                Tooltip.DEFAULT_COMPARE_TYPE,
                 self._interaction_config_values["tooltip_enabled"]
             )
 
@@ -289,12 +500,15 @@ class ConfigCreator(QObject):
             vis_state = VisState(layers=layers, datasets=self._extract_datasets(),
                                  interaction_config=interaction_config, **self._vis_state_values)
 
-            config = Config(Config.version, ConfigConfig(vis_state, self._map_state, self._map_style))
+            config = Config(Config.DEFAULT_VERSION, ConfigConfig(vis_state, self._map_state, self._map_style))
             info = self._create_config_info()
 
             map_config = MapConfig(datasets, config, info)
 
-            self._write_output(map_config)
+            with self._profile.stage(None, 'write output') as stage:
+                self._write_output(map_config)
+                stage.bytes_written = self.created_configuration_path.stat().st_size
+            self._write_profile()
 
             LOGGER.info(tr('Configuration created successfully'),
                         extra=bar_msg(tr('The file can be found in {}', str(self.created_configuration_path)),
@@ -313,16 +527,37 @@ class ConfigCreator(QObject):
     def _write_output(self, map_config):
         """ Write the configuration as a ZIP file"""
 
-        config_file = self._temp_dir / self.UNFOLDED_CONFIG_FILE_NAME
-        with open(config_file, 'w') as f:
-            json.dump(map_config.to_dict(), f)
-
-        # Create a zip for the configuration and datasets
-        with ZipFile(self.created_configuration_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            zip_file.write(config_file, config_file.name)
-            # Add multiple files to the zip
-            for dataset in map_config.datasets:
-                zip_file.write(self._temp_dir / dataset.source, dataset.source)
+        if self._base_configuration is not None:
+            self._write_output_with_base_datasets(map_config)
+            return
+
+        # Datasets are already in the archive or being compressed
+        with self._archive.open(self.UNFOLDED_CONFIG_FILE_NAME) as entry:
+            write_map_config(map_config, entry)
+        self._archive.close()
+
+    def _write_output_with_base_datasets(self, map_config):
+        """ Write the configuration as a ZIP file with the dataset files copied from the base configuration """
+
+        # Base configuration is usually the file that is overwritten, which happens only when the archive is closed
+        dataset_files = [dataset.source for dataset in map_config.datasets if isinstance(dataset, UnfoldedDataset)]
+        self._archive = DatasetArchive(self.created_configuration_path)
+        with self._archive.open(self.UNFOLDED_CONFIG_FILE_NAME) as entry:
+            write_map_config(map_config, entry)
+        self._archive.copy_entries(self._base_configuration, dataset_files)
+        self._archive.close()
+
+    def _write_profile(self) -> None:
+        """ Log a summary of each layer and write the profile of the export if it is enabled """
+        for layer in self.layers.values():
+            LOGGER.info(self._profile.layer_summary(layer.name()))
+        if self._profile_destination == 'archive':
+            with ZipFile(self.created_configuration_path, 'a', zipfile.ZIP_DEFLATED, allowZip64=True) as zip_file:
+                zip_file.writestr(EXPORT_PROFILE_FILE_NAME, self._profile.to_json())
+        elif self._profile_destination == 'file':
+            profile_path = self.created_configuration_path.with_name(
+                f'{self.created_configuration_path.stem}_{EXPORT_PROFILE_FILE_NAME}')
+            profile_path.write_text(self._profile.to_json(), encoding='utf-8')
 
     def _create_config_info(self):
         """ Create info for the configuration """
@@ -333,20 +568,23 @@ class ConfigCreator(QObject):
         timestamp = datetime.datetime.now().strftime('%a %b %d %Y %H:%M:%S ')
         time_zone = time.strftime('%Z%z')
         created_at = timestamp + time_zone
-        source = Info.source
+        source = Info.DEFAULT_SOURCE
 
-        return Info(Info.app, created_at, self.title, self.description, source)
+        return Info(Info.DEFAULT_APP, created_at, self.title, self.description, source)
 
     def _start_config_creation(self) -> None:
         """ This method runs the config creation in one thread. Mainly meant for testing """
 
         LOGGER.info(tr('Started config creation'))
 
+        self._start_profiling()
+        self._preflight()
         for id_, task_dict in self.tasks.items():
             task = task_dict['task']
             success = task.run()
             if not success:
                 raise task.exception
+            self._add_staged_dataset(task)
         self._create_map_config()
 
     def _extract_datasets(self) -> Datasets:
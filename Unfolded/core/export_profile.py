@@ -0,0 +1,102 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+EXPORT_PROFILE_FILE_NAME = 'export_profile.json'
+
+
+class StageProfile:
+    """ Measurements of one stage of an export """
+
+    __slots__ = ('layer', 'stage', 'wall_time', 'cpu_time', 'rows', 'bytes_written', 'peak_memory')
+
+    def __init__(self, layer: Optional[str], stage: str):
+        """
+        :param layer: Name of the layer, None for the stages of the whole export
+        """
+        self.layer = layer
+        self.stage = stage
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.rows = 0
+        self.bytes_written = 0
+        # Traced only if tracemalloc is running
+        self.peak_memory: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ExportProfile:
+    """
+    Wall time, cpu time, rows, bytes written and peak traced memory of the stages of an export.
+
+    Stages may be recorded from multiple tasks at the same time. Cpu time is the time of the thread running the stage.
+    Peak memory is traced for the whole process, so it is only approximate for the stages running in parallel.
+    """
+
+    def __init__(self):
+        self.stages: List[StageProfile] = []
+        self._start_time = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, layer: Optional[str], stage: str) -> Iterator[StageProfile]:
+        """ Measure the stage, the rows and the bytes written are set by the caller """
+        profile = StageProfile(layer, stage)
+        tracing = tracemalloc.is_tracing()
+        if tracing and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        wall_time, cpu_time = time.perf_counter(), time.thread_time()
+        try:
+            yield profile
+        finally:
+            profile.wall_time = time.perf_counter() - wall_time
+            profile.cpu_time = time.thread_time() - cpu_time
+            if tracing:
+                profile.peak_memory = tracemalloc.get_traced_memory()[1]
+            with self._lock:
+                self.stages.append(profile)
+
+    def layer_stages(self, layer: Optional[str]) -> List[StageProfile]:
+        with self._lock:
+            return [stage for stage in self.stages if stage.layer == layer]
+
+    def layer_summary(self, layer: str) -> str:
+        """ Get a one line summary of the stages of the layer """
+        stages = self.layer_stages(layer)
+        rows = sum(stage.rows for stage in stages)
+        bytes_written = sum(stage.bytes_written for stage in stages)
+        wall_time = sum(stage.wall_time for stage in stages)
+        details = ', '.join(f'{stage.stage} {stage.wall_time:.2f} s' for stage in stages)
+        return (f'{layer}: {rows} rows, {bytes_written / 1024 / 1024:.1f} MB in {wall_time:.2f} s '
+                f'({details})')
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = [stage.to_dict() for stage in self.stages]
+        return {'total_time': time.perf_counter() - self._start_time, 'stages': stages}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
@@ -0,0 +1,214 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import csv
+import io
+import json
+import mmap
+import struct
+import zipfile
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from zipfile import ZipFile, ZipInfo
+
+try:
+    import pyarrow as pa
+
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+from ..model.map_config import MapConfig, Dataset, OldDataset
+
+CONFIG_FILE_NAME = 'config.json'
+ROW_BATCH_SIZE = 10000
+
+# Csv values are parsed based on the type of the field, values of the other types are kept as strings
+_CSV_PARSERS: Dict[str, Callable[[str], Any]] = {
+    'integer': int,
+    'real': float,
+    'boolean': lambda value: value == 'true',
+}
+
+RowBatch = List[List[Any]]
+
+# Local file header of a zip entry: signature, versions, flags, compression, times, crc, sizes and the lengths of
+# the file name and the extra field that precede the data of the entry
+LOCAL_FILE_HEADER = struct.Struct('<4s5H3L2H')
+LOCAL_FILE_HEADER_SIGNATURE = b'PK\x03\x04'
+
+
+class MapArchiveReader:
+    """
+    Reads an exported map zip file.
+
+    Only config.json is parsed when the reader is created. The rows of a dataset are read a batch at a time when they
+    are iterated, so reading one dataset never decompresses the others. Entries stored without compression are read
+    through a memory map of the zip file instead of being copied into memory.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._zip_file = ZipFile(path)
+        self._file: Optional[io.BufferedReader] = None
+        self._mmap: Optional[mmap.mmap] = None
+        try:
+            self.map_config = MapConfig.from_dict(json.loads(self._zip_file.read(CONFIG_FILE_NAME).decode('utf-8')))
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self) -> 'MapArchiveReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Rows of a stored entry are still being iterated, the map is closed when the iterator is released
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._zip_file.close()
+
+    @property
+    def datasets(self) -> List[Dataset]:
+        return self.map_config.datasets
+
+    def get_dataset(self, label: str) -> Dataset:
+        """ Get the dataset with the label """
+        for dataset in self.datasets:
+            if dataset.data.label == label:
+                return dataset
+        raise KeyError(label)
+
+    def field_names(self, dataset: Dataset) -> List[str]:
+        return [field.name for field in dataset.data.fields]
+
+    def iter_rows(self, dataset: Dataset, field_names: Optional[List[str]] = None,
+                  batch_size: int = ROW_BATCH_SIZE) -> Iterator[RowBatch]:
+        """
+        Iterate the rows of the dataset in batches of at most batch_size rows.
+
+        :param dataset: Dataset of the map configuration
+        :param field_names: Names of the fields to read, all fields by default
+        :param batch_size: Maximum number of rows in a batch
+        """
+        if isinstance(dataset, OldDataset):
+            indices = self._field_indices(self.field_names(dataset), field_names)
+            yield from _batched(([row[i] for i in indices] for row in dataset.data.all_data), batch_size)
+        elif dataset.source.endswith('.arrow'):
+            yield from self._iter_arrow_rows(dataset, field_names, batch_size)
+        else:
+            yield from self._iter_csv_rows(dataset, field_names, batch_size)
+
+    def _iter_csv_rows(self, dataset: Dataset, field_names: Optional[List[str]],
+                       batch_size: int) -> Iterator[RowBatch]:
+        field_types = {field.name: field.type for field in dataset.data.fields}
+        with self._open_entry(dataset.source) as entry, \
+                io.TextIOWrapper(entry, encoding='utf-8', newline='') as text:
+            reader = csv.reader(text)
+            header = next(reader)
+            indices = self._field_indices(header, field_names)
+            parsers = [_CSV_PARSERS.get(field_types.get(header[i]), str) for i in indices]
+            rows = ([None if row[i] == '' else parse(row[i]) for i, parse in zip(indices, parsers)]
+                    for row in reader)
+            yield from _batched(rows, batch_size)
+
+    def _iter_arrow_rows(self, dataset: Dataset, field_names: Optional[List[str]],
+                         batch_size: int) -> Iterator[RowBatch]:
+        if not ARROW_AVAILABLE:
+            raise RuntimeError(f'pyarrow is required to read {dataset.source}')
+        info = self._zip_file.getinfo(dataset.source)
+        if info.compress_type == zipfile.ZIP_STORED:
+            buffer = pa.py_buffer(self._map_entry(info))
+        else:
+            # Arrow file is read from the end, so a compressed entry is decompressed once into memory
+            buffer = pa.py_buffer(self._zip_file.read(info))
+        reader = pa.ipc.open_file(buffer)
+        indices = self._field_indices(reader.schema.names, field_names)
+        for i in range(reader.num_record_batches):
+            record_batch = reader.get_batch(i)
+            for offset in range(0, record_batch.num_rows, batch_size):
+                batch = record_batch.slice(offset, batch_size)
+                columns = [batch.column(j).to_pylist() for j in indices]
+                yield [list(row) for row in zip(*columns)]
+
+    @staticmethod
+    def _field_indices(names: List[str], field_names: Optional[List[str]]) -> List[int]:
+        if field_names is None:
+            return list(range(len(names)))
+        try:
+            return [names.index(name) for name in field_names]
+        except ValueError:
+            raise KeyError(f'Dataset has no fields {set(field_names) - set(names)}')
+
+    def _open_entry(self, name: str) -> io.BufferedIOBase:
+        info = self._zip_file.getinfo(name)
+        if info.compress_type == zipfile.ZIP_STORED:
+            return io.BufferedReader(_MemoryReader(self._map_entry(info)))
+        return self._zip_file.open(info)
+
+    def _map_entry(self, info: ZipInfo) -> memoryview:
+        """ Get the contents of a stored entry as a view to the memory map of the zip file """
+        if self._mmap is None:
+            self._file = open(self.path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header_end = info.header_offset + LOCAL_FILE_HEADER.size
+        signature, *_, name_length, extra_length = LOCAL_FILE_HEADER.unpack(self._mmap[info.header_offset:header_end])
+        if signature != LOCAL_FILE_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(f'Bad local file header of {info.filename}')
+        start = header_end + name_length + extra_length
+        return memoryview(self._mmap)[start:start + info.file_size]
+
+
+class _MemoryReader(io.RawIOBase):
+    """ Readable stream of a memory view that copies only the requested bytes """
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), len(self._view) - self._position)
+        buffer[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def close(self) -> None:
+        self._view.release()
+        super().close()
+
+
+def _batched(rows: Iterable[List[Any]], batch_size: int) -> Iterator[RowBatch]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
@@ -23,6 +23,7 @@ from PyQt5.QtCore import QVariant
 from qgis.core import (QgsTask, QgsField)
 
 from ..exceptions import ProcessInterruptedException
+from ..export_profile import ExportProfile
 from ...model.map_config import Field
 from ...qgis_plugin_tools.tools.custom_logging import bar_msg
 from ...qgis_plugin_tools.tools.exceptions import QgsPluginException, QgsPluginNotImplementedException
@@ -44,6 +45,8 @@ class BaseConfigCreatorTask(QgsTask):
     def __init__(self, description: str):
         super().__init__(description, QgsTask.CanCancel)
         self.exception: Optional[Exception] = None
+        # Replaced with the profile of the whole export by the config creator
+        self.profile = ExportProfile()
 
     def _qgis_field_to_unfolded_field(self, field: QgsField) -> Field:
         """
@@ -75,13 +78,23 @@ class BaseConfigCreatorTask(QgsTask):
         elif field_type == QVariant.Time:
             type_, analyzer_type = ('timestamp', 'INT')
             format_ = 'H:m:s'
-        # elif field_type == QVariant.ByteArray:
-        #     type, analyzer_type = ('integer', 'INT')
+        elif field_type == QVariant.ByteArray and field_name == self.GEOM_FIELD:
+            type_, analyzer_type = ('geoarrow', 'GEOMETRY')
         else:
             raise QgsPluginNotImplementedException(tr('Field type "{}" not implemented yet', field_type))
 
         return Field(field_name, type_, format_, analyzer_type)
 
+    def preflight(self) -> None:
+        """
+        Check in the main thread that the layer can be exported before the task is started. Nothing is read from the
+        layer features, so the check is fast. Raises an exception describing the problem.
+        """
+
+    def progress_status(self) -> str:
+        """ Get a short description of the progress shown to the user, empty if there is nothing to add """
+        return ''
+
     def _check_if_canceled(self) -> None:
         """ Check if the task has been canceled """
         if self.isCanceled():
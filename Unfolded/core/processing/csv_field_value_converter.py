@@ -17,36 +17,41 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
 from PyQt5.QtCore import QVariant
-from qgis.core import (QgsVectorFileWriter, QgsVectorLayer, QgsField)
+from qgis.core import (QgsVectorFileWriter, QgsFields, QgsField, NULL)
 
 
 class CsvFieldValueConverter(QgsVectorFileWriter.FieldValueConverter):
     """
-    Converts boolean fields to string fields containing true, false or empty string.
+    Converts boolean fields to string fields containing true, false or empty string and date and datetime
+    fields to string fields formatted in a way Unfolded Studio understands.
     """
 
-    def __init__(self, layer: QgsVectorLayer):
+    def __init__(self, fields: QgsFields):
         QgsVectorFileWriter.FieldValueConverter.__init__(self)
-        self.layer = layer
-        field_types = [field.type() for field in self.layer.fields()]
+        self.fields = fields
+        field_types = [field.type() for field in self.fields]
         self.bool_field_idxs = [i for i, field_type in enumerate(field_types) if field_type == QVariant.Bool]
         self.date_field_idxs = [i for i, field_type in enumerate(field_types) if field_type == QVariant.Date]
         self.datetime_field_idxs = [i for i, field_type in enumerate(field_types) if field_type == QVariant.DateTime]
 
     def convert(self, field_idx, value):
         if field_idx in self.bool_field_idxs:
-            if value is None:
+            if value is None or value == NULL:
                 return ""
             return "true" if value else "false"
         elif field_idx in self.date_field_idxs:
+            if value is None or value == NULL:
+                return value
             return value.toPyDate().strftime("%Y/%m/%d")
         elif field_idx in self.datetime_field_idxs:
+            if value is None or value == NULL:
+                return value
             return value.toPyDateTime().strftime("%Y/%m/%d %H:%M:%S")
         return value
 
     def fieldDefinition(self, field):
-        idx = self.layer.fields().indexFromName(field.name())
+        idx = self.fields.indexFromName(field.name())
 
-        if idx in self.bool_field_idxs:
+        if idx in self.bool_field_idxs + self.date_field_idxs + self.datetime_field_idxs:
             return QgsField(field.name(), QVariant.String)
-        return self.layer.fields()[idx]
+        return self.fields[idx]
@@ -0,0 +1,374 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import io
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, BinaryIO, Iterator, List, Dict, Callable, NamedTuple, Tuple
+from zipfile import ZipFile, ZipInfo
+
+from ..exceptions import ProcessInterruptedException
+from ...qgis_plugin_tools.tools.resources import plugin_name
+
+# This logger is safe to use inside the task
+LOGGER = logging.getLogger(f'{plugin_name()}_task')
+
+COPY_BUFFER_SIZE = 1024 * 1024
+# Entries are deflated in parallel, since zlib releases the GIL while compressing
+COMPRESSION_WORKERS = min(4, os.cpu_count() or 1)
+
+# Records of the zip file format. Sizes and offsets are always stored in the zip64 extra fields, since the sizes of
+# the entries are not known when they are opened.
+LOCAL_FILE_HEADER = struct.Struct('<4s5H3L2H')
+CENTRAL_DIRECTORY_HEADER = struct.Struct('<4s6H3L5H2L')
+ZIP64_LOCAL_EXTRA = struct.Struct('<2H2Q')
+ZIP64_CENTRAL_EXTRA = struct.Struct('<2H3Q')
+ZIP64_END_OF_CENTRAL_DIRECTORY = struct.Struct('<4sQ2H2L4Q')
+ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR = struct.Struct('<4sLQL')
+END_OF_CENTRAL_DIRECTORY = struct.Struct('<4s4H2LH')
+LOCAL_FILE_HEADER_SIGNATURE = b'PK\x03\x04'
+CENTRAL_DIRECTORY_HEADER_SIGNATURE = b'PK\x01\x02'
+ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE = b'PK\x06\x06'
+ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_SIGNATURE = b'PK\x06\x07'
+END_OF_CENTRAL_DIRECTORY_SIGNATURE = b'PK\x05\x06'
+ZIP64_EXTRA_ID = 0x0001
+ZIP64_VERSION = 45
+UNIX_SYSTEM = 3
+UTF8_FLAG = 0x800
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_ENTRY_LIMIT = 0xFFFF
+
+
+class _Member(NamedTuple):
+    """ Compressed entry waiting to be written into the zip file """
+    info: ZipInfo
+    # Compressed data of the entry starts at the offset of the file
+    data: BinaryIO
+    offset: int
+
+
+class DatasetArchive:
+    """
+    Output zip file of the configuration that the datasets are streamed into.
+
+    Entries are deflated into temporary files as they are written, so the tasks writing them compress their datasets
+    in parallel. Files of staged datasets are deflated by a pool of worker threads. A single writer thread appends
+    the compressed entries to the zip file in the order they were opened, so the order of the entries does not depend
+    on which one finished first.
+
+    The zip file is written to a temporary file next to the output, which replaces the output only when the archive
+    is closed, so an existing map is kept if the export fails or is canceled. The temporary file is created when the
+    first entry is written and removed if the archive is discarded before it is closed.
+    """
+
+    def __init__(self, path: Path, max_workers: int = COMPRESSION_WORKERS):
+        """
+        :param max_workers: Number of threads deflating the files of the staged datasets
+        """
+        self.path = path
+        self.temp_path = path.with_name(path.name + '.tmp')
+        self.max_workers = max_workers
+        self._file: Optional[BinaryIO] = None
+        self._members: List[ZipInfo] = []
+        # Held by the writer while an entry is written into the zip file
+        self._lock = threading.Lock()
+        # Held while an entry is queued, so that the entries are written in the order they were queued
+        self._queue_lock = threading.Lock()
+        self._compressor: Optional[ThreadPoolExecutor] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._compressions: List[Future] = []
+        self._writes: List[Future] = []
+        self._entry_sizes: Dict[str, int] = {}
+        self._completed = False
+        self._discarded = False
+
+    @contextmanager
+    def open(self, name: str) -> Iterator[BinaryIO]:
+        """ Open a new entry for writing. The entry is deflated as it is written. """
+        member = Future()
+        with self._queue_lock:
+            self._check_if_writable()
+            self._queue(member)
+        entry = _DeflatedEntry(self._is_discarded)
+        try:
+            yield entry
+            member.set_result(entry.finish(name))
+        except BaseException as e:
+            entry.discard()
+            member.set_exception(e)
+            raise
+        self._entry_sizes[name] = entry.size
+
+    def write(self, file: Path, name: str) -> None:
+        """ Copy the file to a new entry and wait until the file is deflated """
+        self.write_async(file, name).result()
+
+    def write_async(self, file: Path, name: str) -> Future:
+        """
+        Copy the file to a new entry in the background
+        :return: Future of the deflated entry. The file must exist until it is done.
+        """
+        source = open(file, 'rb')
+        self._entry_sizes[name] = os.fstat(source.fileno()).st_size
+        with self._queue_lock:
+            try:
+                self._check_if_writable()
+                if self._compressor is None:
+                    self._compressor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='DatasetArchive')
+                member = self._compressor.submit(_deflate, source, name, self._is_discarded)
+            except BaseException:
+                source.close()
+                raise
+            self._compressions.append(member)
+            self._queue(member)
+        return member
+
+    def copy_entries(self, source: Path, names: List[str]) -> None:
+        """
+        Copy entries from another zip file as they are. The compressed data is copied without recompressing it,
+        and the checksums and the sizes of the entries are taken from the source.
+        """
+        with ZipFile(source) as zip_file:
+            infos = [zip_file.getinfo(name) for name in names]
+        with self._queue_lock:
+            self._check_if_writable()
+            for info in infos:
+                member = Future()
+                member.set_result(_read_member(source, info))
+                self._queue(member)
+                self._entry_sizes[info.filename] = info.file_size
+
+    def entry_size(self, name: str) -> int:
+        """ Get the uncompressed size of a written entry """
+        return self._entry_sizes[name]
+
+    def flush(self) -> None:
+        """ Wait until the queued entries are in the zip file """
+        for future in list(self._writes):
+            future.result()
+
+    def close(self) -> None:
+        """ Wait for the queued entries and finish writing the zip file """
+        self.flush()
+        self._shutdown()
+        with self._lock:
+            self._check_if_writable()
+            file = self._get_file()
+            self._write_central_directory(file)
+            file.close()
+            self._file = None
+            os.replace(self.temp_path, self.path)
+            self._completed = True
+
+    def discard(self) -> None:
+        """
+        Remove the zip file if it was not completed. Entries that are being written stop at their next write, after
+        which the zip file is removed.
+        """
+        if self._completed:
+            return
+        self._discarded = True
+        with self._queue_lock:
+            for future in self._compressions + self._writes:
+                future.cancel()
+        self._shutdown()
+        with self._lock:
+            self._remove()
+
+    def _is_discarded(self) -> bool:
+        return self._discarded
+
+    def _check_if_writable(self) -> None:
+        if self._completed or self._discarded:
+            raise ProcessInterruptedException()
+
+    def _queue(self, member: Future) -> None:
+        """
+        Queue the future of a compressed entry to be written after the previously queued entries, should be called
+        while holding the queue lock
+        """
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(1, thread_name_prefix='DatasetArchiveWriter')
+        self._writes.append(self._writer.submit(self._write, member))
+
+    def _shutdown(self) -> None:
+        with self._queue_lock:
+            executors = [self._compressor, self._writer]
+            self._compressor = self._writer = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def _write(self, future: Future) -> None:
+        """ Wait until the entry is compressed and append it to the zip file """
+        member: _Member = future.result()
+        with member.data, self._lock:
+            self._check_if_writable()
+            LOGGER.debug(f'Writing {member.info.filename} to {self.path.name}')
+            self._write_member(self._get_file(), member)
+
+    def _get_file(self) -> BinaryIO:
+        if self._file is None:
+            self._file = open(self.temp_path, 'wb')
+        return self._file
+
+    def _write_member(self, file: BinaryIO, member: _Member) -> None:
+        """ Write the local header and the compressed data of the entry, should be called while holding the lock """
+        info = member.info
+        info.header_offset = file.tell()
+        name = info.filename.encode('utf-8')
+        file.write(LOCAL_FILE_HEADER.pack(LOCAL_FILE_HEADER_SIGNATURE, ZIP64_VERSION, UTF8_FLAG, info.compress_type,
+                                          *_dos_time_and_date(info.date_time), info.CRC, ZIP64_LIMIT, ZIP64_LIMIT,
+                                          len(name), ZIP64_LOCAL_EXTRA.size))
+        file.write(name)
+        file.write(ZIP64_LOCAL_EXTRA.pack(ZIP64_EXTRA_ID, ZIP64_LOCAL_EXTRA.size - 4, info.file_size,
+                                          info.compress_size))
+        member.data.seek(member.offset)
+        remaining = info.compress_size
+        while remaining:
+            self._check_if_writable()
+            data = member.data.read(min(remaining, COPY_BUFFER_SIZE))
+            if not data:
+                raise zipfile.BadZipFile(f'Truncated data of {info.filename}')
+            file.write(data)
+            remaining -= len(data)
+        self._members.append(info)
+
+    def _write_central_directory(self, file: BinaryIO) -> None:
+        """ Write the central directory and the end records, should be called while holding the lock """
+        start = file.tell()
+        for info in self._members:
+            name = info.filename.encode('utf-8')
+            file.write(CENTRAL_DIRECTORY_HEADER.pack(
+                CENTRAL_DIRECTORY_HEADER_SIGNATURE, UNIX_SYSTEM << 8 | ZIP64_VERSION, ZIP64_VERSION, UTF8_FLAG,
+                info.compress_type, *_dos_time_and_date(info.date_time), info.CRC, ZIP64_LIMIT, ZIP64_LIMIT,
+                len(name), ZIP64_CENTRAL_EXTRA.size, 0, 0, 0, info.external_attr, ZIP64_LIMIT))
+            file.write(name)
+            file.write(ZIP64_CENTRAL_EXTRA.pack(ZIP64_EXTRA_ID, ZIP64_CENTRAL_EXTRA.size - 4, info.file_size,
+                                                info.compress_size, info.header_offset))
+        end = file.tell()
+        count, size = len(self._members), end - start
+        file.write(ZIP64_END_OF_CENTRAL_DIRECTORY.pack(
+            ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE, ZIP64_END_OF_CENTRAL_DIRECTORY.size - 12,
+            UNIX_SYSTEM << 8 | ZIP64_VERSION, ZIP64_VERSION, 0, 0, count, count, size, start))
+        file.write(ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR.pack(ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_SIGNATURE, 0,
+                                                               end, 1))
+        file.write(END_OF_CENTRAL_DIRECTORY.pack(END_OF_CENTRAL_DIRECTORY_SIGNATURE, 0, 0,
+                                                 min(count, ZIP_ENTRY_LIMIT), min(count, ZIP_ENTRY_LIMIT),
+                                                 min(size, ZIP64_LIMIT), min(start, ZIP64_LIMIT), 0))
+
+    def _remove(self) -> None:
+        """ Remove the zip file, should be called while holding the lock """
+        if self._file is not None:
+            LOGGER.debug(f'Removing incomplete {self.temp_path.name}')
+            self._file.close()
+            self._file = None
+            self.temp_path.unlink()
+
+
+class _DeflatedEntry(io.BufferedIOBase):
+    """
+    Writable stream of an entry that deflates the written bytes into a temporary file and stops writing if the
+    archive is discarded
+    """
+
+    def __init__(self, is_discarded: Callable[[], bool]):
+        super().__init__()
+        self._is_discarded = is_discarded
+        self._file = tempfile.TemporaryFile()
+        # Raw deflate stream without the zlib header, as stored in zip files
+        self._compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._crc = 0
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self._is_discarded():
+            raise ProcessInterruptedException()
+        self._crc = zlib.crc32(data, self._crc)
+        self._file.write(self._compressor.compress(data))
+        size = memoryview(data).nbytes
+        self.size += size
+        return size
+
+    def finish(self, name: str) -> _Member:
+        """ Finish the compression and get the compressed entry """
+        self._file.write(self._compressor.flush())
+        info = ZipInfo(name, time.localtime(time.time())[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o600 << 16
+        info.CRC = self._crc
+        info.file_size = self.size
+        info.compress_size = self._file.tell()
+        return _Member(info, self._file, 0)
+
+    def discard(self) -> None:
+        """ Remove the compressed data of an entry that was not finished """
+        self._file.close()
+
+
+def _deflate(source: BinaryIO, name: str, is_discarded: Callable[[], bool]) -> _Member:
+    """ Deflate the source into a new entry """
+    with source:
+        entry = _DeflatedEntry(is_discarded)
+        try:
+            shutil.copyfileobj(source, entry, COPY_BUFFER_SIZE)
+            return entry.finish(name)
+        except BaseException:
+            entry.discard()
+            raise
+
+
+def _read_member(source: Path, info: ZipInfo) -> _Member:
+    """ Locate the compressed data of an entry of the source zip file """
+    data = open(source, 'rb')
+    try:
+        data.seek(info.header_offset)
+        signature, *_, name_length, extra_length = LOCAL_FILE_HEADER.unpack(data.read(LOCAL_FILE_HEADER.size))
+        if signature != LOCAL_FILE_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(f'Bad local file header of {info.filename}')
+    except BaseException:
+        data.close()
+        raise
+    # Sizes in the local header are not reliable if they follow the data, so the central directory is used
+    member_info = ZipInfo(info.filename, info.date_time)
+    member_info.compress_type = info.compress_type
+    member_info.external_attr = info.external_attr
+    member_info.CRC = info.CRC
+    member_info.file_size = info.file_size
+    member_info.compress_size = info.compress_size
+    offset = info.header_offset + LOCAL_FILE_HEADER.size + name_length + extra_length
+    return _Member(member_info, data, offset)
+
+
+def _dos_time_and_date(date_time: Tuple[int, ...]) -> Tuple[int, int]:
+    """ Get the time and the date in the MS-DOS format of the zip file headers """
+    year, month, day, hour, minute, second = date_time
+    return hour << 11 | minute << 5 | second // 2, max(year - 1980, 0) << 9 | month << 5 | day
@@ -0,0 +1,182 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Optional, List, Tuple, Dict, Any
+
+from qgis.core import QgsVectorLayer, QgsProviderRegistry, QgsFields
+
+from ...definitions.settings import Settings
+from ...qgis_plugin_tools.tools.i18n import tr
+from ...qgis_plugin_tools.tools.resources import plugin_name
+
+# This logger is safe to use inside the task
+LOGGER = logging.getLogger(f'{plugin_name()}_task')
+
+MEGABYTE = 1024 * 1024
+
+
+class DatasetCache:
+    """
+    Persistent on-disk cache of the dataset files.
+
+    Dataset files are keyed by the data source of the layer, its state and the export options. The least recently
+    used files are removed when the size of the cache exceeds its limit.
+    """
+
+    def __init__(self, directory: Path, max_size: int):
+        """
+        :param directory: Directory of the cache
+        :param max_size: Maximum size of the cache in bytes
+        """
+        self.directory = directory
+        self.max_size = max_size
+
+    @staticmethod
+    def from_settings() -> Optional['DatasetCache']:
+        """ Get the cache configured in the settings, None if the cache is disabled """
+        max_size = Settings.dataset_cache_size.get()
+        if max_size <= 0:
+            return None
+        return DatasetCache(Path(Settings.dataset_cache_dir.get()), max_size * MEGABYTE)
+
+    @staticmethod
+    def create_key(layer: QgsVectorLayer, options: Dict[str, Any]) -> Optional[str]:
+        """
+        Create a cache key for the layer. Should be called in the main thread.
+        :param layer: Layer to export
+        :param options: Export options affecting the contents of the dataset
+        :return: Cache key, None if the layer can not be cached
+        """
+        # Joined and virtual fields depend on more than the files of the layer
+        fields = layer.fields()
+        if layer.vectorJoins() or any(fields.fieldOrigin(i) != QgsFields.OriginProvider for i in range(fields.count())):
+            return None
+        data_signature = DatasetCache._data_signature(layer)
+        if data_signature is None:
+            return None
+        key = {
+            'source': layer.source(),
+            'provider': layer.providerType(),
+            'subset': layer.subsetString(),
+            'data': data_signature,
+            'fields': [(field.name(), field.type(), field.typeName()) for field in layer.fields()],
+            'crs': layer.crs().toWkt(),
+            'options': options,
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _data_signature(layer: QgsVectorLayer) -> Optional[List[Tuple[int, int]]]:
+        """
+        Get sizes and modification times of the files of the layer. Layers that are not file based or have
+        unsaved edits do not have a reliable signature.
+        """
+        if layer.isModified():
+            return None
+        # noinspection PyArgumentList
+        path = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source()).get('path')
+        if not path or not os.path.isfile(path):
+            return None
+        # Shapefiles and other multi-file formats keep parts of the data in files with the same name, and GeoPackage
+        # and SpatiaLite changes may still be in the write-ahead log. Shared memory index changes even when reading.
+        main_file = Path(path)
+        sidecar_files = sorted(file_path for file_path in glob.glob(glob.escape(str(main_file.with_suffix(''))) + '.*')
+                               if not file_path.startswith(path))
+        signature = []
+        for file_path in [path, path + '-wal'] + sidecar_files:
+            if os.path.exists(file_path):
+                stat = os.stat(file_path)
+                signature.append((stat.st_size, stat.st_mtime_ns))
+        return signature
+
+    def get(self, key: str, suffix: str) -> Optional[Path]:
+        """
+        Get the cached dataset file
+        :param key: Cache key
+        :param suffix: Suffix of the dataset file
+        :return: Path of the cached dataset file, None if not cached
+        """
+        cached_file = self.directory / f'{key}{suffix}'
+        try:
+            # Modification time of the file tracks its last use
+            os.utime(cached_file)
+            return cached_file
+        except OSError:
+            return None
+
+    def temporary_directory(self) -> tempfile.TemporaryDirectory:
+        """ Create a temporary directory in the cache directory for files that are later moved to the cache """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return tempfile.TemporaryDirectory(suffix='.tmp', dir=self.directory)
+
+    def put(self, key: str, dataset_file: Path, move: bool = False) -> None:
+        """
+        Add the dataset file to the cache and evict the least recently used files if needed
+        :param move: Whether to move the file instead of copying it. The file should be in the cache directory.
+        """
+        cached_file = self.directory / f'{key}{dataset_file.suffix}'
+        if cached_file.exists():
+            return
+        # File is copied under a temporary name first so that partial files are never used
+        temp_file = self.directory / f'{key}.{uuid.uuid4().hex}.tmp'
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if move:
+                os.replace(dataset_file, cached_file)
+            else:
+                shutil.copyfile(dataset_file, temp_file)
+                os.replace(temp_file, cached_file)
+        except OSError as e:
+            LOGGER.warning(tr('Could not add dataset to the cache: {}', e))
+            return
+        finally:
+            if temp_file.exists():
+                temp_file.unlink()
+        self.evict()
+
+    def evict(self) -> None:
+        """ Remove the least recently used files until the cache fits its size limit """
+        files = []
+        for path in self.directory.iterdir():
+            if path.suffix == '.tmp' or not path.is_file():
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total_size <= self.max_size:
+                break
+            LOGGER.debug(f'Evicting dataset {path.name} from the cache')
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total_size -= size
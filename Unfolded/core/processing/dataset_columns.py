@@ -0,0 +1,215 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import logging
+import math
+from array import array
+from bisect import bisect_left
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Union
+
+from PyQt5.QtCore import QVariant
+from qgis.core import QgsField
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from .dataset_writer import CsvDatasetWriter, is_null, nullable, format_date, format_datetime, format_time
+from ...qgis_plugin_tools.tools.resources import plugin_name
+
+# This logger is safe to use inside the task
+LOGGER = logging.getLogger(f'{plugin_name()}_task')
+
+
+def format_significant(value: float) -> float:
+    """ Round the value to 15 significant digits like the real values of csv datasets """
+    return float('%.15g' % value)
+
+
+class Column:
+    """ Values of a dataset field converted to Python values """
+
+    def __init__(self, convert: Callable[[Any], Any]):
+        """
+        :param convert: Function converting the attribute values, including NULL values
+        """
+        self.convert = convert
+        self.values: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def append(self, value: Any) -> None:
+        self.values.append(self.convert(value))
+
+    def get(self, index: int) -> Any:
+        return self.values[index]
+
+    def to_list(self, start: int, stop: int) -> List[Any]:
+        """ Get the values of the rows from start to stop """
+        return self.values[start:stop]
+
+
+class IntegerColumn(Column):
+    """ Integer values stored in a 64-bit array, indices of the NULL values are stored in ascending order """
+
+    def __init__(self):
+        super().__init__(int)
+        self.values: Union[array, List[Optional[int]]] = array('q')
+        self.null_indices = array('q')
+
+    def append(self, value: Any) -> None:
+        if is_null(value):
+            self.null_indices.append(len(self.values))
+            self.values.append(0)
+            return
+        try:
+            self.values.append(value)
+        except OverflowError:
+            # Unsigned 64-bit values do not fit into the array
+            self.values = list(self.values)
+            self.values.append(value)
+
+    def get(self, index: int) -> Any:
+        return None if self._is_null(index) else self.values[index]
+
+    def to_list(self, start: int, stop: int) -> List[Any]:
+        values = self.values[start:stop]
+        values = values.tolist() if isinstance(values, array) else values
+        first_null = bisect_left(self.null_indices, start)
+        for i in self.null_indices[first_null:bisect_left(self.null_indices, stop, first_null)]:
+            values[i - start] = None
+        return values
+
+    def _is_null(self, index: int) -> bool:
+        i = bisect_left(self.null_indices, index)
+        return i < len(self.null_indices) and self.null_indices[i] == index
+
+
+class RealColumn(Column):
+    """ Real values stored in a float64 array, NULL values are stored as NaN """
+
+    def __init__(self):
+        super().__init__(float)
+        self.values: array = array('d')
+
+    def append(self, value: Any) -> None:
+        self.values.append(math.nan if is_null(value) else value)
+
+    def get(self, index: int) -> Any:
+        value = self.values[index]
+        return None if math.isnan(value) else format_significant(value)
+
+    def to_list(self, start: int, stop: int) -> List[Any]:
+        if not NUMPY_AVAILABLE:
+            return [self.get(i) for i in range(start, min(stop, len(self.values)))]
+        values = np.frombuffer(self.values, dtype=np.float64)[start:stop]
+        rounded = np.char.mod('%.15g', values).astype(np.float64).tolist()
+        for i in np.flatnonzero(np.isnan(values)).tolist():
+            rounded[i] = None
+        return rounded
+
+
+def create_column(field: QgsField) -> Column:
+    """
+    Create a column for the values of the field.
+
+    Values are converted to the same Python values that are read from the csv datasets: NULL strings, dates and
+    times are empty strings and the other NULL values are None.
+    """
+    field_type = field.type()
+    if field_type in (QVariant.Int, QVariant.UInt, QVariant.LongLong, QVariant.ULongLong):
+        return IntegerColumn()
+    elif field_type == QVariant.Double:
+        return RealColumn()
+    elif field_type == QVariant.Bool:
+        return Column(nullable(bool))
+    elif field_type == QVariant.Date:
+        return Column(format_date)
+    elif field_type == QVariant.DateTime:
+        return Column(format_datetime)
+    elif field_type == QVariant.Time:
+        return Column(format_time)
+    return Column(lambda value: '' if is_null(value) else str(value))
+
+
+class DatasetColumns(Sequence):
+    """
+    Column-oriented data of a dataset.
+
+    Behaves as a read-only list of rows, but the rows are created only when they are accessed, for example when the
+    configuration is serialized. Iterating creates the rows a batch at a time.
+    """
+
+    BATCH_SIZE = 10000
+
+    def __init__(self, columns: List[Column]):
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('row index out of range')
+        return [column.get(index) for column in self.columns]
+
+    def __iter__(self) -> Iterator[List[Any]]:
+        for start in range(0, len(self), self.BATCH_SIZE):
+            stop = start + self.BATCH_SIZE
+            for row in zip(*[column.to_list(start, stop) for column in self.columns]):
+                yield list(row)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (list, DatasetColumns)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+
+class ColumnarDatasetExtractor(CsvDatasetWriter):
+    """
+    Extracts the layer features into memory column by column for datasets embedded into the configuration.
+
+    Integer and real values are collected into typed arrays straight from the features.
+    """
+
+    def extract(self) -> DatasetColumns:
+        """ Extract the features into columns """
+        LOGGER.debug(f'Extracting features with {self.__class__.__name__}')
+        columns = [create_column(field) for field in self.fields]
+        attribute_columns = list(zip(self.attribute_ids, columns))
+        geometry_columns = columns[len(self.attribute_ids):]
+        geometry_values = self.geometry_values
+
+        for feature in self._features():
+            attributes = feature.attributes()
+            for i, column in attribute_columns:
+                column.append(attributes[i])
+            for column, value in zip(geometry_columns, geometry_values(feature.geometry())):
+                column.append(value)
+
+        return DatasetColumns(columns)
@@ -0,0 +1,595 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import io
+import logging
+import math
+import re
+import shutil
+import tempfile
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Tuple, Union, BinaryIO, TextIO, Iterator
+
+from PyQt5.QtCore import QVariant
+from qgis.core import (QgsField, QgsFields, QgsFeature, QgsFeatureRequest, QgsAbstractFeatureSource, QgsGeometry,
+                       QgsVectorFileWriter, QgsWkbTypes, QgsCoordinateReferenceSystem, QgsCoordinateTransformContext,
+                       QgsCoordinateTransform)
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+
+    ARROW_AVAILABLE = NUMPY_AVAILABLE
+except ImportError:
+    ARROW_AVAILABLE = False
+
+from .csv_field_value_converter import CsvFieldValueConverter
+from .feature_feedback import FeatureFeedback
+from ..exceptions import ProcessInterruptedException
+from ...qgis_plugin_tools.tools.custom_logging import bar_msg
+from ...qgis_plugin_tools.tools.i18n import tr
+from ...qgis_plugin_tools.tools.resources import plugin_name
+
+# This logger is safe to use inside the task
+LOGGER = logging.getLogger(f'{plugin_name()}_task')
+
+SEPARATOR = ','
+LINE_SEPARATOR = '\n'
+
+# Same precision as the default precision of geom_to_wkt expression function
+WKT_PRECISION = 8
+
+# Field metadata marking a binary column as GeoArrow WKB geometries
+GEOARROW_WKB_METADATA = {'ARROW:extension:name': 'geoarrow.wkb', 'ARROW:extension:metadata': '{}'}
+
+WEB_MERCATOR = 'EPSG:3857'
+WGS84 = 'EPSG:4326'
+EARTH_RADIUS = 6378137.0
+
+# Strings that look like numbers are quoted the same way as OGR CSV driver does with STRING_QUOTING=IF_AMBIGUOUS
+_AMBIGUOUS_STRING = re.compile(r'^\s*[+-]?(\d+\.?\d*|\.\d+)([eEdD][+-]?\d+)?\s*$')
+_CHARS_REQUIRING_QUOTES = (SEPARATOR, '"', '\n', '\r')
+
+GeometryValues = Callable[[QgsGeometry], List[Any]]
+
+# Datasets are written either to a file or to a binary stream, such as an entry of a zip file
+Output = Union[Path, BinaryIO]
+
+
+@contextmanager
+def open_binary_output(output: Output) -> Iterator[BinaryIO]:
+    """ Open the output for writing bytes. Streams are left open. """
+    if isinstance(output, Path):
+        with open(output, 'wb') as f:
+            yield f
+    else:
+        yield output
+
+
+@contextmanager
+def open_text_output(output: Output) -> Iterator[TextIO]:
+    """ Open the output for writing utf-8 text. Streams are left open. """
+    with open_binary_output(output) as f:
+        text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+        try:
+            yield text
+        finally:
+            text.flush()
+            text.detach()
+
+
+def output_name(output: Output) -> str:
+    """ Get the name of the output for logging """
+    return output.name if isinstance(output, Path) else 'stream'
+
+
+def is_null(value: Any) -> bool:
+    """ Check whether attribute value is NULL """
+    return value is None or (isinstance(value, QVariant) and value.isNull())
+
+
+def quote(value: str) -> str:
+    """ Quote csv value """
+    return '"' + value.replace('"', '""') + '"'
+
+
+def escape(value: str) -> str:
+    """ Quote csv value only if it contains characters that require quoting """
+    if any(char in value for char in _CHARS_REQUIRING_QUOTES):
+        return quote(value)
+    return value
+
+
+def format_integer(value: Any) -> str:
+    return '' if is_null(value) else f'"{value}"'
+
+
+def format_real(value: Any) -> str:
+    return '' if is_null(value) else '%.15g' % value
+
+
+def format_string(value: Any) -> str:
+    if is_null(value):
+        return ''
+    value = str(value)
+    if _AMBIGUOUS_STRING.match(value):
+        return quote(value)
+    return escape(value)
+
+
+def format_bool(value: Any) -> str:
+    if is_null(value):
+        return ''
+    return 'true' if value else 'false'
+
+
+def format_date(value: Any) -> str:
+    return '' if is_null(value) else value.toString('yyyy/MM/dd')
+
+
+def format_datetime(value: Any) -> str:
+    return '' if is_null(value) else value.toString('yyyy/MM/dd HH:mm:ss')
+
+
+def format_time(value: Any) -> str:
+    return '' if is_null(value) else value.toString('HH:mm:ss')
+
+
+def get_formatter(field: QgsField) -> Callable[[Any], str]:
+    """ Get a function that formats the values of the field as csv values """
+    field_type = field.type()
+    if field_type in (QVariant.Int, QVariant.UInt, QVariant.LongLong, QVariant.ULongLong):
+        return format_integer
+    elif field_type == QVariant.Double:
+        return format_real
+    elif field_type == QVariant.Bool:
+        return format_bool
+    elif field_type == QVariant.Date:
+        return format_date
+    elif field_type == QVariant.DateTime:
+        return format_datetime
+    elif field_type == QVariant.Time:
+        return format_time
+    return format_string
+
+
+def point_coordinates(geometry: QgsGeometry, precision: Optional[int] = None) -> List[Any]:
+    """ Get x and y coordinates of the (first) point of the geometry rounded to the precision """
+    if geometry.isNull():
+        return [None, None]
+    point = geometry.vertexAt(0)
+    if precision is None:
+        return [point.x(), point.y()]
+    return [round(point.x(), precision), round(point.y(), precision)]
+
+
+def geometry_wkt(geometry: QgsGeometry, precision: Optional[int] = None) -> List[Any]:
+    """ Get the geometry as WKT with the coordinates rounded to the precision """
+    if geometry.isNull():
+        return [None]
+    return [geometry.asWkt(WKT_PRECISION if precision is None else precision)]
+
+
+def geometry_wkb(geometry: QgsGeometry, precision: Optional[int] = None) -> List[Any]:
+    """ Get the geometry as WKB with the coordinates snapped to the precision """
+    if geometry.isNull():
+        return [None]
+    if precision is not None:
+        tolerance = 10 ** -precision
+        snapped = geometry.snappedToGrid(tolerance, tolerance)
+        # Snapping drops the geometries that collapse
+        if not snapped.isNull():
+            geometry = snapped
+    return [bytes(geometry.asWkb())]
+
+
+def web_mercator_to_wgs84(x: 'np.ndarray', y: 'np.ndarray') -> Tuple['np.ndarray', 'np.ndarray']:
+    """ Transform EPSG:3857 coordinates to EPSG:4326 analytically """
+    lon = np.degrees(x / EARTH_RADIUS)
+    lat = np.degrees(2.0 * np.arctan(np.exp(y / EARTH_RADIUS)) - math.pi / 2.0)
+    return lon, lat
+
+
+def format_reals(values: 'np.ndarray') -> List[str]:
+    """ Format array of doubles as csv values, NaN values are written as NULL """
+    formatted = np.char.mod('%.15g', values)
+    formatted[np.isnan(values)] = ''
+    return formatted.tolist()
+
+
+class CsvDatasetWriter:
+    """
+    Writes the layer features as a Kepler compatible csv file by iterating the features only once.
+
+    The output is identical to the one produced with QgsVectorFileWriter and the OGR CSV driver, but
+    the values are formatted with precomputed column formatters and written in batches of rows.
+    """
+
+    BATCH_SIZE = 10000
+
+    def __init__(self, source: QgsAbstractFeatureSource, request: QgsFeatureRequest, fields: QgsFields,
+                 attribute_ids: List[int], geometry_fields: List[QgsField], geometry_values: GeometryValues):
+        """
+        :param source: Read-only source of the layer features
+        :param request: Feature request used to fetch the features, including the destination crs
+        :param fields: Fields of the layer
+        :param attribute_ids: Indices of the layer fields to write
+        :param geometry_fields: Fields containing the geometry, written after the attributes
+        :param geometry_values: Function returning the values of the geometry fields
+        """
+        self.source = source
+        self.request = QgsFeatureRequest(request).setSubsetOfAttributes(attribute_ids)
+        self.attribute_ids = attribute_ids
+        self.geometry_fields = geometry_fields
+        self.geometry_values = geometry_values
+        self.fields: List[QgsField] = [fields[i] for i in attribute_ids] + geometry_fields
+        # Counts the written features and cancels the writing
+        self.feedback: Optional[FeatureFeedback] = None
+
+    def _features(self) -> Iterator[QgsFeature]:
+        """ Iterate the requested features, through the feedback if there is one """
+        features = self.source.getFeatures(self.request)
+        return features if self.feedback is None else self.feedback.iterate(features)
+
+    def header_row(self) -> str:
+        """ Get the csv header row """
+        return SEPARATOR.join(escape(field.name()) for field in self.fields) + LINE_SEPARATOR
+
+    def write(self, output_file: Output, header: bool = True) -> int:
+        """
+        Write features to the file
+        :param output_file: Path of the csv file or a binary stream
+        :param header: Whether to write the header row
+        :return: Number of written features
+        """
+        LOGGER.debug(f'Writing {output_name(output_file)} with {self.__class__.__name__}')
+
+        formatters = [get_formatter(field) for field in self.fields]
+        attribute_formatters = list(zip(self.attribute_ids, formatters))
+        geometry_formatters = formatters[len(self.attribute_ids):]
+        geometry_values = self.geometry_values
+        feature_count = 0
+
+        with open_text_output(output_file) as f:
+            if header:
+                f.write(self.header_row())
+
+            rows: List[str] = []
+            for feature in self._features():
+                attributes = feature.attributes()
+                values = [formatter(attributes[i]) for i, formatter in attribute_formatters]
+                values += [formatter(value) for formatter, value in
+                           zip(geometry_formatters, geometry_values(feature.geometry()))]
+                rows.append(SEPARATOR.join(values))
+                if len(rows) >= self.BATCH_SIZE:
+                    feature_count += len(rows)
+                    f.write(LINE_SEPARATOR.join(rows) + LINE_SEPARATOR)
+                    rows.clear()
+
+            if rows:
+                feature_count += len(rows)
+                f.write(LINE_SEPARATOR.join(rows) + LINE_SEPARATOR)
+
+        return feature_count
+
+
+class PointCsvDatasetWriter(CsvDatasetWriter):
+    """
+    Writes point layer features as a csv file.
+
+    Coordinates are collected into contiguous float64 arrays and reprojected and formatted a batch at a time.
+    Transformation from EPSG:3857 to EPSG:4326 is done analytically, other transformations are done by the
+    feature request.
+    """
+
+    BATCH_SIZE = 100000
+
+    def __init__(self, source: QgsAbstractFeatureSource, request: QgsFeatureRequest, fields: QgsFields,
+                 attribute_ids: List[int], geometry_fields: List[QgsField], geometry_values: GeometryValues,
+                 source_crs: QgsCoordinateReferenceSystem, precision: Optional[int] = None):
+        """
+        :param source_crs: Crs of the layer
+        :param precision: Number of decimals the coordinates are rounded to, None to write them unrounded
+        """
+        super().__init__(source, request, fields, attribute_ids, geometry_fields, geometry_values)
+        self.precision = precision
+        self.web_mercator_to_wgs84 = (source_crs.authid() == WEB_MERCATOR
+                                      and self.request.destinationCrs().authid() == WGS84)
+        if self.web_mercator_to_wgs84:
+            if not self.request.filterRect().isNull():
+                # Filter rectangle is in the destination crs of the request
+                transform = QgsCoordinateTransform(source_crs, self.request.destinationCrs(),
+                                                   self.request.transformContext())
+                self.request.setFilterRect(transform.transformBoundingBox(self.request.filterRect(),
+                                                                          QgsCoordinateTransform.ReverseTransform))
+            self.request.setDestinationCrs(QgsCoordinateReferenceSystem(), self.request.transformContext())
+
+    def write(self, output_file: Output, header: bool = True) -> int:
+        LOGGER.debug(f'Writing {output_name(output_file)} with {self.__class__.__name__}')
+
+        attribute_formatters = list(zip(self.attribute_ids,
+                                        [get_formatter(self.fields[i]) for i in range(len(self.attribute_ids))]))
+        # Attributes are followed by the coordinates
+        attribute_suffix = SEPARATOR if attribute_formatters else ''
+        nan = math.nan
+        feature_count = 0
+
+        with open_text_output(output_file) as f:
+            if header:
+                f.write(self.header_row())
+
+            rows: List[str] = []
+            xs, ys = array('d'), array('d')
+            for feature in self._features():
+                attributes = feature.attributes()
+                rows.append(SEPARATOR.join([formatter(attributes[i]) for i, formatter in attribute_formatters])
+                            + attribute_suffix)
+                geometry = feature.geometry()
+                if geometry.isNull():
+                    xs.append(nan)
+                    ys.append(nan)
+                else:
+                    point = geometry.vertexAt(0)
+                    xs.append(point.x())
+                    ys.append(point.y())
+                if len(rows) >= self.BATCH_SIZE:
+                    feature_count += self._write_batch(f, rows, xs, ys)
+                    rows.clear()
+                    xs, ys = array('d'), array('d')
+
+            if rows:
+                feature_count += self._write_batch(f, rows, xs, ys)
+
+        return feature_count
+
+    def _write_batch(self, f, rows: List[str], xs: array, ys: array) -> int:
+        """ Write a batch of rows with the coordinates """
+        x = np.frombuffer(xs, dtype=np.float64)
+        y = np.frombuffer(ys, dtype=np.float64)
+        if self.web_mercator_to_wgs84:
+            x, y = web_mercator_to_wgs84(x, y)
+        if self.precision is not None:
+            x, y = np.round(x, self.precision), np.round(y, self.precision)
+        f.write(''.join([row + lon + SEPARATOR + lat + LINE_SEPARATOR
+                         for row, lon, lat in zip(rows, format_reals(x), format_reals(y))]))
+        return len(rows)
+
+
+def nullable(convert: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """ Wrap value conversion function so that NULL values are converted to None """
+    return lambda value: None if is_null(value) else convert(value)
+
+
+def get_arrow_type_and_converter(field: QgsField) -> Tuple['pa.DataType', Callable[[Any], Any]]:
+    """
+    Get the Arrow type of the field and a function converting its values to Python values of that type.
+
+    Dates and times are written as strings with the same format as in csv, so that the field formats of the
+    dataset are valid for both formats.
+    """
+    field_type = field.type()
+    if field_type in (QVariant.Int, QVariant.UInt, QVariant.LongLong):
+        return pa.int64(), nullable(int)
+    elif field_type == QVariant.ULongLong:
+        return pa.uint64(), nullable(int)
+    elif field_type == QVariant.Double:
+        return pa.float64(), nullable(float)
+    elif field_type == QVariant.Bool:
+        return pa.bool_(), nullable(bool)
+    elif field_type == QVariant.Date:
+        return pa.string(), nullable(format_date)
+    elif field_type == QVariant.DateTime:
+        return pa.string(), nullable(format_datetime)
+    elif field_type == QVariant.Time:
+        return pa.string(), nullable(format_time)
+    elif field_type == QVariant.ByteArray:
+        return pa.binary(), nullable(bytes)
+    return pa.string(), nullable(str)
+
+
+class ArrowDatasetWriter(CsvDatasetWriter):
+    """
+    Writes the layer features as an Arrow IPC file with typed columns.
+
+    Lines and polygons are written as WKB in a binary column marked as a GeoArrow geometry column.
+    """
+
+    BATCH_SIZE = 100000
+
+    def schema(self) -> 'pa.Schema':
+        """ Get the Arrow schema of the dataset """
+        arrow_fields = []
+        for field in self.fields:
+            arrow_type, _ = get_arrow_type_and_converter(field)
+            metadata = GEOARROW_WKB_METADATA if field.type() == QVariant.ByteArray else None
+            arrow_fields.append(pa.field(field.name(), arrow_type, metadata=metadata))
+        return pa.schema(arrow_fields)
+
+    def write(self, output_file: Output, header: bool = True) -> int:
+        """ Arrow file always contains the schema """
+        LOGGER.debug(f'Writing {output_name(output_file)} with {self.__class__.__name__}')
+
+        schema = self.schema()
+        converters = [get_arrow_type_and_converter(field)[1] for field in self.fields]
+        attribute_converters = list(zip(self.attribute_ids, converters))
+        geometry_converters = converters[len(self.attribute_ids):]
+        geometry_values = self.geometry_values
+        feature_count = 0
+
+        with open_binary_output(output_file) as f, pa.ipc.new_file(pa.PythonFile(f, mode='w'), schema) as writer:
+            columns: List[List[Any]] = [[] for _ in self.fields]
+            attribute_columns = columns[:len(self.attribute_ids)]
+            geometry_columns = columns[len(self.attribute_ids):]
+            rows = 0
+            for feature in self._features():
+                attributes = feature.attributes()
+                for column, (i, convert) in zip(attribute_columns, attribute_converters):
+                    column.append(convert(attributes[i]))
+                for column, convert, value in zip(geometry_columns, geometry_converters,
+                                                  geometry_values(feature.geometry())):
+                    column.append(convert(value))
+                rows += 1
+                if rows >= self.BATCH_SIZE:
+                    feature_count += self._write_batch(writer, schema, columns)
+                    for column in columns:
+                        column.clear()
+                    rows = 0
+
+            if rows:
+                feature_count += self._write_batch(writer, schema, columns)
+
+        return feature_count
+
+    @staticmethod
+    def _write_batch(writer: 'pa.ipc.RecordBatchFileWriter', schema: 'pa.Schema',
+                     columns: List[Any]) -> int:
+        arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+        writer.write_batch(batch)
+        return batch.num_rows
+
+
+class PointArrowDatasetWriter(ArrowDatasetWriter):
+    """
+    Writes point layer features as an Arrow IPC file.
+
+    Coordinates are collected into contiguous float64 buffers that are handed to Arrow without converting
+    them to Python objects. Features without geometry have null coordinates.
+    """
+
+    def __init__(self, source: QgsAbstractFeatureSource, request: QgsFeatureRequest, fields: QgsFields,
+                 attribute_ids: List[int], geometry_fields: List[QgsField], geometry_values: GeometryValues,
+                 precision: Optional[int] = None):
+        """
+        :param precision: Number of decimals the coordinates are rounded to, None to write them unrounded
+        """
+        super().__init__(source, request, fields, attribute_ids, geometry_fields, geometry_values)
+        self.precision = precision
+
+    def write(self, output_file: Output, header: bool = True) -> int:
+        LOGGER.debug(f'Writing {output_name(output_file)} with {self.__class__.__name__}')
+
+        schema = self.schema()
+        attribute_converters = list(zip(self.attribute_ids, [get_arrow_type_and_converter(self.fields[i])[1]
+                                                             for i in range(len(self.attribute_ids))]))
+        nan = math.nan
+        feature_count = 0
+
+        with open_binary_output(output_file) as f, pa.ipc.new_file(pa.PythonFile(f, mode='w'), schema) as writer:
+            columns: List[List[Any]] = [[] for _ in attribute_converters]
+            xs, ys = array('d'), array('d')
+            for feature in self._features():
+                attributes = feature.attributes()
+                for column, (i, convert) in zip(columns, attribute_converters):
+                    column.append(convert(attributes[i]))
+                geometry = feature.geometry()
+                if geometry.isNull():
+                    xs.append(nan)
+                    ys.append(nan)
+                else:
+                    point = geometry.vertexAt(0)
+                    xs.append(point.x())
+                    ys.append(point.y())
+                if len(xs) >= self.BATCH_SIZE:
+                    feature_count += self._write_point_batch(writer, schema, columns, xs, ys)
+                    for column in columns:
+                        column.clear()
+                    xs, ys = array('d'), array('d')
+
+            if xs:
+                feature_count += self._write_point_batch(writer, schema, columns, xs, ys)
+
+        return feature_count
+
+    def _write_point_batch(self, writer: 'pa.ipc.RecordBatchFileWriter', schema: 'pa.Schema', columns: List[Any],
+                           xs: array, ys: array) -> int:
+        arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+        for coordinates in (xs, ys):
+            values = np.frombuffer(coordinates, dtype=np.float64)
+            if self.precision is not None:
+                values = np.round(values, self.precision)
+            # NaN coordinates of the features without geometry are converted to nulls
+            arrays.append(pa.array(values, from_pandas=True))
+        batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+        writer.write_batch(batch)
+        return batch.num_rows
+
+
+class GdalCsvDatasetWriter(CsvDatasetWriter):
+    """
+    Writes the layer features as a csv file using QgsVectorFileWriter and the OGR CSV driver.
+    """
+
+    # noinspection PyArgumentList
+    def write(self, output_file: Output, header: bool = True) -> int:
+        """ OGR CSV driver always writes the header """
+        if not isinstance(output_file, Path):
+            # OGR writes only to files
+            with tempfile.TemporaryDirectory() as temp_dir:
+                temp_file = Path(temp_dir) / 'dataset.csv'
+                feature_count = self.write(temp_file, header)
+                with open(temp_file, 'rb') as f:
+                    shutil.copyfileobj(f, output_file)
+            return feature_count
+
+        LOGGER.debug(f'Writing {output_name(output_file)} with {self.__class__.__name__}')
+
+        fields = QgsFields()
+        for field in self.fields:
+            fields.append(field)
+        converter = CsvFieldValueConverter(fields)
+        output_fields = QgsFields()
+        for field in fields:
+            output_fields.append(converter.fieldDefinition(field))
+
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = "csv"
+        options.fileEncoding = "utf-8"
+        options.layerOptions = ["SEPARATOR=COMMA"]
+
+        writer = QgsVectorFileWriter.create(str(output_file), output_fields, QgsWkbTypes.NoGeometry,
+                                            QgsCoordinateReferenceSystem(), QgsCoordinateTransformContext(), options)
+        try:
+            self._check_for_errors(writer)
+            feature_count = 0
+            for feature in self._features():
+                attributes = feature.attributes()
+                values = [attributes[i] for i in self.attribute_ids] + self.geometry_values(feature.geometry())
+                output_feature = QgsFeature(output_fields)
+                output_feature.setAttributes([converter.convert(i, value) for i, value in enumerate(values)])
+                writer.addFeature(output_feature)
+                feature_count += 1
+            self._check_for_errors(writer)
+        finally:
+            # Deleting the writer flushes the file
+            del writer
+        return feature_count
+
+    @staticmethod
+    def _check_for_errors(writer: QgsVectorFileWriter) -> None:
+        if writer.hasError() != QgsVectorFileWriter.NoError:
+            raise ProcessInterruptedException(tr('Process ended'), bar_msg=bar_msg(
+                tr('Exception occurred during data extraction: {}', writer.errorMessage())))
@@ -0,0 +1,97 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import threading
+import time
+from typing import Iterable, Iterator, Optional
+
+from qgis.core import QgsFeedback, QgsFeature
+
+from ..exceptions import ProcessInterruptedException
+from ...qgis_plugin_tools.tools.i18n import tr
+
+
+class FeatureFeedback(QgsFeedback):
+    """
+    Feedback of a dataset extraction that counts the processed features.
+
+    The features are counted and cancellation is checked every FEATURE_INTERVAL features, so that a canceled
+    extraction stops in the middle of the layer. Partitions of a layer may be written to the same feedback in
+    parallel.
+    """
+
+    FEATURE_INTERVAL = 1000
+
+    def __init__(self, feature_count: int):
+        """
+        :param feature_count: Number of features expected to be processed, negative if unknown
+        """
+        super().__init__()
+        self.feature_count = feature_count
+        self.processed_features = 0
+        self._start_time: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def iterate(self, features: Iterable[QgsFeature]) -> Iterator[QgsFeature]:
+        """ Iterate the features, raising ProcessInterruptedException if the feedback is canceled """
+        with self._lock:
+            if self._start_time is None:
+                self._start_time = time.monotonic()
+        interval = self.FEATURE_INTERVAL
+        count = 0
+        for feature in features:
+            yield feature
+            count += 1
+            if count == interval:
+                self.add_processed_features(count)
+                count = 0
+        if count:
+            self.add_processed_features(count)
+
+    def status(self) -> str:
+        """ Get the number of processed features with the throughput and the estimated remaining time """
+        with self._lock:
+            processed = self.processed_features
+            start_time = self._start_time
+        if start_time is None or processed == 0:
+            return ''
+        throughput = processed / max(time.monotonic() - start_time, 1e-6)
+        if self.feature_count <= 0:
+            return tr('{} features, {} features/s', processed, int(throughput))
+        remaining = max(self.feature_count - processed, 0) / throughput
+        return tr('{} / {} features, {} features/s, {} left', processed, self.feature_count, int(throughput),
+                  format_duration(remaining))
+
+    def add_processed_features(self, count: int) -> None:
+        """ Count the processed features, raising ProcessInterruptedException if the feedback is canceled """
+        with self._lock:
+            self.processed_features += count
+            processed = self.processed_features
+        if self.feature_count > 0:
+            self.setProgress(min(100.0, 100.0 * processed / self.feature_count))
+        if self.isCanceled():
+            raise ProcessInterruptedException()
+
+
+def format_duration(seconds: float) -> str:
+    """ Format the duration as h:mm:ss or m:ss """
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+    return f'{minutes}:{seconds:02d}'
@@ -0,0 +1,206 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import logging
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+from PyQt5.QtCore import QVariant
+from qgis.core import QgsVectorLayer, QgsFields, QgsProviderRegistry, QgsWkbTypes, QgsFeedback, QgsRectangle
+
+try:
+    from osgeo import gdal
+
+    # Coordinates can be rounded with -xyRes since GDAL 3.9
+    GDAL_AVAILABLE = True
+    GDAL_XY_RESOLUTION = int(gdal.VersionInfo()) >= 3090000
+except ImportError:
+    GDAL_AVAILABLE = GDAL_XY_RESOLUTION = False
+
+from .dataset_writer import Output, open_binary_output, escape, SEPARATOR, LINE_SEPARATOR, WKT_PRECISION
+from ..exceptions import ProcessInterruptedException
+from ...qgis_plugin_tools.tools.custom_logging import bar_msg
+from ...qgis_plugin_tools.tools.i18n import tr
+from ...qgis_plugin_tools.tools.resources import plugin_name
+
+# This logger is safe to use inside the task
+LOGGER = logging.getLogger(f'{plugin_name()}_task')
+
+# Field types GDAL writes to csv the same way as the native writer apart from quoting
+SUPPORTED_FIELD_TYPES = (QVariant.Int, QVariant.LongLong, QVariant.Double, QVariant.String, QVariant.Date)
+
+
+class VectorTranslateWriter:
+    """
+    Writes the csv dataset of an OGR layer entirely in GDAL with VectorTranslate. Reprojection, attribute selection,
+    subset filtering and formatting are all done by GDAL without creating a QgsFeature for each feature. The fid
+    column of formats such as GeoPackage is not a field in GDAL, so it is selected with an OGR SQL query.
+
+    The geometry columns are the first columns of the file, and GDAL quotes only the values that require it.
+    """
+
+    def __init__(self, path: str, layer_name: str, subset_string: str, attribute_names: List[str],
+                 geometry_names: List[str], points: bool, source_crs: str, destination_crs: str,
+                 precision: Optional[int],
+                 fid_name: Optional[str] = None, extent: Optional[QgsRectangle] = None,
+                 clip_to_extent: bool = False):
+        """
+        :param attribute_names: Names of the written attributes in order
+        :param geometry_names: Names of the geometry columns written before the attributes
+        :param points: Whether the geometries are written as x and y columns instead of wkt
+        :param source_crs: Wkt of the crs of the layer, which may differ from the crs of the data source
+        :param precision: Number of decimals in the coordinates, None for the default of the native writer
+        :param fid_name: Name of the attribute holding the feature id, None if the feature id is not written
+        :param extent: Extent in the destination crs the written features must intersect, None for all features
+        :param clip_to_extent: Whether the geometries are clipped to the extent
+        """
+        self.path = path
+        self.layer_name = layer_name
+        self.subset_string = subset_string
+        self.attribute_names = attribute_names
+        self.geometry_names = geometry_names
+        self.points = points
+        self.source_crs = source_crs
+        self.destination_crs = destination_crs
+        self.precision = precision
+        self.fid_name = fid_name
+        self.extent = extent
+        self.clip_to_extent = clip_to_extent
+
+    @staticmethod
+    def from_layer(layer: QgsVectorLayer, attribute_ids: List[int], geometry_names: List[str], destination_crs: str,
+                   precision: Optional[int], extent: Optional[QgsRectangle] = None,
+                   clip_to_extent: bool = False) -> Optional['VectorTranslateWriter']:
+        """
+        Create the writer if GDAL can write the same dataset as the native writer. Should be called in the main thread.
+        :return: Writer, None if the layer is not eligible
+        """
+        reason = VectorTranslateWriter._ineligibility_reason(layer, attribute_ids, precision)
+        if reason:
+            LOGGER.debug(f'Layer {layer.name()} is written with the native writer: {reason}')
+            return None
+        parts = QgsProviderRegistry.instance().decodeUri('ogr', layer.source())
+        fields = layer.fields()
+        points = QgsWkbTypes.geometryType(layer.wkbType()) == QgsWkbTypes.PointGeometry
+        fid_ids = VectorTranslateWriter._fid_attribute_ids(layer, attribute_ids)
+        return VectorTranslateWriter(parts['path'], parts.get('layerName') or Path(parts['path']).stem,
+                                     layer.subsetString(), [fields[i].name() for i in attribute_ids], geometry_names,
+                                     points, layer.crs().toWkt(), destination_crs, precision,
+                                     fields[fid_ids[0]].name() if fid_ids else None, extent, clip_to_extent)
+
+    @staticmethod
+    def _fid_attribute_ids(layer: QgsVectorLayer, attribute_ids: List[int]) -> List[int]:
+        """ Get the exported attributes that are the feature id in GDAL """
+        return [i for i in layer.dataProvider().pkAttributeIndexes() if i in attribute_ids]
+
+    @staticmethod
+    def _ineligibility_reason(layer: QgsVectorLayer, attribute_ids: List[int], precision: Optional[int]) -> str:
+        if not GDAL_AVAILABLE:
+            return 'GDAL Python bindings are not available'
+        if layer.providerType() != 'ogr':
+            return f'provider {layer.providerType()} is not read by GDAL'
+        if layer.isEditable() or layer.isModified():
+            return 'layer has an edit buffer'
+        if layer.vectorJoins():
+            return 'layer has joins'
+        if layer.subsetString().lstrip().lower().startswith('select'):
+            return 'subset string is an sql query'
+        wkb_type = layer.wkbType()
+        if QgsWkbTypes.hasZ(wkb_type) or QgsWkbTypes.hasM(wkb_type):
+            return 'geometries have z or m values'
+        if (QgsWkbTypes.geometryType(wkb_type) == QgsWkbTypes.PointGeometry
+                and QgsWkbTypes.isMultiType(wkb_type)):
+            return 'multipoints are written as wkt'
+        if VectorTranslateWriter._fid_attribute_ids(layer, attribute_ids) and layer.subsetString():
+            return 'subset string can not be combined with the fid column in OGR SQL'
+        if precision is not None and not GDAL_XY_RESOLUTION:
+            return 'coordinates can be rounded only with GDAL 3.9 or newer'
+        fields = layer.fields()
+        for i in attribute_ids:
+            field = fields[i]
+            if fields.fieldOrigin(i) != QgsFields.OriginProvider:
+                return f'field {field.name()} is not a field of the data source'
+            if field.type() not in SUPPORTED_FIELD_TYPES:
+                return f'field {field.name()} is of type {field.typeName()}'
+            if SEPARATOR in field.name():
+                return f'field {field.name()} can not be selected'
+        return ''
+
+    def header_row(self) -> str:
+        return SEPARATOR.join(escape(name) for name in self.geometry_names + self.attribute_names) + LINE_SEPARATOR
+
+    def write(self, output: Output, feedback: Optional[QgsFeedback] = None) -> None:
+        """
+        Write the dataset to the file or stream
+        :param feedback: Feedback receiving the progress and canceling the writing
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            translated = Path(temp_dir, 'dataset.csv')
+            self._translate(translated, feedback)
+            with open(translated, 'rb') as source, open_binary_output(output) as f:
+                # Header written by GDAL has its own names for the geometry columns
+                source.readline()
+                f.write(self.header_row().encode('utf-8'))
+                shutil.copyfileobj(source, f, 1024 * 1024)
+
+    def _translate(self, output_file: Path, feedback: Optional[QgsFeedback]) -> None:
+        # Crs set for the layer in QGIS overrides the crs of the data source
+        args = ['-f', 'CSV', '-s_srs', self.source_crs, '-t_srs', self.destination_crs,
+                '-lco', 'GEOMETRY=AS_XY' if self.points else 'GEOMETRY=AS_WKT',
+                '-lco', 'LINEFORMAT=LF', '-lco', 'STRING_QUOTING=IF_AMBIGUOUS']
+        layers = None
+        if self.fid_name is not None:
+            columns = ', '.join(f'FID AS {_quote_identifier(name)}' if name == self.fid_name
+                                else _quote_identifier(name) for name in self.attribute_names)
+            args += ['-dialect', 'OGRSQL', '-sql', f'SELECT {columns} FROM {_quote_identifier(self.layer_name)}']
+        else:
+            layers = [self.layer_name]
+            args += ['-select', ','.join(self.attribute_names)]
+            if self.subset_string:
+                args += ['-where', self.subset_string]
+        if self.extent is not None:
+            bounds = [str(value) for value in (self.extent.xMinimum(), self.extent.yMinimum(),
+                                               self.extent.xMaximum(), self.extent.yMaximum())]
+            args += ['-spat', *bounds, '-spat_srs', self.destination_crs]
+            if self.clip_to_extent:
+                args += ['-clipdst', *bounds]
+        if GDAL_XY_RESOLUTION:
+            args += ['-xyRes', f'1e-{WKT_PRECISION if self.precision is None else self.precision}']
+
+        def progress(complete: float, message: str, data) -> int:
+            if feedback is None:
+                return 1
+            feedback.setProgress(complete * 100)
+            return 0 if feedback.isCanceled() else 1
+
+        options = gdal.VectorTranslateOptions(options=args, layers=layers, callback=progress)
+        LOGGER.debug(f'Translating {self.path} with options {args}')
+        dataset = gdal.VectorTranslate(str(output_file), self.path, options=options)
+        if feedback is not None and feedback.isCanceled():
+            raise ProcessInterruptedException()
+        if dataset is None:
+            raise ProcessInterruptedException(tr('Process ended'), bar_msg=bar_msg(
+                tr('Exception occurred during data extraction: {}', gdal.GetLastErrorMsg())))
+        # Closing the dataset flushes the file
+        del dataset
+
+
+def _quote_identifier(name: str) -> str:
+    return '"{}"'.format(name.replace('"', '""'))
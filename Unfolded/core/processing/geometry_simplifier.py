@@ -0,0 +1,88 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import logging
+from typing import List
+
+from qgis.core import QgsGeometry
+
+from .dataset_writer import GeometryValues
+from ...qgis_plugin_tools.tools.i18n import tr
+from ...qgis_plugin_tools.tools.resources import plugin_name
+
+# This logger is safe to use inside the task
+LOGGER = logging.getLogger(f'{plugin_name()}_task')
+
+
+class GeometrySimplifier:
+    """
+    Simplifies geometries preserving their topology and keeps count of the removed vertices and bytes.
+
+    Geometries are simplified in the destination crs, so the tolerance is in its units.
+    """
+
+    def __init__(self, tolerance: float):
+        """
+        :param tolerance: Simplification tolerance in the units of the destination crs
+        """
+        self.tolerance = tolerance
+        self.vertices_before = 0
+        self.vertices_after = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+
+    def simplify(self, geometry: QgsGeometry) -> QgsGeometry:
+        """ Simplify the geometry with GEOS topology preserving simplifier """
+        if geometry.isNull():
+            return geometry
+        simplified = geometry.simplify(self.tolerance)
+        if simplified.isNull() or simplified.isEmpty():
+            simplified = geometry
+
+        self.vertices_before += geometry.constGet().nCoordinates()
+        self.vertices_after += simplified.constGet().nCoordinates()
+        self.bytes_before += geometry.constGet().wkbSize()
+        self.bytes_after += simplified.constGet().wkbSize()
+        return simplified
+
+    def wrap(self, geometry_values: GeometryValues) -> GeometryValues:
+        """ Get a function extracting the geometry values from the simplified geometry """
+        simplify = self.simplify
+        return lambda geometry: geometry_values(simplify(geometry))
+
+    @classmethod
+    def merge(cls, simplifiers: List['GeometrySimplifier']) -> 'GeometrySimplifier':
+        """ Combine the counts of the simplifiers used for different parts of the same layer """
+        merged = cls(simplifiers[0].tolerance if simplifiers else 0.0)
+        for simplifier in simplifiers:
+            merged.vertices_before += simplifier.vertices_before
+            merged.vertices_after += simplifier.vertices_after
+            merged.bytes_before += simplifier.bytes_before
+            merged.bytes_after += simplifier.bytes_after
+        return merged
+
+    def report(self, layer_name: str) -> None:
+        """ Log the vertex and byte reduction """
+        if not self.vertices_before:
+            return
+        vertex_reduction = 100 * (1 - self.vertices_after / self.vertices_before)
+        byte_reduction = 100 * (1 - self.bytes_after / self.bytes_before)
+        LOGGER.info(tr('Simplified layer {} with tolerance {}: vertices {} -> {} (-{:.1f} %), '
+                       'geometry bytes {} -> {} (-{:.1f} %)', layer_name, self.tolerance,
+                       self.vertices_before, self.vertices_after, vertex_reduction,
+                       self.bytes_before, self.bytes_after, byte_reduction))
@@ -16,27 +16,38 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
-import csv
 import logging
+import shutil
 import tempfile
 import uuid
+from functools import partial
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict, Any, Collection
 
-from PyQt5.QtCore import QVariant
-from qgis.core import (QgsVectorLayer, QgsField, QgsVectorFileWriter, QgsProject)
+from PyQt5.QtCore import QVariant, QThread
+from qgis.core import (QgsVectorLayer, QgsField, QgsProject, QgsVectorLayerFeatureSource, QgsFeatureRequest,
+                       QgsCoordinateReferenceSystem, QgsTask, QgsAbstractFeatureSource, QgsRectangle, QgsGeometry)
 
 from .base_config_creator_task import BaseConfigCreatorTask
-from .csv_field_value_converter import CsvFieldValueConverter
+from .dataset_archive import DatasetArchive
+from .dataset_cache import DatasetCache
+from .dataset_columns import ColumnarDatasetExtractor, DatasetColumns
+from .dataset_writer import (CsvDatasetWriter, GdalCsvDatasetWriter, PointCsvDatasetWriter, ArrowDatasetWriter,
+                             PointArrowDatasetWriter, GeometryValues, point_coordinates, geometry_wkt, geometry_wkb,
+                             NUMPY_AVAILABLE, ARROW_AVAILABLE, Output, open_binary_output)
+from .feature_feedback import FeatureFeedback
+from .gdal_pushdown import VectorTranslateWriter
+from .geometry_simplifier import GeometrySimplifier
+from .layer_partitions import LayerToPartitions, PartitionToCsv
+from .layer_snapshot import LayerSnapshot
 from ..exceptions import ProcessInterruptedException
-from ..utils import set_csv_field_size_limit
 from ...definitions.settings import Settings
 from ...model.map_config import OldDataset, Data, Field, UnfoldedDataset
 from ...qgis_plugin_tools.tools.custom_logging import bar_msg
 from ...qgis_plugin_tools.tools.exceptions import QgsPluginNotImplementedException
 from ...qgis_plugin_tools.tools.i18n import tr
 from ...qgis_plugin_tools.tools.layers import LayerType
-from ...qgis_plugin_tools.tools.resources import plugin_name, resources_path
+from ...qgis_plugin_tools.tools.resources import plugin_name
 
 # This logger is safe to use inside the task
 LOGGER = logging.getLogger(f'{plugin_name()}_task')
@@ -45,15 +56,183 @@ LOGGER = logging.getLogger(f'{plugin_name()}_task')
 LOGGER_MAIN = logging.getLogger(plugin_name())
 
 class LayerToDatasets(BaseConfigCreatorTask):
+    """
+    Creates dataset from the layer
+
+    The layer is never modified and it is used only in the main thread when the task is created. The task reads the
+    features and the fields from a snapshot of the layer, and the geometries are transformed to the destination crs by
+    the feature request. If an extent is given, the provider returns only the features intersecting it, and lines and
+    polygons can also be clipped to it.
+
+    Large layers are split into feature id partitions that are written in parallel subtasks and merged in order.
+    With the vectortranslate writer, csv datasets of eligible OGR layers are written entirely by GDAL instead.
+
+    Datasets are written either to the output directory or streamed into the archive of the configuration as csv or
+    Arrow IPC files depending on the dataset format setting. Data embedded into the configuration is extracted into
+    typed columns without intermediate files.
+    """
+
+    # Rough memory usage of one feature while it is extracted, used to schedule the tasks
+    GEOMETRY_BYTES = {LayerType.Point: 64, LayerType.Line: 1024, LayerType.Polygon: 2048}
+    ATTRIBUTE_BYTES = 32
 
     def __init__(self, layer_uuid: uuid.UUID, layer: QgsVectorLayer, color: Tuple[int, int, int],
-                 output_directory: Optional[Path] = None):
+                 output_directory: Optional[Path] = None, simplification_tolerance: Optional[float] = None,
+                 archive: Optional[DatasetArchive] = None, snapshot: Optional[LayerSnapshot] = None,
+                 extent: Optional[QgsRectangle] = None, clip_to_extent: bool = False,
+                 attribute_names: Optional[Collection[str]] = None):
+        """
+        :param output_directory: Directory the dataset file is written to
+        :param archive: Archive the dataset file is written to instead of the output directory
+        :param simplification_tolerance: Tolerance in degrees used to simplify lines and polygons, None to disable
+        :param snapshot: Snapshot of the layer shared with the other tasks of the layer, taken here if not given
+        :param extent: Extent in the destination crs the exported features must intersect, None to export all features
+        :param clip_to_extent: Whether lines and polygons are clipped to the extent
+        :param attribute_names: Names of the attributes written to the dataset, None to write all attributes
+        """
         super().__init__('LayerToDatasets')
         self.layer_uuid = layer_uuid
+        # Layer is used only in the main thread, the task reads the features and the fields from the snapshot
         self.layer = layer
         self.color = color
         self.output_directory = output_directory
+        self.archive = archive
+        self.dataset_writer = Settings.dataset_writer.get()
+        self.dataset_format = self._get_dataset_format()
+        self.simplification_tolerance = simplification_tolerance
+        self.extent = extent
+        self.clip_to_extent = clip_to_extent and extent is not None
+        # Only these attributes are requested from the provider
+        self.attribute_names = set(attribute_names) if attribute_names is not None else None
+        self.coordinate_precision = self._get_coordinate_precision()
+        self.simplifiers: List[GeometrySimplifier] = []
         self.result_dataset: Optional[OldDataset] = None
+        # Size of the written dataset file in bytes
+        self.result_size = 0
+
+        # Read-only snapshot of the layer that is safe to use inside the task
+        self.snapshot = snapshot or LayerSnapshot(layer)
+        self.source = self.snapshot.source
+        self.fields = self.snapshot.fields
+        self.crs = self.snapshot.crs
+        self.layer_type = self.snapshot.layer_type
+        self.request = QgsFeatureRequest().setDestinationCrs(QgsCoordinateReferenceSystem(Settings.crs.get()),
+                                                            QgsProject.instance().transformContext())
+        if self.extent is not None:
+            # Provider uses its spatial index for the rectangle, which is transformed to the crs of the layer
+            self.request.setFilterRect(self.extent).setFlags(QgsFeatureRequest.ExactIntersect)
+
+        # Shared by the writers of the partitions, so the progress covers all features of the layer
+        self.feedback = FeatureFeedback(self.snapshot.feature_count)
+        self.feedback.progressChanged.connect(self.setProgress)
+
+        # Datasets are cached only when they are written to files
+        self.cache = DatasetCache.from_settings() if self._writes_dataset_file() else None
+        self.cache_key = DatasetCache.create_key(layer, self._get_cache_options()) if self.cache else None
+        self.cached_file = self.cache.get(self.cache_key, f'.{self.dataset_format}') if self.cache_key else None
+
+        self.partition_dir: Optional[tempfile.TemporaryDirectory] = None
+        self.layer_to_partitions: Optional[LayerToPartitions] = None
+        self.partition_tasks: List[PartitionToCsv] = []
+        self.pushdown = self._create_pushdown_writer(layer) if self.cached_file is None else None
+        if self.cached_file is None and self.pushdown is None:
+            self._add_partition_subtasks(layer)
+        self.estimated_memory = self._estimate_memory(layer)
+
+    def _writes_dataset_file(self) -> bool:
+        """ Whether the dataset is written to a file instead of embedding the data into the configuration """
+        return self.output_directory is not None or self.archive is not None
+
+    def _get_dataset_format(self) -> str:
+        """ Get the format of the dataset file """
+        dataset_format = Settings.dataset_format.get()
+        if not self._writes_dataset_file():
+            return 'csv'
+        if dataset_format == 'arrow' and not ARROW_AVAILABLE:
+            LOGGER_MAIN.warning(tr('PyArrow is not installed, writing datasets as csv'))
+            return 'csv'
+        return dataset_format
+
+    @staticmethod
+    def _get_coordinate_precision() -> Optional[int]:
+        """ Get the number of decimals the coordinates are rounded to, None if they are not rounded """
+        precision = Settings.coordinate_precision.get()
+        return precision if precision >= 0 else None
+
+    def _get_cache_options(self) -> Dict[str, Any]:
+        """ Get the export options affecting the contents of the dataset file """
+        return {
+            'dataset_format': self.dataset_format,
+            'dataset_writer': self.dataset_writer,
+            'crs': self.request.destinationCrs().authid(),
+            'coordinate_precision': self.coordinate_precision,
+            'simplification_tolerance': self.simplification_tolerance if self.layer_type != LayerType.Point else None,
+            'extent': self.extent.toString(12) if self.extent is not None else None,
+            'clip_to_extent': self.clip_to_extent,
+            'attribute_names': sorted(self.attribute_names) if self.attribute_names is not None else None,
+        }
+
+    def _estimate_memory(self, layer: QgsVectorLayer) -> int:
+        """ Estimate the memory needed to extract the dataset in bytes based on the features and the geometry type """
+        if self.cached_file is not None:
+            # Cached file is only copied
+            return 0
+        feature_bytes = self.GEOMETRY_BYTES.get(self.layer_type, 0) + self.ATTRIBUTE_BYTES * len(self.fields)
+        return max(layer.featureCount(), 0) * feature_bytes
+
+    def _create_pushdown_writer(self, layer: QgsVectorLayer) -> Optional[VectorTranslateWriter]:
+        """ Create the writer converting the layer in GDAL if the layer and the export options allow it """
+        if (self.dataset_writer != 'vectortranslate' or not self._writes_dataset_file() or self.dataset_format != 'csv'
+                or (self.simplification_tolerance and self.layer_type in (LayerType.Polygon, LayerType.Line))):
+            return None
+        geometry_fields, _ = self._get_geometry_fields()
+        return VectorTranslateWriter.from_layer(layer, self._get_exported_attribute_ids(),
+                                                [field.name() for field in geometry_fields],
+                                                self.request.destinationCrs().authid(), self.coordinate_precision,
+                                                self.extent, self.clip_to_extent)
+
+    def _add_partition_subtasks(self, layer: QgsVectorLayer) -> None:
+        """ Split large layers into partitions that are written in parallel subtasks """
+        partition_size = Settings.dataset_partition_size.get()
+        if (not self._writes_dataset_file() or self.dataset_writer == 'gdal' or self.dataset_format != 'csv'
+                or partition_size <= 0):
+            return
+        partition_count = min(QThread.idealThreadCount(), layer.featureCount() // partition_size)
+        if partition_count < 2:
+            return
+
+        LOGGER_MAIN.debug(f'Writing layer {layer.name()} in {partition_count} partitions')
+        self.partition_dir = tempfile.TemporaryDirectory()
+        self.layer_to_partitions = LayerToPartitions(self, partition_count, self._get_fid_field(layer))
+        self.addSubTask(self.layer_to_partitions, [], QgsTask.ParentDependsOnSubTask)
+        for i in range(partition_count):
+            task = PartitionToCsv(self, self.layer_to_partitions, i, QgsVectorLayerFeatureSource(layer),
+                                  Path(self.partition_dir.name) / f'{i}.csv')
+            self.addSubTask(task, [self.layer_to_partitions], QgsTask.ParentDependsOnSubTask)
+            self.partition_tasks.append(task)
+
+    @staticmethod
+    def _get_fid_field(layer: QgsVectorLayer) -> Optional[str]:
+        """
+        Get the field holding the feature ids of the layer, None if the provider does not keep the feature ids in
+        a field. Other providers than OGR may map the values of their primary keys to different feature ids.
+        """
+        provider = layer.dataProvider()
+        pk_indexes = provider.pkAttributeIndexes()
+        if layer.providerType() != 'ogr' or len(pk_indexes) != 1:
+            return None
+        return provider.fields().at(pk_indexes[0]).name()
+
+    def preflight(self) -> None:
+        """ Check that the geometry type and the field types of the layer are supported """
+        self._extract_fields()
+
+    def cancel(self) -> None:
+        self.feedback.cancel()
+        super().cancel()
+
+    def progress_status(self) -> str:
+        return self.feedback.status()
 
     def run(self) -> bool:
         try:
@@ -66,177 +245,204 @@ class LayerToDatasets(BaseConfigCreatorTask):
             return False
 
     def _convert_to_dataset(self) -> OldDataset:
-        self._add_geom_to_fields()
-        try:
-            self.setProgress(20)
-            self._check_if_canceled()
-
-            fields = self._extract_fields()
-
-            self.setProgress(40)
-            self._check_if_canceled()
+        fields = self._extract_fields()
+        self._check_if_canceled()
 
+        # Progress is reported by the feedback while the features are extracted
+        with self.profile.stage(self.snapshot.name, 'copy cached' if self.cached_file else 'extract') as stage:
             source, all_data = self._extract_all_data()
-            self.setProgress(60)
-            self._check_if_canceled()
-
-            if self.output_directory:
-                dataset = UnfoldedDataset(self.layer_uuid, self.layer.name(), list(self.color), source, fields)
-            else:
-                data = Data(self.layer_uuid, self.layer.name(), list(self.color), all_data, fields)
-                dataset = OldDataset(data)
-
-            self.setProgress(80)
-            return dataset
-        finally:
-            self._remove_geom_from_fields()
-
-    def _add_geom_to_fields(self) -> None:
-        """ Adds geometry to the layer as virtual field(s) """
-
-        LOGGER.info(tr('Adding layer geometry to fields'))
-
-
-
-        crs = self.layer.crs().authid()
-        dest_crs = Settings.crs.get()
-        requires_transform = crs != dest_crs
-        layer_type = LayerType.from_layer(self.layer)
-        if layer_type == LayerType.Point:
-            LOGGER.debug('Point layer')
-
-            expressions: Tuple[str, str] = ('$x', '$y')
-            if requires_transform:
-                expressions = (
-                    f"x(transform($geometry, '{crs}', '{dest_crs}'))",
-                    f"y(transform($geometry, '{crs}', '{dest_crs}'))"
-                )
-            self.layer.addExpressionField(expressions[0], QgsField(LayerToDatasets.LONG_FIELD, QVariant.Double))
-            self.layer.addExpressionField(expressions[1], QgsField(LayerToDatasets.LAT_FIELD, QVariant.Double))
-            # TODO: z coord
-        elif layer_type in (LayerType.Polygon, LayerType.Line):
-            LOGGER.debug('Polygon or line layer')
-            expression: str = 'geom_to_wkt($geometry)'
-            if requires_transform:
-                expression = f"geom_to_wkt(transform($geometry, '{crs}', '{dest_crs}'))"
-            self.layer.addExpressionField(expression, QgsField(LayerToDatasets.GEOM_FIELD, QVariant.String))
+            stage.rows = self.feedback.processed_features
+            stage.bytes_written = self.result_size
+        if self.simplifiers:
+            GeometrySimplifier.merge(self.simplifiers).report(self.snapshot.name)
+        self._check_if_canceled()
+
+        if self._writes_dataset_file():
+            dataset = UnfoldedDataset(self.layer_uuid, self.snapshot.name, list(self.color), source, fields)
         else:
-            raise QgsPluginNotImplementedException(
-                bar_msg=bar_msg(tr('Unsupported layer wkb type: {}', self.layer.wkbType())))
+            data = Data(self.layer_uuid, self.snapshot.name, list(self.color), all_data, fields)
+            dataset = OldDataset(data)
 
-    def _remove_geom_from_fields(self):
-        """ Removes virtual geometry field(s) from the layer """
+        return dataset
 
-        LOGGER.info(tr('Removing layer geometry fields'))
+    def _get_geometry_fields(self) -> Tuple[List[QgsField], GeometryValues]:
+        """ Get the fields representing the layer geometry and a function extracting their values """
+        if self.layer_type == LayerType.Point:
+            # TODO: z coord
+            fields = [QgsField(LayerToDatasets.LONG_FIELD, QVariant.Double),
+                      QgsField(LayerToDatasets.LAT_FIELD, QVariant.Double)]
+            return fields, partial(point_coordinates, precision=self.coordinate_precision)
+        elif self.layer_type in (LayerType.Polygon, LayerType.Line):
+            if self.dataset_format == 'arrow':
+                return ([QgsField(LayerToDatasets.GEOM_FIELD, QVariant.ByteArray)],
+                        partial(geometry_wkb, precision=self.coordinate_precision))
+            return ([QgsField(LayerToDatasets.GEOM_FIELD, QVariant.String)],
+                    partial(geometry_wkt, precision=self.coordinate_precision))
+        raise QgsPluginNotImplementedException(
+            bar_msg=bar_msg(tr('Unsupported layer wkb type: {}', self.snapshot.wkb_type)))
+
+    def _get_exported_attribute_ids(self) -> List[int]:
+        """ Get indices of the fields that are written to the dataset """
+        geometry_fields, _ = self._get_geometry_fields()
+        geometry_field_names = {field.name() for field in geometry_fields}
+        filtered_attribute_ids: List[int] = []
+        for i, field in enumerate(self.fields):
+            # filter out the fields with the same name as the geometry fields to avoid name colissions
+            if field.name().lower() in geometry_field_names:
+                LOGGER.info(tr('Skipping attribute: {} ({})', field.name(), i))
+                continue
+            if self.attribute_names is not None and field.name() not in self.attribute_names:
+                continue
+            filtered_attribute_ids.append(i)
+        return filtered_attribute_ids
 
-        layer_type = LayerType.from_layer(self.layer)
-        field_count = len(self.layer.fields().toList())
-        if layer_type == LayerType.Point:
-            self.layer.removeExpressionField(field_count - 1)
-            self.layer.removeExpressionField(field_count - 2)
-        elif layer_type in (LayerType.Polygon, LayerType.Line):
-            self.layer.removeExpressionField(field_count - 1)
-        else:
-            raise QgsPluginNotImplementedException(
-                bar_msg=bar_msg(tr('Unsupported layer wkb type: {}', self.layer.wkbType())))
+    def _get_exported_fields(self) -> List[QgsField]:
+        """ Get all fields that are written to the dataset, including the geometry fields """
+        geometry_fields, _ = self._get_geometry_fields()
+        attribute_fields = [self.fields[i] for i in self._get_exported_attribute_ids()]
+        if self.pushdown is not None:
+            # GDAL writes the geometry columns first
+            return geometry_fields + attribute_fields
+        return attribute_fields + geometry_fields
 
     def _extract_fields(self) -> List[Field]:
         """ Extract field information from layer """
-        fields: List[Field] = []
-        field: QgsField
         LOGGER.info(tr('Extracting fields'))
+        return [self._qgis_field_to_unfolded_field(field) for field in self._get_exported_fields()]
 
-        for field in self.layer.fields():
-            fields.append(self._qgis_field_to_unfolded_field(field))
-        return fields
-
-    def _extract_all_data(self) -> Tuple[Optional[str], Optional[List]]:
-        """ Extract data either as csv file or list representing csv
-        :returns csv file source if exists, data list if output directory for the file is not set
+    def _extract_all_data(self) -> Tuple[Optional[str], Optional[DatasetColumns]]:
+        """ Extract data either as a dataset file or columns embedded into the configuration
+        :returns dataset file source if exists, data columns if the dataset is not written to a file
         """
 
         LOGGER.info(tr('Extracting layer data'))
 
         source, all_data = [None] * 2
-        if self.output_directory:
-            output_file = self._save_layer_to_file(self.layer, self.output_directory)
-            source = output_file.name
+        if self._writes_dataset_file():
+            source = self._write_dataset_file()
         else:
-            all_data = []
-            field_types = [field.type() for field in self.layer.fields()]
-            conversion_functions = {}
-            for i, field_type in enumerate(field_types):
-                if field_types[i] in [QVariant.Int, QVariant.UInt, QVariant.LongLong,
-                                      QVariant.ULongLong]:
-                    conversion_functions[i] = lambda x: int(x) if x else None
-                elif field_types[i] == QVariant.Double:
-                    conversion_functions[i] = lambda x: float(x) if x else None
-                elif field_types[i] == QVariant.Bool:
-                    conversion_functions[i] = lambda x: None if x == "" else x == "true"
-                else:
-                    conversion_functions[i] = lambda x: x.rstrip().strip('"')
-
-            with tempfile.TemporaryDirectory(dir=resources_path()) as tmpdirname:
-                output_file = self._save_layer_to_file(self.layer, Path(tmpdirname))
-                with open(output_file, newline='', encoding="utf-8") as f:
-                    set_csv_field_size_limit()
-                    data_reader = csv.reader(f, delimiter=',')
-                    # Skipping header
-                    next(data_reader)
-                    for row in data_reader:
-                        data = []
-                        for i, value in enumerate(row):
-                            data.append(conversion_functions[i](value))
-                        all_data.append(data)
+            all_data = self._create_extractor().extract()
 
         return source, all_data
 
-    # noinspection PyArgumentList
-    @staticmethod
-    def _save_layer_to_file(layer: QgsVectorLayer, output_path: Path) -> Path:
-        """ Save layer to file"""
-        output_file = output_path / f'{layer.name().replace(" ", "")}.csv'
-        LOGGER.debug(f'Saving layer to a file {output_file.name}')
+    def _get_dataset_file_name(self) -> str:
+        return f'{self.snapshot.name.replace(" ", "")}.{self.dataset_format}'
 
-        converter = CsvFieldValueConverter(layer)
-
-        layer_type = LayerType.from_layer(layer)
-        field_count = len(layer.fields().toList())
-        filtered_attribute_ids: list[int] = []
-        for i, field in enumerate(layer.fields()):
-            field_name = field.name().lower()
-            # during _add_geom_to_fields() we've added some fields, but we now
-            # want to filter out the fields with the same name as to avoid name
-            # colissions
-            if layer_type == LayerType.Point:
-                if field_name == LayerToDatasets.LONG_FIELD and i != field_count - 2:
-                    LOGGER.info(tr('Skipping attribute: {} ({})', field.name(), i))
-                    continue
-                if field_name == LayerToDatasets.LAT_FIELD and i != field_count - 1:
-                    LOGGER.info(tr('Skipping attribute: {} ({})', field.name(), i))
-                    continue
-            elif layer_type in (LayerType.Polygon, LayerType.Line):
-                if field_name == LayerToDatasets.GEOM_FIELD and i != field_count - 1:
-                    LOGGER.info(tr('Skipping attribute: {} ({})', field.name(), i))
-                    continue
-            filtered_attribute_ids.append(i)
+    def _write_dataset_file(self) -> str:
+        """
+        Write the dataset file to the archive or to the output directory, reusing the cached file if possible
+        :return: Name of the dataset file
+        """
+        file_name = self._get_dataset_file_name()
+        if self.cached_file is not None:
+            LOGGER.info(tr('Using cached dataset for layer {}', self.snapshot.name))
+            try:
+                self.result_size = self.cached_file.stat().st_size
+                self._copy_to_output(self.cached_file, file_name)
+                return file_name
+            except FileNotFoundError:
+                # Another export may have evicted the file after it was found in the cache
+                LOGGER.info(tr('Cached dataset for layer {} was evicted, extracting it again', self.snapshot.name))
+                self.cached_file = None
+
+        if self.cache_key is not None:
+            # Dataset is written next to the cache so that it can be moved there after copying it to the output
+            with self.cache.temporary_directory() as temp_dir:
+                output_file = self._save_layer_to_file(Path(temp_dir))
+                self.result_size = output_file.stat().st_size
+                self._copy_to_output(output_file, file_name)
+                self.cache.put(self.cache_key, output_file, move=True)
+        elif self.archive is not None:
+            LOGGER.debug(f'Writing layer to the archive entry {file_name}')
+            with self.archive.open(file_name) as entry:
+                self._write_dataset(entry)
+            self.result_size = self.archive.entry_size(file_name)
+        else:
+            self.result_size = self._save_layer_to_file(self.output_directory).stat().st_size
+        return file_name
 
-        options = QgsVectorFileWriter.SaveVectorOptions()
-        options.driverName = "csv"
-        options.fileEncoding = "utf-8"
-        options.layerOptions = ["SEPARATOR=COMMA"]
-        options.fieldValueConverter = converter
-        options.attributes = filtered_attribute_ids
-
-        if hasattr(QgsVectorFileWriter, "writeAsVectorFormatV3"):
-            # noinspection PyCallByClass
-            writer_, msg, _, _ = QgsVectorFileWriter.writeAsVectorFormatV3(layer, str(output_file),
-                                                                           QgsProject.instance().transformContext(),
-                                                                           options)
+    def _copy_to_output(self, dataset_file: Path, file_name: str) -> None:
+        if self.archive is not None:
+            self.archive.write(dataset_file, file_name)
         else:
-            writer_, msg = QgsVectorFileWriter.writeAsVectorFormatV2(layer, str(output_file),
-                                                                     QgsProject.instance().transformContext(), options)
-        if msg:
-            raise ProcessInterruptedException(tr('Process ended'),
-                                              bar_msg=bar_msg(tr('Exception occurred during data extraction: {}', msg)))
+            shutil.copyfile(dataset_file, self.output_directory / file_name)
+
+    def _save_layer_to_file(self, output_path: Path) -> Path:
+        """ Save layer to file using the configured dataset writer """
+        output_file = output_path / self._get_dataset_file_name()
+        LOGGER.debug(f'Saving layer to a file {output_file.name}')
+        self._write_dataset(output_file)
         return output_file
+
+    def _write_dataset(self, output: Output) -> None:
+        """ Write the dataset to the file or stream """
+        if self.pushdown is not None:
+            self.pushdown.write(output, self.feedback)
+            self.feedback.add_processed_features(self.snapshot.feature_count)
+        elif self.partition_tasks and self.dataset_writer != 'gdal' and self.dataset_format == 'csv':
+            self._merge_partitions(output)
+        else:
+            self._create_writer(self.source, self.request).write(output)
+
+    def _create_extractor(self) -> ColumnarDatasetExtractor:
+        """ Create the extractor of the data embedded into the configuration """
+        extractor = ColumnarDatasetExtractor(*self._get_writer_args(self.source, self.request))
+        extractor.feedback = self.feedback
+        return extractor
+
+    def _create_writer(self, source: QgsAbstractFeatureSource, request: QgsFeatureRequest) -> CsvDatasetWriter:
+        """ Create the configured dataset writer """
+        args = self._get_writer_args(source, request)
+        if self.dataset_format == 'arrow':
+            if self.layer_type == LayerType.Point:
+                writer = PointArrowDatasetWriter(*args, self.coordinate_precision)
+            else:
+                writer = ArrowDatasetWriter(*args)
+        elif self.dataset_writer == 'gdal':
+            writer = GdalCsvDatasetWriter(*args)
+        elif self.layer_type == LayerType.Point and NUMPY_AVAILABLE:
+            writer = PointCsvDatasetWriter(*args, self.crs, self.coordinate_precision)
+        else:
+            writer = CsvDatasetWriter(*args)
+        writer.feedback = self.feedback
+        return writer
+
+    def _get_writer_args(self, source: QgsAbstractFeatureSource, request: QgsFeatureRequest) -> Tuple:
+        """ Get the common arguments of the dataset writers """
+        geometry_fields, geometry_values = self._get_geometry_fields()
+        if self.simplification_tolerance and self.layer_type in (LayerType.Polygon, LayerType.Line):
+            simplifier = GeometrySimplifier(self.simplification_tolerance)
+            self.simplifiers.append(simplifier)
+            geometry_values = simplifier.wrap(geometry_values)
+        if self.clip_to_extent and self.layer_type in (LayerType.Polygon, LayerType.Line):
+            geometry_values = partial(_clipped_values, geometry_values=geometry_values, extent=self.extent)
+        return source, request, self.fields, self._get_exported_attribute_ids(), geometry_fields, geometry_values
+
+    def _merge_partitions(self, output: Output) -> None:
+        """ Merge the partitions written by the subtasks into one file in order """
+        LOGGER.info(tr('Merging {} partitions', len(self.partition_tasks)))
+        try:
+            # Subtasks are not run by the task manager when the task is run directly
+            if self.layer_to_partitions.result_partitions is None:
+                self._run_subtask(self.layer_to_partitions)
+
+            with open_binary_output(output) as f:
+                f.write(self._create_writer(self.source, self.request).header_row().encode('utf-8'))
+                for task in self.partition_tasks:
+                    self._check_if_canceled()
+                    if task.result_feature_count is None:
+                        self._run_subtask(task)
+                    with open(task.output_file, 'rb') as partition:
+                        shutil.copyfileobj(partition, f)
+        finally:
+            self.partition_dir.cleanup()
+
+    @staticmethod
+    def _run_subtask(task: BaseConfigCreatorTask) -> None:
+        if not task.run():
+            raise task.exception or ProcessInterruptedException()
+
+
+def _clipped_values(geometry: QgsGeometry, geometry_values: GeometryValues, extent: QgsRectangle) -> List[Any]:
+    """ Get the values of the geometry clipped to the extent """
+    return geometry_values(geometry.clipped(extent))
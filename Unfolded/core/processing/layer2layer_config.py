@@ -25,6 +25,7 @@ from qgis.core import (QgsVectorLayer, QgsSymbol, QgsFeatureRenderer, QgsSymbolL
                        QgsSingleSymbolRenderer, QgsCategorizedSymbolRenderer)
 
 from .base_config_creator_task import BaseConfigCreatorTask
+from .layer_snapshot import LayerSnapshot
 from ..exceptions import InvalidInputException
 from ..utils import extract_color, rgb_to_hex
 from ...definitions.settings import Settings
@@ -56,10 +57,16 @@ class LayerToLayerConfig(BaseConfigCreatorTask):
                                    "Logarithmic": "custom", "Jenks": "custom", "Pretty": "custom"}
     CATEGORIZED_SCALE = "ordinal"
 
-    def __init__(self, layer_uuid: uuid.UUID, layer: QgsVectorLayer, is_visible: bool = True):
+    def __init__(self, layer_uuid: uuid.UUID, layer: QgsVectorLayer, is_visible: bool = True,
+                 snapshot: Optional[LayerSnapshot] = None):
+        """
+        :param snapshot: Snapshot of the layer shared with the other tasks of the layer, taken here if not given
+        """
         super().__init__('LayerToLayerConfig')
         self.layer_uuid = layer_uuid
+        # Layer is used only in the main thread, the task reads the renderer and the fields from the snapshot
         self.layer = layer
+        self.snapshot = snapshot or LayerSnapshot(layer)
         self.is_visible = is_visible
         self.result_layer_conf: Optional[Layer] = None
         self.__pixel_unit = Settings.pixel_size_unit.get()
@@ -67,28 +74,37 @@ class LayerToLayerConfig(BaseConfigCreatorTask):
         self.__millimeters_to_pixels = Settings.millimeters_to_pixels.get()
         self.__width_pixel_factor = Settings.width_pixel_factor.get()
 
+    def preflight(self) -> None:
+        """ Extract the layer configuration already in the preflight, it is not extracted again when the task runs """
+        self._extract_layer_config()
+
     def run(self) -> bool:
         try:
             self._check_if_canceled()
-            self.result_layer_conf = self._extract_layer()
+            if self.result_layer_conf is None:
+                self._extract_layer_config()
             self.setProgress(100)
             return True
         except Exception as e:
             self.exception = e
             return False
 
+    def _extract_layer_config(self) -> None:
+        with self.profile.stage(self.snapshot.name, 'style'):
+            self.result_layer_conf = self._extract_layer()
+
     def _extract_layer(self) -> Layer:
         """ Extract VisState.layer configuration based on layer renderer and type """
-        LOGGER.info(tr('Extracting layer configuration for {}', self.layer.name()))
+        LOGGER.info(tr('Extracting layer configuration for {}', self.snapshot.name))
 
-        renderer: QgsFeatureRenderer = self.layer.renderer()
+        renderer: QgsFeatureRenderer = self.snapshot.renderer
         try:
             symbol_type = SymbolType[renderer.type()]
         except Exception:
             raise QgsPluginNotImplementedException(tr("Symbol type {} is not supported yet", renderer.type()),
                                                    bar_msg=bar_msg())
 
-        layer_type = LayerType.from_layer(self.layer)
+        layer_type = self.snapshot.layer_type
         LOGGER.info(tr('Symbol type: {}', symbol_type))
 
         self.setProgress(50)
@@ -107,8 +123,8 @@ class LayerToLayerConfig(BaseConfigCreatorTask):
         elif layer_type in [LayerType.Line, LayerType.Polygon]:
             layer_type_ = UnfoldedLayerType.Geojson
             columns = Columns.for_geojson()
-            visual_channels.height_scale = VisualChannels.height_scale
-            visual_channels.radius_scale = VisualChannels.radius_scale
+            visual_channels.height_scale = VisualChannels.DEFAULT_HEIGHT_SCALE
+            visual_channels.radius_scale = VisualChannels.DEFAULT_RADIUS_SCALE
         else:
             raise QgsPluginNotImplementedException(tr('Layer type {} is not implemented', layer_type),
                                                    bar_msg=bar_msg())
@@ -116,7 +132,7 @@ class LayerToLayerConfig(BaseConfigCreatorTask):
         hidden = False
         text_label = [TextLabel.create_default()]
 
-        layer_config = LayerConfig(self.layer_uuid, self.layer.name(), color, columns, self.is_visible, vis_config,
+        layer_config = LayerConfig(self.layer_uuid, self.snapshot.name, color, columns, self.is_visible, vis_config,
                                    hidden, text_label)
 
         id_ = str(self.layer_uuid).replace("-", "")[:7]
@@ -159,7 +175,7 @@ class LayerToLayerConfig(BaseConfigCreatorTask):
         if stroke_colors:
             vis_config.stroke_color_range = ColorRange.create_custom(stroke_colors)
         categorizing_field = self._qgis_field_to_unfolded_field(
-            self.layer.fields()[self.layer.fields().indexOf(renderer.classAttribute())])
+            self.snapshot.fields[self.snapshot.fields.indexOf(renderer.classAttribute())])
         categorizing_field.analyzer_type = None
         categorizing_field.format = None
         color_field, stroke_field = [None] * 2
@@ -167,10 +183,11 @@ class LayerToLayerConfig(BaseConfigCreatorTask):
             color_field = categorizing_field
         if len(set(stroke_colors)) > 1:
             stroke_field = categorizing_field
-        visual_channels = VisualChannels(color_field, scale_name if color_field else VisualChannels.color_scale,
+        visual_channels = VisualChannels(color_field,
+                                         scale_name if color_field else VisualChannels.DEFAULT_COLOR_SCALE,
                                          stroke_field,
-                                         scale_name if stroke_field else VisualChannels.stroke_color_scale, None,
-                                         VisualChannels.size_scale)
+                                         scale_name if stroke_field else VisualChannels.DEFAULT_STROKE_COLOR_SCALE,
+                                         None, VisualChannels.DEFAULT_SIZE_SCALE)
 
         # provide color map for certain graduated symbols
         if scale_name == 'custom':
@@ -192,9 +209,9 @@ class LayerToLayerConfig(BaseConfigCreatorTask):
         properties = symbol_layer.properties()
 
         # Default values
-        radius = VisConfig.radius
+        radius = VisConfig.DEFAULT_RADIUS
         color_range = ColorRange.create_default()
-        radius_range = VisConfig.radius_range
+        radius_range = VisConfig.DEFAULT_RADIUS_RANGE
 
         if isinstance(symbol, QgsMarkerSymbol) or isinstance(symbol, QgsFillSymbol):
             fill_rgb, alpha = extract_color(properties['color'])
@@ -216,9 +233,9 @@ class LayerToLayerConfig(BaseConfigCreatorTask):
                 radius = self._convert_to_pixels(float(properties['size']), properties['size_unit'], radius=True)
                 thickness = thickness if thickness > 0.0 else 1.0  # Hairline in QGIS
             else:
-                size_range = VisConfig.size_range
-                height_range = VisConfig.height_range
-                elevation_scale = VisConfig.elevation_scale
+                size_range = VisConfig.DEFAULT_SIZE_RANGE
+                height_range = VisConfig.DEFAULT_HEIGHT_RANGE
+                elevation_scale = VisConfig.DEFAULT_ELEVATION_SCALE
                 if outline:
                     stroked = True
                 else:
@@ -232,9 +249,9 @@ class LayerToLayerConfig(BaseConfigCreatorTask):
             stroke_opacity = opacity
             thickness = self._convert_to_pixels(float(properties['line_width']), properties['line_width_unit'])
 
-            size_range = VisConfig.size_range
-            height_range = VisConfig.height_range
-            elevation_scale = VisConfig.elevation_scale
+            size_range = VisConfig.DEFAULT_SIZE_RANGE
+            height_range = VisConfig.DEFAULT_HEIGHT_RANGE
+            elevation_scale = VisConfig.DEFAULT_ELEVATION_SCALE
             stroked = True
             wireframe, enable3_d, filled = [False] * 3
             stroke_color, fixed_radius, outline = [None] * 3
@@ -242,7 +259,7 @@ class LayerToLayerConfig(BaseConfigCreatorTask):
             raise QgsPluginNotImplementedException(tr('Symbol type {} is not supported yet', symbol.type()),
                                                    bar_msg=bar_msg())
 
-        thickness = thickness if thickness > 0.0 else VisConfig.thickness
+        thickness = thickness if thickness > 0.0 else VisConfig.DEFAULT_THICKNESS
 
         vis_config = VisConfig(opacity, stroke_opacity, thickness, stroke_color, color_range, color_range, radius,
                                size_range, radius_range, height_range, elevation_scale, stroked, filled, enable3_d,
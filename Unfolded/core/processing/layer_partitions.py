@@ -0,0 +1,121 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import logging
+import math
+from array import array
+from pathlib import Path
+from typing import Optional, List
+
+from qgis.core import QgsFeatureRequest, QgsAbstractFeatureSource, QgsExpression
+
+from .base_config_creator_task import BaseConfigCreatorTask
+from ...qgis_plugin_tools.tools.i18n import tr
+from ...qgis_plugin_tools.tools.resources import plugin_name
+
+# This logger is safe to use inside the task
+LOGGER = logging.getLogger(f'{plugin_name()}_task')
+
+
+class LayerToPartitions(BaseConfigCreatorTask):
+    """
+    Splits the features of the layer into contiguous feature id partitions. Used as a subtask of LayerToDatasets.
+    """
+
+    def __init__(self, layer_to_datasets: 'LayerToDatasets', partition_count: int, fid_field: Optional[str] = None):
+        """
+        :param fid_field: Field of the provider holding the feature ids. Partitions are read as ranges of the field
+        if given, otherwise by their sets of feature ids.
+        """
+        super().__init__('LayerToPartitions')
+        self.layer_to_datasets = layer_to_datasets
+        self.partition_count = partition_count
+        self.fid_field = fid_field
+        self.result_partitions: Optional[List[array]] = None
+
+    def run(self) -> bool:
+        try:
+            self._check_if_canceled()
+            self.result_partitions = self._create_partitions()
+            self.setProgress(100)
+            return True
+        except Exception as e:
+            self.exception = e
+            return False
+
+    def _create_partitions(self) -> List[array]:
+        """ Read the feature ids without attributes or geometries and split them evenly """
+        LOGGER.info(tr('Partitioning layer {}', self.layer_to_datasets.snapshot.name))
+        if self.layer_to_datasets.extent is None:
+            request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setNoAttributes()
+        else:
+            # Geometries are needed to find the features intersecting the extent
+            request = QgsFeatureRequest(self.layer_to_datasets.request).setNoAttributes()
+        fids = array('q', sorted(feature.id() for feature in self.layer_to_datasets.source.getFeatures(request)))
+        self._check_if_canceled()
+
+        size = max(1, math.ceil(len(fids) / self.partition_count))
+        return [fids[i * size:(i + 1) * size] for i in range(self.partition_count)]
+
+
+class PartitionToCsv(BaseConfigCreatorTask):
+    """
+    Writes one partition of the layer features as a csv file without a header. Used as a subtask of LayerToDatasets.
+    """
+
+    def __init__(self, layer_to_datasets: 'LayerToDatasets', layer_to_partitions: LayerToPartitions, index: int,
+                 source: QgsAbstractFeatureSource, output_file: Path):
+        """
+        :param source: Snapshot of the layer used only by this task, since feature sources are not meant to be
+        iterated from multiple threads at the same time
+        """
+        super().__init__(f'PartitionToCsv {index}')
+        self.layer_to_datasets = layer_to_datasets
+        self.layer_to_partitions = layer_to_partitions
+        self.index = index
+        self.source = source
+        self.output_file = output_file
+        self.result_feature_count: Optional[int] = None
+
+    def run(self) -> bool:
+        try:
+            self._check_if_canceled()
+            fids = self.layer_to_partitions.result_partitions[self.index]
+            LOGGER.debug(f'Writing partition {self.index} with {len(fids)} features')
+            request = self._create_request(fids)
+            writer = self.layer_to_datasets._create_writer(self.source, request)
+            # Rows and bytes are counted in the extract stage of the layer
+            with self.layer_to_datasets.profile.stage(self.layer_to_datasets.snapshot.name, f'partition {self.index}'):
+                self.result_feature_count = writer.write(self.output_file, header=False)
+            self.setProgress(100)
+            return True
+        except Exception as e:
+            self.exception = e
+            return False
+
+    def _create_request(self, fids: array) -> QgsFeatureRequest:
+        """
+        Create the request of the partition. A range of the feature id field is filtered by the provider as an
+        ordered scan, while a set of feature ids is looked up one feature at a time.
+        """
+        request = QgsFeatureRequest(self.layer_to_datasets.request)
+        fid_field = self.layer_to_partitions.fid_field
+        if fid_field is None or not fids:
+            return request.setFilterFids(set(fids))
+        column = QgsExpression.quotedColumnRef(fid_field)
+        return request.setFilterExpression(f'{column} >= {fids[0]} AND {column} <= {fids[-1]}')
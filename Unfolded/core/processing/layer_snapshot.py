@@ -0,0 +1,46 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+from typing import Optional
+
+from qgis.core import (QgsVectorLayer, QgsVectorLayerFeatureSource, QgsFeatureRenderer, QgsFields,
+                       QgsCoordinateReferenceSystem)
+
+from ...qgis_plugin_tools.tools.layers import LayerType
+
+
+class LayerSnapshot:
+    """
+    Copy of everything the export tasks need from a layer.
+
+    The live layer must only be used in the main thread, so the snapshot is created there when the layer is added to
+    the export. The tasks read only the snapshot, which allows the layers to be exported in parallel. Changes made to
+    the layer after the snapshot is taken are not exported.
+    """
+
+    def __init__(self, layer: QgsVectorLayer):
+        self.id = layer.id()
+        self.name = layer.name()
+        self.source = QgsVectorLayerFeatureSource(layer)
+        renderer = layer.renderer()
+        self.renderer: Optional[QgsFeatureRenderer] = renderer.clone() if renderer is not None else None
+        self.fields = QgsFields(layer.fields())
+        self.crs = QgsCoordinateReferenceSystem(layer.crs())
+        self.wkb_type = layer.wkbType()
+        self.layer_type = LayerType.from_layer(layer)
+        self.feature_count = layer.featureCount()
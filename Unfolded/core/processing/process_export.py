@@ -0,0 +1,211 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+from qgis.core import QgsApplication, QgsProviderRegistry, QgsVectorLayer, QgsRectangle, QgsFields
+
+from .dataset_archive import DatasetArchive
+from .dataset_writer import Output
+from .layer2dataset import LayerToDatasets
+from .layer_snapshot import LayerSnapshot
+from ..exceptions import ProcessInterruptedException
+from ...definitions.settings import Settings
+from ...qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+# Settings affecting the contents of the dataset that are passed to the worker processes
+FORWARDED_SETTINGS = (Settings.crs, Settings.dataset_writer, Settings.dataset_format, Settings.coordinate_precision)
+
+# QgsApplication of a worker process
+_worker_app: Optional[QgsApplication] = None
+
+
+class DatasetJob:
+    """ Everything a worker process needs to write the dataset of a layer. Must be picklable. """
+
+    def __init__(self, layer: QgsVectorLayer, simplification_tolerance: Optional[float],
+                 extent: Optional[QgsRectangle] = None, clip_to_extent: bool = False,
+                 attribute_names: Optional[Collection[str]] = None):
+        self.uri = layer.source()
+        self.provider = layer.providerType()
+        self.name = layer.name()
+        self.subset_string = layer.subsetString()
+        self.output_file: Optional[str] = None
+        self.simplification_tolerance = simplification_tolerance
+        # Rectangle is passed as its bounds, since Qgis objects can not be pickled
+        self.extent: Optional[Tuple[float, float, float, float]] = (
+            (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()) if extent is not None else None)
+        self.clip_to_extent = clip_to_extent
+        self.attribute_names: Optional[List[str]] = sorted(attribute_names) if attribute_names is not None else None
+        self.settings: Dict[str, Any] = {setting.name: setting.get() for setting in FORWARDED_SETTINGS}
+
+
+class ProcessExporter:
+    """
+    Writes the datasets of file based layers in worker processes, so that the per feature work is not limited by
+    the GIL of the QGIS process.
+
+    Each worker runs a standalone QgsApplication with its own temporary settings and opens the layer from its data
+    source. Layers that exist only in the QGIS process, such as memory layers and layers with unsaved edits, are not
+    supported and are exported with the in-process tasks instead. So are the layers with joins, virtual fields or a
+    crs set in QGIS, since the worker would not read the same fields or coordinates from the data source.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._settings_dir: Optional[tempfile.TemporaryDirectory] = None
+
+    @staticmethod
+    def is_available() -> bool:
+        """ Whether worker processes can be started from this Python """
+        return _python_executable() is not None
+
+    @staticmethod
+    def supports(layer: QgsVectorLayer) -> bool:
+        """ Whether a worker process can read the same features as the layer """
+        if layer.providerType() != 'ogr' or layer.isEditable() or layer.isModified():
+            return False
+        if layer.vectorJoins() or layer.crs() != layer.dataProvider().crs():
+            return False
+        fields = layer.fields()
+        if any(fields.fieldOrigin(i) != QgsFields.OriginProvider for i in range(fields.count())):
+            return False
+        path = QgsProviderRegistry.instance().decodeUri('ogr', layer.source()).get('path')
+        return bool(path) and os.path.isfile(path)
+
+    def submit(self, job: DatasetJob) -> Future:
+        """ Write the dataset in a worker process, the result of the future is the number of written features """
+        if self._executor is None:
+            self._settings_dir = tempfile.TemporaryDirectory()
+            context = multiprocessing.get_context('spawn')
+            context.set_executable(_python_executable())
+            self._executor = ProcessPoolExecutor(self.max_workers, context, _init_worker,
+                                                 (QgsApplication.prefixPath(), self._settings_dir.name))
+        LOGGER.debug(f'Writing layer {job.name} in a worker process')
+        return self._executor.submit(_write_dataset, job)
+
+    def shutdown(self) -> None:
+        """ Stop the worker processes once the jobs that have already started are finished """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._settings_dir is not None:
+            self._settings_dir.cleanup()
+            self._settings_dir = None
+
+
+class ProcessLayerToDatasets(LayerToDatasets):
+    """
+    Creates dataset from a file based layer by writing the dataset file in a worker process of the exporter. The task
+    only waits for the worker, so the tasks of the other layers are not slowed down by it.
+    """
+
+    # Seconds between the checks for cancellation while waiting for the worker
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, layer_uuid: uuid.UUID, layer: QgsVectorLayer, color: Tuple[int, int, int],
+                 exporter: ProcessExporter, output_directory: Optional[Path] = None,
+                 simplification_tolerance: Optional[float] = None, archive: Optional[DatasetArchive] = None,
+                 snapshot: Optional[LayerSnapshot] = None, extent: Optional[QgsRectangle] = None,
+                 clip_to_extent: bool = False, attribute_names: Optional[Collection[str]] = None):
+        super().__init__(layer_uuid, layer, color, output_directory, simplification_tolerance, archive, snapshot,
+                         extent, clip_to_extent, attribute_names)
+        self.exporter = exporter
+        self.job = DatasetJob(layer, simplification_tolerance, extent, clip_to_extent, attribute_names)
+
+    def _add_partition_subtasks(self, layer: QgsVectorLayer) -> None:
+        """ The worker writes the whole layer """
+
+    def _write_dataset(self, output: Output) -> None:
+        if isinstance(output, Path):
+            self._run_job(output)
+            return
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_file = Path(temp_dir, self._get_dataset_file_name())
+            self._run_job(output_file)
+            with open(output_file, 'rb') as f:
+                shutil.copyfileobj(f, output)
+
+    def _run_job(self, output_file: Path) -> None:
+        self.job.output_file = str(output_file)
+        future = self.exporter.submit(self.job)
+        while True:
+            try:
+                feature_count = future.result(timeout=self.POLL_INTERVAL)
+                break
+            except TimeoutError:
+                if self.isCanceled():
+                    # Worker that has already started finishes the file, which is then removed with the output
+                    future.cancel()
+                    raise ProcessInterruptedException()
+        self.feedback.add_processed_features(feature_count)
+
+
+def _python_executable() -> Optional[str]:
+    """ Get the Python interpreter for the worker processes. QGIS itself is the executable of the plugins. """
+    if Path(sys.executable).name.lower().startswith('python'):
+        return sys.executable
+    prefix = Path(sys.exec_prefix)
+    for candidate in (prefix / 'python.exe', prefix / 'bin' / 'python3', prefix / 'bin' / 'python'):
+        if candidate.is_file():
+            return str(candidate)
+    return None
+
+
+def _init_worker(prefix_path: str, settings_dir: str) -> None:
+    """ Start QGIS in the worker process with settings that are separate from the settings of the user """
+    global _worker_app
+    from PyQt5.QtCore import QSettings
+    QSettings.setDefaultFormat(QSettings.IniFormat)
+    QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, settings_dir)
+    QgsApplication.setPrefixPath(prefix_path, True)
+    _worker_app = QgsApplication([], False)
+    _worker_app.initQgis()
+
+
+def _write_dataset(job: DatasetJob) -> int:
+    """ Write the dataset in the worker process with the same writers as the in-process tasks """
+    for name, value in job.settings.items():
+        Settings[name].set(value)
+    # The worker writes the whole layer to the given file
+    Settings.dataset_cache_size.set(0)
+    Settings.dataset_partition_size.set(0)
+
+    layer = QgsVectorLayer(job.uri, job.name, job.provider)
+    if not layer.isValid():
+        raise ValueError(f'Could not open layer {job.name} from {job.uri}')
+    if job.subset_string and layer.subsetString() != job.subset_string:
+        layer.setSubsetString(job.subset_string)
+
+    task = LayerToDatasets(uuid.uuid4(), layer, (0, 0, 0), Path(job.output_file).parent, job.simplification_tolerance,
+                           extent=QgsRectangle(*job.extent) if job.extent is not None else None,
+                           clip_to_extent=job.clip_to_extent, attribute_names=job.attribute_names)
+    task._write_dataset(Path(job.output_file))
+    return task.feedback.processed_features
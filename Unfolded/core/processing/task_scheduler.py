@@ -0,0 +1,101 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import logging
+from typing import Callable, Dict, List, Tuple
+
+from qgis.core import QgsTask
+
+from ...qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+
+class TaskScheduler:
+    """
+    Submits the tasks of a configuration to the task manager.
+
+    Style tasks are submitted at once, since they are fast and their errors should be shown before any data is
+    extracted. Dataset tasks are submitted after all style tasks have finished, the cheapest first, so that the number
+    of running dataset tasks and their estimated memory stay within the limits. One dataset task is always allowed to
+    run even if its estimate alone exceeds the memory budget.
+    """
+
+    def __init__(self, submit: Callable[[QgsTask], None], max_running: int = 0, memory_budget: int = 0):
+        """
+        :param submit: Function that starts the task, such as QgsTaskManager.addTask
+        :param max_running: Maximum number of dataset tasks running at the same time, 0 for no limit
+        :param memory_budget: Maximum estimated memory of the running dataset tasks in bytes, 0 for no limit
+        """
+        self._submit = submit
+        self.max_running = max_running
+        self.memory_budget = memory_budget
+        self._style_tasks: List[QgsTask] = []
+        self._queue: List[Tuple[int, QgsTask]] = []
+        self._running: Dict[int, int] = {}
+        self._started = False
+
+    def add_style_task(self, task: QgsTask) -> None:
+        self._style_tasks.append(task)
+
+    def add_dataset_task(self, task: QgsTask, estimated_memory: int) -> None:
+        """
+        :param estimated_memory: Estimated memory usage of the task in bytes, also used as the cost of the task
+        """
+        self._queue.append((estimated_memory, task))
+
+    def start(self) -> None:
+        """ Submit the style tasks, or the first dataset tasks if there are no style tasks """
+        self._started = True
+        # Stable sort keeps the order of the layers with the same cost
+        self._queue.sort(key=lambda item: item[0])
+        for task in list(self._style_tasks):
+            self._submit(task)
+        self._submit_dataset_tasks()
+
+    def task_finished(self, task: QgsTask) -> None:
+        """ Submit more dataset tasks once the task has either completed or terminated """
+        if task in self._style_tasks:
+            self._style_tasks.remove(task)
+        self._running.pop(id(task), None)
+        if self._started:
+            self._submit_dataset_tasks()
+
+    def cancel_queued(self) -> List[QgsTask]:
+        """ Remove the dataset tasks that have not been submitted yet and return them """
+        queued = [task for _, task in self._queue]
+        self._queue.clear()
+        return queued
+
+    def _submit_dataset_tasks(self) -> None:
+        if self._style_tasks:
+            return
+        while self._queue:
+            estimated_memory, task = self._queue[0]
+            if self._running and not self._fits(estimated_memory):
+                break
+            self._queue.pop(0)
+            self._running[id(task)] = estimated_memory
+            LOGGER.debug(f'Submitting {task.description()} with estimated memory of '
+                         f'{estimated_memory / 1024 / 1024:.1f} MB')
+            self._submit(task)
+
+    def _fits(self, estimated_memory: int) -> bool:
+        if self.max_running and len(self._running) >= self.max_running:
+            return False
+        return not self.memory_budget or sum(self._running.values()) + estimated_memory <= self.memory_budget
@@ -70,6 +70,15 @@ def generate_zoom_level(scale: float, dpi: int) -> float:
     return zoomlevel
 
 
+def zoom_level_to_tolerance(zoom: float) -> float:
+    """
+    Generates simplification tolerance in degrees from zoom level
+
+    The tolerance is half of the size of a pixel at the equator when the map is rendered with 512 pixel tiles.
+    """
+    return 360.0 / (512 * 2 ** zoom) / 2
+
+
 def random_color() -> QColor:
     """ Generate random color. Adapted from https://stackoverflow.com/a/28999469/10068922 """
     color = [random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)]
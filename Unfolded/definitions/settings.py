@@ -18,11 +18,14 @@
 #  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
 import enum
 import json
+import os
 from typing import Union, List
 
+from PyQt5.QtCore import QStandardPaths
+
 from ..qgis_plugin_tools.tools.exceptions import QgsPluginException
 from ..qgis_plugin_tools.tools.i18n import tr
-from ..qgis_plugin_tools.tools.resources import resources_path
+from ..qgis_plugin_tools.tools.resources import resources_path, plugin_name
 from ..qgis_plugin_tools.tools.settings import get_setting, set_setting
 
 
@@ -34,6 +37,34 @@ class Settings(enum.Enum):
     layer_blending = 'normal'
     studio_url = 'https://studio.foursquare.com/workspace/maps/import'
 
+    # datasets
+    dataset_writer = 'native'
+    dataset_format = 'csv'
+    # Layers with at least two times this many features are written in parallel partitions
+    dataset_partition_size = 1000000
+    # Lines and polygons are simplified with tolerance derived from the zoom of the map or with a fixed tolerance
+    simplification = 'none'
+    simplification_tolerance = 0.0001  # In degrees
+    # Export all attributes or only the ones shown in the tooltip, used by the style or selected explicitly
+    attribute_projection = 'all'
+    # Number of decimals in the exported coordinates, negative values disable rounding
+    coordinate_precision = 6
+    # Datasets of unchanged file based layers are reused from the cache, size in megabytes, 0 disables the cache.
+    # Cache is kept in the cache directory of the user, since the plugin directory is replaced when it is upgraded.
+    dataset_cache_dir = os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation), plugin_name(),
+                                     'dataset_cache')
+    dataset_cache_size = 2048
+    # Write datasets to a temporary directory before adding them to the zip file instead of streaming them into it
+    stage_datasets = False
+    # Maximum number of datasets extracted at the same time, 0 for no limit
+    max_dataset_tasks = 4
+    # Maximum estimated memory of the datasets extracted at the same time in megabytes, 0 for no limit
+    dataset_memory_budget = 4096
+    # Write the datasets of file based layers in worker processes instead of the tasks of the QGIS process
+    export_engine = 'tasks'
+    # Write the timings of the export stages next to the zip file or into it
+    export_profile = 'off'
+
     # size
     pixel_size_unit = 'Pixel'
     millimeter_size_unit = 'MM'
@@ -62,12 +93,23 @@ class Settings(enum.Enum):
     }
 
     _options = {'layer_blending': ['normal', 'additive', 'substractive'],
+                'dataset_writer': ['native', 'gdal', 'vectortranslate'],
+                'dataset_format': ['csv', 'arrow'],
+                'simplification': ['none', 'zoom', 'tolerance'],
+                'attribute_projection': ['all', 'used'],
+                'export_engine': ['tasks', 'processes'],
+                'export_profile': ['off', 'file', 'archive'],
                 'basemap': ['dark', 'light', 'muted', 'muted_night', 'satellite', 'satellite-street', 'streets']}
 
     def get(self, typehint: type = str) -> any:
         """Gets the value of the setting"""
-        if self in (Settings.millimeters_to_pixels, Settings.width_pixel_factor):
+        if self in (Settings.millimeters_to_pixels, Settings.width_pixel_factor, Settings.simplification_tolerance):
             typehint = float
+        elif self in (Settings.dataset_partition_size, Settings.coordinate_precision, Settings.dataset_cache_size,
+                      Settings.max_dataset_tasks, Settings.dataset_memory_budget):
+            typehint = int
+        elif self in (Settings.stage_datasets,):
+            typehint = bool
         elif self in (Settings.wmts_basemaps,):
             return json.loads(get_setting(self.name, json.dumps(self.value), str))
         value = get_setting(self.name, self.value, typehint)
@@ -16,7 +16,7 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
-from typing import TypeVar, Any, Callable, List, Type, cast
+from typing import TypeVar, Any, Callable, List, Optional, Type, cast
 
 T = TypeVar("T")
 
@@ -48,6 +48,10 @@ def from_str(x: Any) -> str:
 
 def from_list(f: Callable[[Any], T], x: Any) -> List[T]:
     assert isinstance(x, list)
+    item_type = _SCALAR_TYPES.get(f)
+    if item_type is not None and (item_type is object or all(type(y) is item_type for y in x)):
+        # Every item would be returned as is, skip the per item calls
+        return list(x)
     return [f(y) for y in x]
 
 
@@ -56,11 +60,24 @@ def to_class(c: Type[T], x: Any) -> dict:
     return cast(Any, x).to_dict()
 
 
+def from_any(x: Any) -> Any:
+    return x
+
+
 def from_none(x: Any) -> Any:
     assert x is None
     return x
 
 
+# Converters that return items of exactly this type unchanged, object for any item
+_SCALAR_TYPES = {from_int: int, from_bool: bool, from_float: float, to_float: float, from_str: str,
+                 from_any: object}
+
+
+def from_optional(f: Callable[[Any], T], x: Any) -> Optional[T]:
+    return None if x is None else f(x)
+
+
 def from_union(fs, x):
     for f in fs:
         try:
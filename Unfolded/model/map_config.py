@@ -25,10 +25,12 @@ from typing import Any, List, Optional, Union, Tuple
 from uuid import UUID
 
 from .conversion_utils import (from_int, from_bool, from_float, to_float, from_str, from_list,
-                               to_class, from_none, from_union)
+                               to_class, from_none, from_optional, from_any)
 
 
 class GlobeConfig:
+    __slots__ = ("atmosphere", "azimuth", "azimuth_angle", "basemap", "labels", "terminator", "terminator_opacity")
+
     atmosphere: bool
     azimuth: bool
     azimuth_angle: int
@@ -72,6 +74,8 @@ class GlobeConfig:
 
 
 class Globe:
+    __slots__ = ("enabled", "config")
+
     enabled: bool
     config: GlobeConfig
 
@@ -100,6 +104,10 @@ class Globe:
 
 
 class MapState:
+    __slots__ = ("bearing", "drag_rotate", "latitude", "longitude", "pitch", "zoom", "is_split", "map_view_mode",
+                 "globe")
+    DEFAULT_MAP_VIEW_MODE = "MODE_2D"
+
     bearing: int
     drag_rotate: bool
     latitude: float
@@ -107,7 +115,7 @@ class MapState:
     pitch: int
     zoom: float
     is_split: bool
-    map_view_mode: Optional[str] = "MODE_2D"
+    map_view_mode: Optional[str]
     globe: Optional[Globe]
 
     def __init__(self, bearing: int, drag_rotate: bool, latitude: float, longitude: float, pitch: int, zoom: float,
@@ -132,8 +140,8 @@ class MapState:
         pitch = from_int(obj.get("pitch"))
         zoom = from_float(obj.get("zoom"))
         is_split = from_bool(obj.get("isSplit"))
-        map_view_mode = from_union([from_str, from_none], obj.get("mapViewMode"))
-        globe = from_union([Globe.from_dict, from_none], obj.get("globe"))
+        map_view_mode = from_optional(from_str, obj.get("mapViewMode"))
+        globe = from_optional(Globe.from_dict, obj.get("globe"))
         return MapState(bearing, drag_rotate, latitude, longitude, pitch, zoom, is_split, map_view_mode, globe)
 
     def to_dict(self) -> dict:
@@ -146,13 +154,15 @@ class MapState:
         result["zoom"] = to_float(self.zoom)
         result["isSplit"] = from_bool(self.is_split)
         if self.map_view_mode:
-            result["mapViewMode"] = from_union([from_str, from_none], self.map_view_mode)
+            result["mapViewMode"] = from_optional(from_str, self.map_view_mode)
         if self.globe:
-            result["globe"] = from_union([lambda x: to_class(Globe, x), from_none], self.globe)
+            result["globe"] = from_optional(lambda x: to_class(Globe, x), self.globe)
         return result
 
 
 class AnyDict:
+    __slots__ = ("content",)
+
     pass
 
     def __init__(self, content: dict) -> None:
@@ -169,6 +179,8 @@ class AnyDict:
 
 
 class VisibleLayerGroups:
+    __slots__ = ("label", "road", "border", "building", "water", "land", "the_3_d_building")
+
     label: bool
     road: bool
     border: bool
@@ -218,11 +230,16 @@ class VisibleLayerGroups:
 
 
 class MapStyle:
+    __slots__ = ("style_type", "top_layer_groups", "visible_layer_groups", "three_d_building_color", "map_styles")
+    DEFAULT_TOP_LAYER_GROUPS = AnyDict({})
+    DEFAULT_THREE_D_BUILDING_COLOR = [9.665468314072013, 17.18305478057247, 31.1442867897876]
+    DEFAULT_MAP_STYLES = AnyDict({})
+
     style_type: str
-    top_layer_groups: AnyDict = AnyDict({})
+    top_layer_groups: AnyDict
     visible_layer_groups: VisibleLayerGroups
-    three_d_building_color: List[float] = [9.665468314072013, 17.18305478057247, 31.1442867897876]
-    map_styles: AnyDict = AnyDict({})
+    three_d_building_color: List[float]
+    map_styles: AnyDict
 
     def __init__(self, style_type: str, top_layer_groups: AnyDict, visible_layer_groups: VisibleLayerGroups,
                  three_d_building_color: List[float], map_styles: AnyDict) -> None:
@@ -253,8 +270,11 @@ class MapStyle:
 
 
 class AnimationConfig:
+    __slots__ = ("current_time", "speed")
+    DEFAULT_SPEED = 1
+
     current_time: None
-    speed: int = 1
+    speed: int
 
     def __init__(self, current_time: None, speed: int) -> None:
         self.current_time = current_time
@@ -275,6 +295,8 @@ class AnimationConfig:
 
 
 class FieldDisplayNames:
+    __slots__ = ("content",)
+
     # TODO: type and field checks
     content: AnyDict
 
@@ -293,6 +315,8 @@ class FieldDisplayNames:
 
 
 class Datasets:
+    __slots__ = ("field_display_names",)
+
     field_display_names: FieldDisplayNames
 
     def __init__(self, field_display_names: FieldDisplayNames) -> None:
@@ -311,6 +335,8 @@ class Datasets:
 
 
 class Brush:
+    __slots__ = ("size", "enabled")
+
     size: float
     enabled: bool
 
@@ -333,6 +359,8 @@ class Brush:
 
 
 class Coordinate:
+    __slots__ = ("enabled",)
+
     enabled: bool
 
     def __init__(self, enabled: bool) -> None:
@@ -351,6 +379,8 @@ class Coordinate:
 
 
 class FieldsToShow:
+    __slots__ = ("content",)
+
     # TODO: type and field checks
     # name: str
     # format: None
@@ -371,9 +401,13 @@ class FieldsToShow:
 
 
 class Tooltip:
+    __slots__ = ("fields_to_show", "compare_mode", "compare_type", "enabled")
+    DEFAULT_COMPARE_MODE = False
+    DEFAULT_COMPARE_TYPE = "absolute"
+
     fields_to_show: FieldsToShow
-    compare_mode: bool = False
-    compare_type: str = "absolute"
+    compare_mode: bool
+    compare_type: str
     enabled: bool
 
     def __init__(self, fields_to_show: FieldsToShow, compare_mode: bool, compare_type: str, enabled: bool) -> None:
@@ -401,6 +435,8 @@ class Tooltip:
 
 
 class InteractionConfig:
+    __slots__ = ("tooltip", "brush", "geocoder", "coordinate")
+
     tooltip: Tooltip
     brush: Brush
     geocoder: Coordinate
@@ -431,6 +467,8 @@ class InteractionConfig:
 
 
 class ColumnsColumns:
+    __slots__ = ("lat", "lng", "altitude")
+
     lat: Optional[str]
     lng: Optional[str]
     altitude: None
@@ -443,20 +481,22 @@ class ColumnsColumns:
     @staticmethod
     def from_dict(obj: Any) -> 'ColumnsColumns':
         assert isinstance(obj, dict)
-        lat = from_union([from_str, from_none], obj.get("lat"))
-        lng = from_union([from_str, from_none], obj.get("lng"))
+        lat = from_optional(from_str, obj.get("lat"))
+        lng = from_optional(from_str, obj.get("lng"))
         altitude = from_none(obj.get("altitude"))
         return ColumnsColumns(lat, lng, altitude)
 
     def to_dict(self) -> dict:
         result: dict = {}
-        result["lat"] = from_union([from_str, from_none], self.lat)
-        result["lng"] = from_union([from_str, from_none], self.lng)
+        result["lat"] = from_optional(from_str, self.lat)
+        result["lng"] = from_optional(from_str, self.lng)
         result["altitude"] = from_none(self.altitude)
         return result
 
 
 class Columns:
+    __slots__ = ("geojson", "lat", "lng", "altitude")
+
     geojson: Optional[str]
     columns: Optional[ColumnsColumns]
     lat: Optional[str]
@@ -480,25 +520,27 @@ class Columns:
     @staticmethod
     def from_dict(obj: Any) -> 'Columns':
         assert isinstance(obj, dict)
-        geojson = from_union([from_str, from_none], obj.get("geojson"))
-        lat = from_union([from_str, from_none], obj.get("lat"))
-        lng = from_union([from_str, from_none], obj.get("lng"))
-        altitude = from_union([from_str, from_none], obj.get("altitude"))
+        geojson = from_optional(from_str, obj.get("geojson"))
+        lat = from_optional(from_str, obj.get("lat"))
+        lng = from_optional(from_str, obj.get("lng"))
+        altitude = from_optional(from_str, obj.get("altitude"))
         return Columns(geojson, lat, lng, altitude)
 
     def to_dict(self) -> dict:
         result: dict = {}
         if self.geojson:
-            result["geojson"] = from_union([from_str, from_none], self.geojson)
+            result["geojson"] = from_optional(from_str, self.geojson)
         if self.lat is not None:
-            result["lat"] = from_union([from_str, from_none], self.lat)
-            result["lng"] = from_union([from_str, from_none], self.lng)
-            result["altitude"] = from_union([from_str, from_none], self.altitude)
+            result["lat"] = from_optional(from_str, self.lat)
+            result["lng"] = from_optional(from_str, self.lng)
+            result["altitude"] = from_optional(from_str, self.altitude)
 
         return result
 
 
 class TextLabel:
+    __slots__ = ("field", "color", "size", "offset", "anchor", "alignment")
+
     field: None
     color: List[int]
     size: int
@@ -556,6 +598,8 @@ class TextLabel:
 
 
 class ColorRange:
+    __slots__ = ("name", "type", "category", "colors", "color_map")
+
     name: str
     type: str
     category: str
@@ -599,17 +643,27 @@ class ColorRange:
 
 
 class VisConfig:
+    __slots__ = ("opacity", "stroke_opacity", "thickness", "stroke_color", "color_range", "stroke_color_range",
+                 "radius", "size_range", "radius_range", "height_range", "elevation_scale", "stroked", "filled",
+                 "enable3_d", "wireframe", "fixed_radius", "outline")
+    DEFAULT_THICKNESS = 2.0
+    DEFAULT_RADIUS = 10
+    DEFAULT_SIZE_RANGE = [0, 10]
+    DEFAULT_RADIUS_RANGE = [0, 50]
+    DEFAULT_HEIGHT_RANGE = [0, 500]
+    DEFAULT_ELEVATION_SCALE = 5
+
     opacity: float
     stroke_opacity: Optional[float]
-    thickness: float = 2.0
+    thickness: float
     stroke_color: Optional[List[int]]
     color_range: ColorRange
     stroke_color_range: ColorRange
-    radius: int = 10
-    size_range: Optional[List[int]] = [0, 10]
-    radius_range: List[int] = [0, 50]
-    height_range: Optional[List[int]] = [0, 500]
-    elevation_scale: Optional[int] = 5
+    radius: int
+    size_range: Optional[List[int]]
+    radius_range: List[int]
+    height_range: Optional[List[int]]
+    elevation_scale: Optional[int]
     stroked: Optional[bool]
     filled: Optional[bool]
     enable3_d: Optional[bool]
@@ -645,22 +699,22 @@ class VisConfig:
     def from_dict(obj: Any) -> 'VisConfig':
         assert isinstance(obj, dict)
         opacity = from_float(obj.get("opacity"))
-        stroke_opacity = from_union([from_float, from_none], obj.get("strokeOpacity"))
+        stroke_opacity = from_optional(from_float, obj.get("strokeOpacity"))
         thickness = from_float(obj.get("thickness"))
-        stroke_color = from_union([lambda x: from_list(from_int, x), from_none], obj.get("strokeColor"))
+        stroke_color = from_optional(lambda x: from_list(from_int, x), obj.get("strokeColor"))
         color_range = ColorRange.from_dict(obj.get("colorRange"))
         stroke_color_range = ColorRange.from_dict(obj.get("strokeColorRange"))
         radius = from_int(obj.get("radius"))
-        size_range = from_union([lambda x: from_list(from_int, x), from_none], obj.get("sizeRange"))
+        size_range = from_optional(lambda x: from_list(from_int, x), obj.get("sizeRange"))
         radius_range = from_list(from_int, obj.get("radiusRange"))
-        height_range = from_union([lambda x: from_list(from_int, x), from_none], obj.get("heightRange"))
-        elevation_scale = from_union([from_int, from_none], obj.get("elevationScale"))
-        stroked = from_union([from_bool, from_none], obj.get("stroked"))
-        filled = from_union([from_bool, from_none], obj.get("filled"))
-        enable3_d = from_union([from_bool, from_none], obj.get("enable3d"))
-        wireframe = from_union([from_bool, from_none], obj.get("wireframe"))
-        fixed_radius = from_union([from_bool, from_none], obj.get("fixedRadius"))
-        outline = from_union([from_bool, from_none], obj.get("outline"))
+        height_range = from_optional(lambda x: from_list(from_int, x), obj.get("heightRange"))
+        elevation_scale = from_optional(from_int, obj.get("elevationScale"))
+        stroked = from_optional(from_bool, obj.get("stroked"))
+        filled = from_optional(from_bool, obj.get("filled"))
+        enable3_d = from_optional(from_bool, obj.get("enable3d"))
+        wireframe = from_optional(from_bool, obj.get("wireframe"))
+        fixed_radius = from_optional(from_bool, obj.get("fixedRadius"))
+        outline = from_optional(from_bool, obj.get("outline"))
         return VisConfig(opacity, stroke_opacity, thickness, stroke_color, color_range, stroke_color_range, radius,
                          size_range, radius_range, height_range, elevation_scale, stroked, filled, enable3_d, wireframe,
                          fixed_radius, outline)
@@ -668,37 +722,39 @@ class VisConfig:
     def to_dict(self) -> dict:
         result: dict = {}
         result["opacity"] = to_float(self.opacity)
-        result["strokeOpacity"] = from_union([to_float, from_none], self.stroke_opacity)
+        result["strokeOpacity"] = from_optional(to_float, self.stroke_opacity)
         result["thickness"] = to_float(self.thickness)
-        result["strokeColor"] = from_union([lambda x: from_list(from_int, x), from_none], self.stroke_color)
+        result["strokeColor"] = from_optional(lambda x: from_list(from_int, x), self.stroke_color)
         result["colorRange"] = to_class(ColorRange, self.color_range)
         result["strokeColorRange"] = to_class(ColorRange, self.stroke_color_range)
         result["radius"] = from_int(self.radius)
         result["radiusRange"] = from_list(from_int, self.radius_range)
 
         if self.stroked is not None:
-            result["stroked"] = from_union([from_bool, from_none], self.stroked)
+            result["stroked"] = from_optional(from_bool, self.stroked)
         if self.filled is not None:
-            result["filled"] = from_union([from_bool, from_none], self.filled)
+            result["filled"] = from_optional(from_bool, self.filled)
         if self.enable3_d is not None:
-            result["enable3d"] = from_union([from_bool, from_none], self.enable3_d)
+            result["enable3d"] = from_optional(from_bool, self.enable3_d)
         if self.wireframe is not None:
-            result["wireframe"] = from_union([from_bool, from_none], self.wireframe)
+            result["wireframe"] = from_optional(from_bool, self.wireframe)
         if self.elevation_scale:
-            result["elevationScale"] = from_union([from_int, from_none], self.elevation_scale)
+            result["elevationScale"] = from_optional(from_int, self.elevation_scale)
         if self.size_range:
-            result["sizeRange"] = from_union([lambda x: from_list(from_int, x), from_none], self.size_range)
+            result["sizeRange"] = from_optional(lambda x: from_list(from_int, x), self.size_range)
         if self.height_range:
-            result["heightRange"] = from_union([lambda x: from_list(from_int, x), from_none], self.height_range)
+            result["heightRange"] = from_optional(lambda x: from_list(from_int, x), self.height_range)
         if self.fixed_radius is not None:
-            result["fixedRadius"] = from_union([from_bool, from_none], self.fixed_radius)
+            result["fixedRadius"] = from_optional(from_bool, self.fixed_radius)
         if self.outline is not None:
-            result["outline"] = from_union([from_bool, from_none], self.outline)
+            result["outline"] = from_optional(from_bool, self.outline)
 
         return result
 
 
 class LayerConfig:
+    __slots__ = ("data_id", "label", "color", "columns", "is_visible", "vis_config", "hidden", "text_label")
+
     data_id: UUID
     label: str
     color: List[int]
@@ -746,6 +802,8 @@ class LayerConfig:
 
 
 class Field:
+    __slots__ = ("name", "type", "format", "analyzer_type")
+
     name: str
     type: str
     format: Optional[str]
@@ -762,8 +820,8 @@ class Field:
         assert isinstance(obj, dict)
         name = from_str(obj.get("name"))
         type = from_str(obj.get("type"))
-        format = from_union([from_str, from_none], obj.get("format"))
-        analyzer_type = from_union([from_str, from_none], obj.get("analyzerType"))
+        format = from_optional(from_str, obj.get("format"))
+        analyzer_type = from_optional(from_str, obj.get("analyzerType"))
         return Field(name, type, format, analyzer_type)
 
     def to_dict(self) -> dict:
@@ -772,23 +830,31 @@ class Field:
         result["type"] = from_str(self.type)
 
         if self.format is not None:
-            result["format"] = from_union([from_str, from_none], self.format)
+            result["format"] = from_optional(from_str, self.format)
         if self.analyzer_type is not None:
-            result["analyzerType"] = from_union([from_str, from_none], self.analyzer_type)
+            result["analyzerType"] = from_optional(from_str, self.analyzer_type)
         return result
 
 
 class VisualChannels:
+    __slots__ = ("color_field", "color_scale", "stroke_color_field", "stroke_color_scale", "size_field", "size_scale",
+                 "height_field", "height_scale", "radius_field", "radius_scale")
+    DEFAULT_COLOR_SCALE = "quantile"
+    DEFAULT_STROKE_COLOR_SCALE = "quantile"
+    DEFAULT_SIZE_SCALE = "linear"
+    DEFAULT_HEIGHT_SCALE = "linear"
+    DEFAULT_RADIUS_SCALE = "linear"
+
     color_field: Optional[Field]
-    color_scale: str = "quantile"
+    color_scale: str
     stroke_color_field: Optional[Field]
-    stroke_color_scale: str = "quantile"
+    stroke_color_scale: str
     size_field: Optional[Field]
-    size_scale: str = "linear"
+    size_scale: str
     height_field: Optional[Field]
-    height_scale: Optional[str] = "linear"
+    height_scale: Optional[str]
     radius_field: Optional[Field]
-    radius_scale: Optional[str] = "linear"
+    radius_scale: Optional[str]
 
     def __init__(self, color_field: Optional[Field], color_scale: str, stroke_color_field: Optional[Field],
                  stroke_color_scale: str, size_field: Optional[Field], size_scale: str,
@@ -817,38 +883,40 @@ class VisualChannels:
     @staticmethod
     def from_dict(obj: Any) -> 'VisualChannels':
         assert isinstance(obj, dict)
-        color_field = from_union([Field.from_dict, from_none], obj.get("colorField"))
+        color_field = from_optional(Field.from_dict, obj.get("colorField"))
         color_scale = from_str(obj.get("colorScale"))
-        stroke_color_field = from_union([Field.from_dict, from_none], obj.get("strokeColorField"))
+        stroke_color_field = from_optional(Field.from_dict, obj.get("strokeColorField"))
         stroke_color_scale = from_str(obj.get("strokeColorScale"))
-        size_field = from_union([Field.from_dict, from_none], obj.get("sizeField"))
+        size_field = from_optional(Field.from_dict, obj.get("sizeField"))
         size_scale = from_str(obj.get("sizeScale"))
-        height_field = from_union([Field.from_dict, from_none], obj.get("heightField"))
-        height_scale = from_union([from_str, from_none], obj.get("heightScale"))
-        radius_field = from_union([Field.from_dict, from_none], obj.get("radiusField"))
-        radius_scale = from_union([from_str, from_none], obj.get("radiusScale"))
+        height_field = from_optional(Field.from_dict, obj.get("heightField"))
+        height_scale = from_optional(from_str, obj.get("heightScale"))
+        radius_field = from_optional(Field.from_dict, obj.get("radiusField"))
+        radius_scale = from_optional(from_str, obj.get("radiusScale"))
         return VisualChannels(color_field, color_scale, stroke_color_field, stroke_color_scale, size_field, size_scale,
                               height_field, height_scale, radius_field, radius_scale)
 
     def to_dict(self) -> dict:
         result: dict = {}
-        result["colorField"] = from_union([lambda x: to_class(Field, x), from_none], self.color_field)
+        result["colorField"] = from_optional(lambda x: to_class(Field, x), self.color_field)
         result["colorScale"] = from_str(self.color_scale)
-        result["strokeColorField"] = from_union([lambda x: to_class(Field, x), from_none], self.stroke_color_field)
+        result["strokeColorField"] = from_optional(lambda x: to_class(Field, x), self.stroke_color_field)
         result["strokeColorScale"] = from_str(self.stroke_color_scale)
-        result["sizeField"] = from_union([lambda x: to_class(Field, x), from_none], self.size_field)
+        result["sizeField"] = from_optional(lambda x: to_class(Field, x), self.size_field)
         result["sizeScale"] = from_str(self.size_scale)
 
-        result["heightField"] = from_union([lambda x: to_class(Field, x), from_none], self.height_field)
-        result["radiusField"] = from_union([lambda x: to_class(Field, x), from_none], self.radius_field)
+        result["heightField"] = from_optional(lambda x: to_class(Field, x), self.height_field)
+        result["radiusField"] = from_optional(lambda x: to_class(Field, x), self.radius_field)
         if self.height_scale:
-            result["heightScale"] = from_union([from_str, from_none], self.height_scale)
+            result["heightScale"] = from_optional(from_str, self.height_scale)
         if self.radius_scale:
-            result["radiusScale"] = from_union([from_str, from_none], self.radius_scale)
+            result["radiusScale"] = from_optional(from_str, self.radius_scale)
         return result
 
 
 class Layer:
+    __slots__ = ("id", "type", "config", "visual_channels")
+
     id: str
     type: str
     config: LayerConfig
@@ -879,6 +947,9 @@ class Layer:
 
 
 class VisState:
+    __slots__ = ("filters", "layers", "interaction_config", "layer_blending", "split_maps", "animation_config",
+                 "metrics", "geo_keys", "group_bys", "datasets", "joins")
+
     filters: List[Any]
     layers: List[Layer]
     interaction_config: InteractionConfig
@@ -911,37 +982,39 @@ class VisState:
     @staticmethod
     def from_dict(obj: Any) -> 'VisState':
         assert isinstance(obj, dict)
-        filters = from_list(lambda x: x, obj.get("filters"))
+        filters = from_list(from_any, obj.get("filters"))
         layers = from_list(Layer.from_dict, obj.get("layers"))
         interaction_config = InteractionConfig.from_dict(obj.get("interactionConfig"))
         layer_blending = from_str(obj.get("layerBlending"))
-        split_maps = from_list(lambda x: x, obj.get("splitMaps"))
+        split_maps = from_list(from_any, obj.get("splitMaps"))
         animation_config = AnimationConfig.from_dict(obj.get("animationConfig"))
-        metrics = from_union([lambda x: from_list(from_int, x), from_none], obj.get("metrics"))
-        geo_keys = from_union([lambda x: from_list(from_int, x), from_none], obj.get("geoKeys"))
-        group_bys = from_union([lambda x: from_list(from_int, x), from_none], obj.get("groupBys"))
-        datasets = from_union([lambda x: Datasets.from_dict(x), from_none], obj.get("datasets"))
-        joins = from_union([lambda x: from_list(from_int, x), from_none], obj.get("joins"))
+        metrics = from_optional(lambda x: from_list(from_int, x), obj.get("metrics"))
+        geo_keys = from_optional(lambda x: from_list(from_int, x), obj.get("geoKeys"))
+        group_bys = from_optional(lambda x: from_list(from_int, x), obj.get("groupBys"))
+        datasets = from_optional(Datasets.from_dict, obj.get("datasets"))
+        joins = from_optional(lambda x: from_list(from_int, x), obj.get("joins"))
         return VisState(filters, layers, interaction_config, layer_blending, split_maps, animation_config, metrics,
                         geo_keys, group_bys, datasets, joins)
 
     def to_dict(self) -> dict:
         result: dict = {}
-        result["filters"] = from_list(lambda x: x, self.filters)
+        result["filters"] = from_list(from_any, self.filters)
         result["layers"] = from_list(lambda x: to_class(Layer, x), self.layers)
         result["interactionConfig"] = to_class(InteractionConfig, self.interaction_config)
         result["layerBlending"] = from_str(self.layer_blending)
-        result["splitMaps"] = from_list(lambda x: x, self.split_maps)
+        result["splitMaps"] = from_list(from_any, self.split_maps)
         result["animationConfig"] = to_class(AnimationConfig, self.animation_config)
-        result["metrics"] = from_union([lambda x: from_list(from_int, x), from_none], self.metrics)
-        result["geoKeys"] = from_union([lambda x: from_list(from_int, x), from_none], self.geo_keys)
-        result["groupBys"] = from_union([lambda x: from_list(from_int, x), from_none], self.group_bys)
-        result["datasets"] = from_union([lambda x: to_class(Datasets, x), from_none], self.datasets)
-        result["joins"] = from_union([lambda x: from_list(from_int, x), from_none], self.joins)
+        result["metrics"] = from_optional(lambda x: from_list(from_int, x), self.metrics)
+        result["geoKeys"] = from_optional(lambda x: from_list(from_int, x), self.geo_keys)
+        result["groupBys"] = from_optional(lambda x: from_list(from_int, x), self.group_bys)
+        result["datasets"] = from_optional(lambda x: to_class(Datasets, x), self.datasets)
+        result["joins"] = from_optional(lambda x: from_list(from_int, x), self.joins)
         return result
 
 
 class ConfigConfig:
+    __slots__ = ("vis_state", "map_state", "map_style")
+
     vis_state: VisState
     map_state: MapState
     map_style: MapStyle
@@ -968,7 +1041,10 @@ class ConfigConfig:
 
 
 class Config:
-    version: str = 'v1'
+    __slots__ = ("version", "config")
+    DEFAULT_VERSION = 'v1'
+
+    version: str
     config: ConfigConfig
 
     def __init__(self, version: str, config: ConfigConfig) -> None:
@@ -990,6 +1066,8 @@ class Config:
 
 
 class Data:
+    __slots__ = ("id", "label", "color", "all_data", "fields")
+
     id: UUID
     label: str
     color: List[int]
@@ -1009,7 +1087,7 @@ class Data:
         id = UUID(obj.get("id"))
         label = from_str(obj.get("label"))
         color = from_list(from_int, obj.get("color"))
-        all_data = from_list(lambda x: x, obj.get("allData"))
+        all_data = from_list(from_any, obj.get("allData"))
         fields = from_list(Field.from_dict, obj.get("fields"))
         return Data(id, label, color, all_data, fields)
 
@@ -1018,19 +1096,24 @@ class Data:
         result["id"] = str(self.id)
         result["label"] = from_str(self.label)
         result["color"] = from_list(from_int, self.color)
-        result["allData"] = from_list(lambda x: x, self.all_data)
+        result["allData"] = list(self.all_data)
         result["fields"] = from_list(lambda x: to_class(Field, x), self.fields)
         return result
 
 
 class Dataset:
     """ Common superclass for UnfoldedDataset and OldDataset"""
-    version: str = 'v1'
+    __slots__ = ("version",)
+    DEFAULT_VERSION = 'v1'
+
+    version: str
     data: Data
     source: str
 
 
 class UnfoldedDataset(Dataset):
+    __slots__ = ("id", "label", "color", "source", "fields")
+
     id: UUID
     label: str
     color: List[int]
@@ -1045,7 +1128,7 @@ class UnfoldedDataset(Dataset):
         self.color = color
         self.source = source
         self.fields = fields
-        self.version = version or Dataset.version
+        self.version = version or Dataset.DEFAULT_VERSION
 
     @property
     def data(self):
@@ -1074,12 +1157,14 @@ class UnfoldedDataset(Dataset):
 
 
 class OldDataset(Dataset):
+    __slots__ = ("data",)
+
     data: Data
     source = None
 
     def __init__(self, data: Data, version: Optional[str] = None) -> None:
         self.data = data
-        self.version = version or Dataset.version
+        self.version = version or Dataset.DEFAULT_VERSION
 
     @staticmethod
     def from_dict(obj: Any) -> 'OldDataset':
@@ -1096,11 +1181,15 @@ class OldDataset(Dataset):
 
 
 class Info:
-    app: str = 'kepler.gl'
+    __slots__ = ("app", "created_at", "title", "description", "source")
+    DEFAULT_APP = 'kepler.gl'
+    DEFAULT_SOURCE = 'QGIS'
+
+    app: str
     created_at: str
     title: str
     description: str
-    source: Optional[str] = 'QGIS'
+    source: Optional[str]
 
     def __init__(self, app: str, created_at: str, title: str, description: str, source: Optional[str] = None) -> None:
         self.app = app
@@ -1116,7 +1205,7 @@ class Info:
         created_at = from_str(obj.get("created_at"))
         title = from_str(obj.get("title"))
         description = from_str(obj.get("description"))
-        source = from_union([from_str, from_none], obj.get("source"))
+        source = from_optional(from_str, obj.get("source"))
         return Info(app, created_at, title, description, source)
 
     def to_dict(self) -> dict:
@@ -1125,13 +1214,15 @@ class Info:
         result["created_at"] = from_str(self.created_at)
         result["title"] = from_str(self.title)
         result["description"] = from_str(self.description)
-        source = from_union([from_str, from_none], self.source)
+        source = from_optional(from_str, self.source)
         if source:
             result["source"] = source
         return result
 
 
 class MapConfig:
+    __slots__ = ("datasets", "config", "info")
+
     datasets: List[Union[UnfoldedDataset, OldDataset]]
     config: Config
     info: Info
@@ -0,0 +1,83 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import json
+import uuid
+from itertools import islice
+from typing import Any, BinaryIO, Iterable
+
+from .map_config import MapConfig, OldDataset, Data
+
+ROW_BATCH_SIZE = 10000
+
+# Compatible with the output of json.dumps with the default arguments
+_encoder = json.JSONEncoder()
+
+
+def write_map_config(map_config: MapConfig, output: BinaryIO, batch_size: int = ROW_BATCH_SIZE) -> None:
+    """
+    Write the configuration as JSON to the binary stream.
+
+    The output is identical to json.dumps(map_config.to_dict()), but the rows of the embedded datasets are encoded
+    and written in batches, so that the rows are never copied into the dictionary of the configuration.
+    """
+    if not _has_embedded_data(map_config):
+        output.write(_encoder.encode(map_config.to_dict()).encode('utf-8'))
+        return
+
+    output.write(b'{"datasets": [')
+    for i, dataset in enumerate(map_config.datasets):
+        if i > 0:
+            output.write(b', ')
+        _write_old_dataset(dataset, output, batch_size)
+    output.write(b'], "config": ')
+    output.write(_encoder.encode(map_config.config.to_dict()).encode('utf-8'))
+    output.write(b', "info": ')
+    output.write(_encoder.encode(map_config.info.to_dict()).encode('utf-8'))
+    output.write(b'}')
+
+
+def _has_embedded_data(map_config: MapConfig) -> bool:
+    return bool(map_config.datasets) and isinstance(map_config.datasets[0], OldDataset)
+
+
+def _write_old_dataset(dataset: OldDataset, output: BinaryIO, batch_size: int) -> None:
+    """ Write the dataset with the rows replaced by a placeholder and stream the rows in its place """
+    data = dataset.data
+    placeholder = f'allData-{uuid.uuid4()}'
+    without_rows = OldDataset(Data(data.id, data.label, data.color, [], data.fields), dataset.version).to_dict()
+    without_rows['data']['allData'] = placeholder
+    prefix, suffix = _encoder.encode(without_rows).split(_encoder.encode(placeholder))
+
+    output.write(prefix.encode('utf-8'))
+    output.write(b'[')
+    _write_rows(data.all_data, output, batch_size)
+    output.write(b']')
+    output.write(suffix.encode('utf-8'))
+
+
+def _write_rows(rows: Iterable[Any], output: BinaryIO, batch_size: int) -> None:
+    """ Write the comma separated rows a batch at a time """
+    rows = iter(rows)
+    separator = b''
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        output.write(separator + ', '.join([_encoder.encode(row) for row in batch]).encode('utf-8'))
+        separator = b', '
@@ -0,0 +1,56 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+"""
+Compares the dataset writers of LayerToDatasets. Benchmarks are not collected by default, run them with
+
+    pytest -s Unfolded/test/benchmarks/bench_dataset_writers.py
+"""
+import time
+import uuid
+
+import pytest
+
+from ..conftest import get_gpkg_layer
+from ...core.processing.layer2dataset import LayerToDatasets
+
+ROUNDS = 5
+
+
+@pytest.mark.parametrize('layer_name', ['harbours', 'harbours_3067', 'lines', 'lines_3067', 'Polygons',
+                                        'polygons_3067', 'naturalearth_countries'])
+def test_dataset_writers(layer_name, test_gpkg, tmp_path):
+    layer = get_gpkg_layer(layer_name, test_gpkg)
+    alg = LayerToDatasets(uuid.uuid4(), layer, (0, 92, 255))
+
+    timings = {}
+    outputs = {}
+    for dataset_writer in ('gdal', 'native'):
+        alg.dataset_writer = dataset_writer
+        output_dir = tmp_path / dataset_writer
+        output_dir.mkdir()
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            output_file = alg._save_layer_to_file(output_dir)
+        timings[dataset_writer] = (time.perf_counter() - start) / ROUNDS
+        outputs[dataset_writer] = output_file.read_text(encoding='utf-8').splitlines()
+
+    print(f"\n{layer_name} ({layer.featureCount()} features): "
+          f"gdal {timings['gdal'] * 1000:.1f} ms, native {timings['native'] * 1000:.1f} ms, "
+          f"speedup {timings['gdal'] / timings['native']:.1f}x")
+    assert outputs['native'] == outputs['gdal']
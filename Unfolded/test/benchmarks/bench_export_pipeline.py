@@ -0,0 +1,97 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+"""
+Measures the export pipeline with synthetic point, line and polygon layers stored in memory and in GeoPackages.
+Benchmarks are not collected by default, run them with
+
+    pytest -s Unfolded/test/benchmarks/bench_export_pipeline.py
+
+Feature counts of the layers are set with the environment variable UNFOLDED_BENCHMARK_SIZES, for example
+UNFOLDED_BENCHMARK_SIZES=1000,10000000. The results are written as JSON, see conftest.py.
+"""
+import os
+import time
+import uuid
+from typing import Callable
+
+import pytest
+from PyQt5.QtGui import QColor
+from qgis.core import QgsPointXY
+
+from .synthetic_layers import GEOMETRY_TYPES, create_memory_layer, create_gpkg_layer
+from ...core.config_creator import ConfigCreator
+from ...core.processing.layer2dataset import LayerToDatasets
+from ...core.processing.layer2layer_config import LayerToLayerConfig
+
+SIZES = [int(size) for size in os.environ.get('UNFOLDED_BENCHMARK_SIZES', '1000,10000,100000').split(',')]
+COLOR = (0, 92, 255)
+
+
+def timed(function: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    assert result is not False
+    return elapsed
+
+
+def create_config_creator(output_directory) -> ConfigCreator:
+    creator = ConfigCreator('benchmark', '', output_directory)
+    creator.set_map_state(QgsPointXY(25.0, 64.0), 5)
+    creator.set_map_style('dark')
+    creator.set_animation_config(None, 1)
+    creator.set_interaction_config_values(True, False, False, False)
+    creator.set_vis_state_values('normal')
+    return creator
+
+
+@pytest.mark.parametrize('storage', ['memory', 'gpkg'])
+@pytest.mark.parametrize('feature_count', SIZES)
+@pytest.mark.parametrize('geometry_type', GEOMETRY_TYPES)
+def test_export_pipeline(geometry_type, feature_count, storage, benchmark_results, tmp_path):
+    if storage == 'gpkg':
+        layer = create_gpkg_layer(geometry_type, feature_count, tmp_path)
+    else:
+        layer = create_memory_layer(geometry_type, feature_count)
+    timings = {}
+
+    datasets_dir = tmp_path / 'datasets'
+    datasets_dir.mkdir()
+    timings['layer_to_datasets'] = timed(LayerToDatasets(uuid.uuid4(), layer, COLOR, datasets_dir).run)
+    timings['layer_to_layer_config'] = timed(LayerToLayerConfig(uuid.uuid4(), layer).run)
+
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    with create_config_creator(output_dir) as creator:
+        # Writing of the output is measured separately, including the map configuration written by the export
+        write_output = creator._write_output
+        written = {}
+
+        def timed_write_output(map_config):
+            written['map_config'] = map_config
+            written['time'] = timed(lambda: write_output(map_config))
+
+        creator._write_output = timed_write_output
+        creator.add_layer(uuid.uuid4(), layer, QColor.fromRgb(*COLOR), True)
+        timings['export'] = timed(creator._start_config_creation)
+        assert creator.created_configuration_path.exists()
+
+    timings['write_output'] = written['time']
+    timings['map_config_to_dict'] = timed(written['map_config'].to_dict)
+    benchmark_results.add(f'{geometry_type}-{feature_count}-{storage}', **timings)
@@ -0,0 +1,72 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+"""
+Measures loading and serializing of the map configuration model with the test configurations scaled up to thousands
+of layers. Benchmarks are not collected by default, run them with
+
+    pytest -s Unfolded/test/benchmarks/bench_map_config.py
+"""
+import copy
+import json
+import time
+import uuid
+
+import pytest
+
+from ...model.map_config import MapConfig
+from ...qgis_plugin_tools.tools.resources import plugin_test_data_path
+
+ROUNDS = 5
+LAYER_COUNT = 3000
+
+
+def scale_config(map_config_dict: dict, layer_count: int) -> dict:
+    """ Repeat the layers and the datasets of the configuration until there are layer_count of each """
+    scaled = copy.deepcopy(map_config_dict)
+    vis_state = scaled['config']['config']['visState']
+    layers = vis_state['layers']
+    datasets = scaled['datasets']
+    vis_state['layers'] = [copy.deepcopy(layers[i % len(layers)]) for i in range(layer_count)]
+    scaled['datasets'] = []
+    for i in range(layer_count):
+        dataset = copy.deepcopy(datasets[i % len(datasets)])
+        data = dataset.get('data', dataset)
+        data['id'] = str(uuid.uuid4())
+        scaled['datasets'].append(dataset)
+    return scaled
+
+
+@pytest.mark.parametrize('config_file', ['harbours_config.json', 'lines_config.json', 'polygons_config.json',
+                                         'harbours_config_with_unfolded_datasets.json'])
+def test_map_config_codec(config_file):
+    with open(plugin_test_data_path('config', config_file)) as f:
+        map_config_dict = scale_config(json.load(f), LAYER_COUNT)
+
+    from_dict_time = to_dict_time = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        map_config = MapConfig.from_dict(map_config_dict)
+        loaded = time.perf_counter()
+        result = map_config.to_dict()
+        from_dict_time = min(from_dict_time, loaded - start)
+        to_dict_time = min(to_dict_time, time.perf_counter() - loaded)
+
+    print(f"\n{config_file} ({LAYER_COUNT} layers): "
+          f"from_dict {from_dict_time * 1000:.1f} ms, to_dict {to_dict_time * 1000:.1f} ms")
+    assert result == map_config_dict
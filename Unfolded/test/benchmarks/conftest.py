@@ -0,0 +1,83 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+"""
+Fixtures of the benchmarks. Results of a run are written as JSON and compared to a stored baseline with the
+environment variables
+
+    UNFOLDED_BENCHMARK_RESULTS   File the results are written to, benchmark_results.json by default
+    UNFOLDED_BENCHMARK_BASELINE  Results of an earlier run that the results are compared to
+"""
+import json
+import os
+import platform
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+from qgis.core import Qgis
+
+# Measurements that are slower than the baseline by more than this factor are reported as regressions
+REGRESSION_FACTOR = 1.2
+
+
+class BenchmarkResults:
+    """ Timings of the benchmarks in seconds by the name of the benchmark """
+
+    def __init__(self):
+        self.results: Dict[str, Dict[str, float]] = {}
+
+    def add(self, name: str, **timings: float) -> None:
+        self.results.setdefault(name, {}).update(timings)
+        print(f'\n{name}: ' + ', '.join(f'{key} {value * 1000:.1f} ms' for key, value in timings.items()))
+
+    def to_dict(self) -> Dict:
+        return {
+            'environment': {'qgis': Qgis.QGIS_VERSION, 'python': sys.version.split()[0],
+                            'platform': platform.platform()},
+            'results': self.results,
+        }
+
+    def compare(self, baseline: Dict) -> Dict[str, Dict[str, float]]:
+        """ Get the ratios of the timings to the baseline by the name of the benchmark """
+        ratios = {}
+        for name, timings in self.results.items():
+            baseline_timings = baseline['results'].get(name, {})
+            ratios[name] = {key: value / baseline_timings[key] for key, value in timings.items()
+                            if baseline_timings.get(key)}
+        return ratios
+
+
+@pytest.fixture(scope='session')
+def benchmark_results() -> BenchmarkResults:
+    results = BenchmarkResults()
+    yield results
+
+    results_file = Path(os.environ.get('UNFOLDED_BENCHMARK_RESULTS', 'benchmark_results.json'))
+    results_file.write_text(json.dumps(results.to_dict(), indent=2), encoding='utf-8')
+    print(f'\nBenchmark results written to {results_file}')
+
+    baseline_file = os.environ.get('UNFOLDED_BENCHMARK_BASELINE')
+    if baseline_file:
+        baseline = json.loads(Path(baseline_file).read_text(encoding='utf-8'))
+        for name, ratios in results.compare(baseline).items():
+            for key, ratio in ratios.items():
+                marker = ' REGRESSION' if ratio > REGRESSION_FACTOR else ''
+                print(f'{name} {key}: {ratio:.2f}x baseline{marker}')
+
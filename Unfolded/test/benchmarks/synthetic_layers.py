@@ -0,0 +1,89 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+"""
+Generates layers of random features with mixed field types for the benchmarks
+"""
+import math
+import random
+from pathlib import Path
+from typing import List
+
+from PyQt5.QtCore import QDate, QDateTime, QTime
+from qgis.core import (QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY, QgsVectorFileWriter, QgsProject)
+
+GEOMETRY_TYPES = ('Point', 'LineString', 'Polygon')
+FIELDS = 'field=id:integer&field=value:double&field=name:string(20)&field=day:date&field=updated:datetime'
+BATCH_SIZE = 100000
+LINE_VERTICES = 10
+POLYGON_VERTICES = 16
+
+_WORDS = ('harbour', 'lighthouse', 'pier', 'marina', 'ferry', 'dock', 'quay', 'jetty')
+
+
+def create_memory_layer(geometry_type: str, feature_count: int, seed: int = 0) -> QgsVectorLayer:
+    """ Create a memory layer with feature_count random features around Finland """
+    layer = QgsVectorLayer(f'{geometry_type}?crs=EPSG:4326&{FIELDS}',
+                           f'{geometry_type.lower()}_{feature_count}', 'memory')
+    assert layer.isValid()
+    rng = random.Random(seed)
+    start_date = QDate(2021, 1, 1)
+    for start in range(0, feature_count, BATCH_SIZE):
+        features: List[QgsFeature] = []
+        for i in range(start, min(start + BATCH_SIZE, feature_count)):
+            feature = QgsFeature(layer.fields())
+            day = start_date.addDays(rng.randrange(365))
+            # Some of the values are left empty
+            feature.setAttributes([i, rng.uniform(-1000, 1000) if i % 10 else None,
+                                   f'{rng.choice(_WORDS)} "{i}", {rng.choice(_WORDS)}', day,
+                                   QDateTime(day, QTime(rng.randrange(24), rng.randrange(60)))])
+            feature.setGeometry(_random_geometry(geometry_type, rng))
+            features.append(feature)
+        layer.dataProvider().addFeatures(features)
+    return layer
+
+
+def create_gpkg_layer(geometry_type: str, feature_count: int, output_dir: Path, seed: int = 0) -> QgsVectorLayer:
+    """ Create a GeoPackage layer with the same features as the memory layer """
+    memory_layer = create_memory_layer(geometry_type, feature_count, seed)
+    path = output_dir / f'{memory_layer.name()}.gpkg'
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'GPKG'
+    options.layerName = memory_layer.name()
+    result = QgsVectorFileWriter.writeAsVectorFormatV2(memory_layer, str(path),
+                                                        QgsProject.instance().transformContext(), options)
+    assert result[0] == QgsVectorFileWriter.NoError, result
+    layer = QgsVectorLayer(f'{path}|layername={memory_layer.name()}', memory_layer.name(), 'ogr')
+    assert layer.isValid()
+    return layer
+
+
+def _random_geometry(geometry_type: str, rng: random.Random) -> QgsGeometry:
+    x, y = rng.uniform(20.0, 31.0), rng.uniform(59.5, 70.0)
+    if geometry_type == 'Point':
+        return QgsGeometry.fromPointXY(QgsPointXY(x, y))
+    elif geometry_type == 'LineString':
+        points = []
+        for _ in range(LINE_VERTICES):
+            x, y = x + rng.uniform(-0.01, 0.01), y + rng.uniform(-0.01, 0.01)
+            points.append(QgsPointXY(x, y))
+        return QgsGeometry.fromPolylineXY(points)
+    radius = rng.uniform(0.001, 0.01)
+    ring = [QgsPointXY(x + radius * math.cos(2 * math.pi * i / POLYGON_VERTICES),
+                       y + radius * math.sin(2 * math.pi * i / POLYGON_VERTICES)) for i in range(POLYGON_VERTICES)]
+    return QgsGeometry.fromPolygonXY([ring + ring[:1]])
@@ -22,6 +22,7 @@ This class contains fixtures and common helper function to keep the test files s
 """
 import json
 import os
+import struct
 from pathlib import Path
 from zipfile import ZipFile
 
@@ -45,6 +46,22 @@ def new_project() -> None:
     yield IFACE.newProject()
 
 
+@pytest.fixture(autouse=True)
+def full_coordinate_precision():
+    """ Expected datasets in the test data are written with unrounded coordinates """
+    Settings.coordinate_precision.set(-1)
+    yield
+    Settings.coordinate_precision.set(Settings.coordinate_precision.value)
+
+
+@pytest.fixture(autouse=True)
+def no_dataset_cache():
+    """ Datasets are extracted in every test unless the test enables the cache """
+    Settings.dataset_cache_size.set(0)
+    yield
+    Settings.dataset_cache_size.set(Settings.dataset_cache_size.value)
+
+
 @pytest.fixture(scope='session')
 def test_gpkg():
     return plugin_test_data_path('test_data.gpkg')
@@ -226,3 +243,14 @@ def get_loaded_map_config(conf_path: Path):
         with open(conf_path) as f:
             map_config_dict = json.load(f)
     return MapConfig.from_dict(map_config_dict)
+
+
+def raw_entry_data(path: Path, name: str) -> bytes:
+    """ Read the compressed data of a zip entry as it is stored """
+    with ZipFile(path) as zip_file:
+        info = zip_file.getinfo(name)
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = struct.unpack('<2H', f.read(4))
+        f.seek(name_length + extra_length, 1)
+        return f.read(info.compress_size)
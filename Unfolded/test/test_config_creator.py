@@ -17,8 +17,10 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
 import datetime
+import json
 import time
 import uuid
+import zlib
 from pathlib import Path
 from unittest.mock import MagicMock
 from zipfile import ZipFile
@@ -27,9 +29,11 @@ import pytest
 from PyQt5.QtGui import QColor
 from qgis._core import QgsPointXY
 
-from .conftest import get_map_config, get_loaded_map_config
+from .conftest import get_map_config, get_loaded_map_config, raw_entry_data
 from ..core.config_creator import ConfigCreator
 from ..core.exceptions import InvalidInputException
+from ..core.processing.layer2dataset import LayerToDatasets
+from ..definitions.settings import Settings
 
 FAKE_NOW = datetime.datetime(2021, 1, 25, 11, 37, 43)
 
@@ -57,6 +61,17 @@ def config_creator(tmpdir_pth, mock_datetime_now) -> ConfigCreator:
     return creator
 
 
+@pytest.fixture(params=[False, True], ids=['streamed', 'staged'])
+def stage_datasets(request):
+    Settings.stage_datasets.set(request.param)
+    yield request.param
+    Settings.stage_datasets.set(Settings.stage_datasets.value)
+
+
+def temp_files_removed(cf: ConfigCreator) -> bool:
+    return cf._temp_dir is None or not cf._temp_dir.exists()
+
+
 def test_map_config_creation_w_simple_points(config_creator, simple_harbour_points):
     with config_creator as cf:
         time_zone = time.strftime('%Z%z')
@@ -69,10 +84,10 @@ def test_map_config_creation_w_simple_points(config_creator, simple_harbour_poin
         map_config = get_loaded_map_config(cf.created_configuration_path)
 
         assert map_config.config.to_dict() == expected_map_config.config.to_dict()
-    assert not cf._temp_dir.exists()
+    assert temp_files_removed(cf)
 
 
-def test_map_config_creation_with_unfolded_format(config_creator, simple_harbour_points):
+def test_map_config_creation_with_unfolded_format(stage_datasets, config_creator, simple_harbour_points):
     with config_creator as cf:
         time_zone = time.strftime('%Z%z')
         expected_map_config = get_map_config('harbours_config_with_unfolded_datasets.json')
@@ -84,18 +99,18 @@ def test_map_config_creation_with_unfolded_format(config_creator, simple_harbour
         assert cf.created_configuration_path.exists()
         assert cf.created_configuration_path.name == 'unfolded_nabzfz.zip'
         with ZipFile(cf.created_configuration_path, 'r') as zip_file:
-            assert [n for n in zip_file.namelist()] == ['config.json', 'harbours.csv']
+            assert sorted(zip_file.namelist()) == ['config.json', 'harbours.csv']
         map_config = get_loaded_map_config(cf.created_configuration_path)
         assert map_config.to_dict() == expected_map_config.to_dict()
 
-    assert not cf._temp_dir.exists()
+    assert temp_files_removed(cf)
 
 
 def test__create_config_info(config_creator):
     with config_creator as cf:
         time_zone = time.strftime('%Z%z')
         info = config_creator._create_config_info()
-    assert not cf._temp_dir.exists()
+    assert temp_files_removed(cf)
     assert info.created_at == "Mon Jan 25 2021 11:37:43 " + time_zone
     assert info.source == "QGIS"
 
@@ -123,3 +138,157 @@ def test___validate_inputs3(simple_harbour_points, tmpdir_pth):
         with pytest.raises(InvalidInputException) as e:
             cf._validate_inputs()
     assert str(e.value) == 'Title not filled'
+
+
+def test_preflight_reports_all_layers(config_creator, simple_harbour_points_invalid_size_units,
+                                      lines_invalid_size_units):
+    with config_creator as cf:
+        cf.add_layer(uuid.uuid4(), simple_harbour_points_invalid_size_units, QColor.fromRgb(0, 92, 255), True)
+        cf.add_layer(uuid.uuid4(), lines_invalid_size_units, QColor.fromRgb(0, 92, 255), True)
+        with pytest.raises(InvalidInputException) as e:
+            cf._start_config_creation()
+    assert str(e.value) == '2 problems found in the layers'
+    assert not cf.created_configuration_path.exists()
+
+
+def test_incomplete_output_is_removed(config_creator, simple_harbour_points):
+    with config_creator as cf:
+        cf.add_layer(uuid.UUID('7d193484-21a7-47f4-8cbc-497474a39b64'), simple_harbour_points,
+                     QColor.fromRgb(0, 92, 255), True)
+        for task_dict in cf.tasks.values():
+            assert task_dict['task'].run()
+        cf._archive.flush()
+        assert cf._archive.temp_path.exists()
+        cf.abort()
+
+    assert not cf._archive.temp_path.exists()
+    assert not cf.created_configuration_path.exists()
+
+
+def test_style_only_export_reuses_datasets(config_creator, simple_harbour_points, tmpdir_pth, monkeypatch):
+    layer_uuid = uuid.UUID('7d193484-21a7-47f4-8cbc-497474a39b64')
+    with config_creator as cf:
+        cf.add_layer(layer_uuid, simple_harbour_points, QColor.fromRgb(0, 92, 255), True)
+        cf._start_config_creation()
+    with ZipFile(cf.created_configuration_path) as zip_file:
+        original_info = zip_file.getinfo('harbours.csv')
+        original_data = zip_file.read('harbours.csv')
+    original_raw_data = raw_entry_data(cf.created_configuration_path, 'harbours.csv')
+
+    with ConfigCreator(cf.title, cf.description, tmpdir_pth) as style_cf:
+        style_cf.set_map_state(QgsPointXY(23.383588699716316, 60.556795942038995), 6.759672619963176)
+        style_cf.set_map_style("dark")
+        style_cf.set_animation_config(None, 1)
+        style_cf.set_interaction_config_values(True, False, False, False)
+        style_cf.set_vis_state_values('normal')
+        style_cf.set_base_configuration(cf.created_configuration_path)
+        style_cf.add_layer(uuid.uuid4(), simple_harbour_points, QColor.fromRgb(0, 92, 255), False)
+        assert len(style_cf.tasks) == 1
+        with monkeypatch.context() as m:
+            # Copying the datasets must not decompress and recompress them
+            m.setattr(zlib, 'decompressobj', MagicMock(side_effect=AssertionError('Dataset was decompressed')))
+            style_cf._start_config_creation()
+
+    map_config = get_loaded_map_config(style_cf.created_configuration_path)
+    assert [dataset.id for dataset in map_config.datasets] == [layer_uuid]
+    assert map_config.config.config.vis_state.layers[0].config.data_id == layer_uuid
+    assert not map_config.config.config.vis_state.layers[0].config.is_visible
+    with ZipFile(style_cf.created_configuration_path) as zip_file:
+        assert sorted(zip_file.namelist()) == ['config.json', 'harbours.csv']
+        assert zip_file.getinfo('harbours.csv').CRC == original_info.CRC
+        assert zip_file.getinfo('harbours.csv').compress_size == original_info.compress_size
+        assert zip_file.read('harbours.csv') == original_data
+    assert raw_entry_data(style_cf.created_configuration_path, 'harbours.csv') == original_raw_data
+
+
+def test_style_only_export_w_new_layer(config_creator, simple_harbour_points, countries):
+    with config_creator as cf:
+        cf.add_layer(uuid.uuid4(), simple_harbour_points, QColor.fromRgb(0, 92, 255), True)
+        cf._start_config_creation()
+
+        cf.set_base_configuration(cf.created_configuration_path)
+        with pytest.raises(InvalidInputException) as e:
+            cf.add_layer(uuid.uuid4(), countries, QColor.fromRgb(0, 92, 255), True)
+    assert str(e.value) == 'Layer naturalearth_countries is not in the existing configuration'
+
+
+def test_style_only_export_w_duplicate_layer_names(config_creator, simple_harbour_points, countries):
+    with config_creator as cf:
+        cf.add_layer(uuid.uuid4(), simple_harbour_points, QColor.fromRgb(0, 92, 255), True)
+        cf._start_config_creation()
+
+        cf.set_base_configuration(cf.created_configuration_path)
+        cf.add_layer(uuid.uuid4(), simple_harbour_points, QColor.fromRgb(0, 92, 255), True)
+        countries.setName(simple_harbour_points.name())
+        with pytest.raises(InvalidInputException) as e:
+            cf.add_layer(uuid.uuid4(), countries, QColor.fromRgb(0, 92, 255), True)
+    assert str(e.value) == 'Layer name harbours is not unique'
+
+
+def test_style_only_export_w_duplicate_dataset_labels(config_creator, simple_harbour_points, tmpdir_pth):
+    with config_creator as cf:
+        cf.add_layer(uuid.uuid4(), simple_harbour_points, QColor.fromRgb(0, 92, 255), True)
+        cf._start_config_creation()
+    with ZipFile(cf.created_configuration_path) as zip_file:
+        config = json.loads(zip_file.read('config.json').decode('utf-8'))
+        dataset_file = zip_file.read('harbours.csv')
+    duplicate_dataset = json.loads(json.dumps(config['datasets'][0]))
+    duplicate_dataset['id'] = str(uuid.uuid4())
+    config['datasets'].append(duplicate_dataset)
+    base_configuration = tmpdir_pth / 'duplicates.zip'
+    with ZipFile(base_configuration, 'w') as zip_file:
+        zip_file.writestr('config.json', json.dumps(config))
+        zip_file.writestr('harbours.csv', dataset_file)
+
+    with ConfigCreator(cf.title, cf.description, tmpdir_pth) as style_cf:
+        with pytest.raises(InvalidInputException) as e:
+            style_cf.set_base_configuration(base_configuration)
+    assert str(e.value) == 'Layer names harbours are not unique in the existing configuration'
+
+
+@pytest.fixture
+def export_profile_in_archive():
+    Settings.export_profile.set('archive')
+    yield
+    Settings.export_profile.set(Settings.export_profile.value)
+
+
+def test_export_profile_is_written_into_archive(export_profile_in_archive, config_creator, simple_harbour_points):
+    with config_creator as cf:
+        cf.add_layer(uuid.UUID('7d193484-21a7-47f4-8cbc-497474a39b64'), simple_harbour_points,
+                     QColor.fromRgb(0, 92, 255), True)
+        cf._start_config_creation()
+
+        with ZipFile(cf.created_configuration_path, 'r') as zip_file:
+            profile = json.loads(zip_file.read('export_profile.json'))
+
+    stages = {(stage['layer'], stage['stage']): stage for stage in profile['stages']}
+    assert set(stages) == {(None, 'preflight'), ('harbours', 'style'), ('harbours', 'extract'),
+                           (None, 'write output')}
+    assert stages[('harbours', 'extract')]['rows'] == simple_harbour_points.featureCount()
+    assert stages[(None, 'write output')]['bytes_written'] > 0
+    assert all(stage['peak_memory'] is not None for stage in profile['stages'])
+
+
+@pytest.fixture
+def used_attributes():
+    Settings.attribute_projection.set('used')
+    yield
+    Settings.attribute_projection.set(Settings.attribute_projection.value)
+
+
+def test_only_used_attributes_are_exported(used_attributes, config_creator, categorized_points):
+    table_config = categorized_points.attributeTableConfig()
+    table_config.update(categorized_points.fields())
+    for i, column in enumerate(table_config.columns()):
+        table_config.setColumnHidden(i, column.name != 'tonnia_vienti')
+    categorized_points.setAttributeTableConfig(table_config)
+
+    config_creator.add_layer(uuid.uuid4(), categorized_points, QColor.fromRgb(0, 92, 255), True, ['fid'])
+
+    task = next(task_dict['task'] for task_dict in config_creator.tasks.values()
+                if isinstance(task_dict['task'], LayerToDatasets))
+    # Class attribute of the categorized renderer is used by the style
+    assert task.attribute_names == {'fid', 'nimi', 'tonnia_vienti'}
+    assert [field.name() for field in task._get_exported_fields()] == ['fid', 'nimi', 'tonnia_vienti', 'longitude',
+                                                                      'latitude']
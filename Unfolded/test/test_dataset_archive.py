@@ -0,0 +1,178 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import os
+import threading
+import zipfile
+import zlib
+from unittest.mock import MagicMock
+from zipfile import ZipFile
+
+import pytest
+
+from .conftest import raw_entry_data
+from ..core.exceptions import ProcessInterruptedException
+from ..core.processing import dataset_archive
+from ..core.processing.dataset_archive import DatasetArchive
+
+
+def test_entries_are_written_from_multiple_threads(tmp_path):
+    contents = {f'{i}.csv': (f'row {i},' * 100000 + '\n').encode('utf-8') * 5 for i in range(8)}
+    archive = DatasetArchive(tmp_path / 'map.zip')
+
+    def write(name):
+        with archive.open(name) as entry:
+            entry.write(contents[name])
+
+    threads = [threading.Thread(target=write, args=(name,)) for name in contents]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    big_file = tmp_path / 'big.bin'
+    big_file.write_bytes(os.urandom(3 * 1024 * 1024))
+    archive.write_async(big_file, 'big.bin')
+    archive.close()
+
+    assert not archive.temp_path.exists()
+    assert archive.entry_size('0.csv') == len(contents['0.csv'])
+    with ZipFile(tmp_path / 'map.zip') as zip_file:
+        assert zip_file.testzip() is None
+        assert sorted(zip_file.namelist()) == sorted(list(contents) + ['big.bin'])
+        for name, content in contents.items():
+            assert zip_file.getinfo(name).compress_type == zipfile.ZIP_DEFLATED
+            assert zip_file.read(name) == content
+        assert zip_file.read('big.bin') == big_file.read_bytes()
+
+
+def test_entries_are_compressed_at_the_same_time(tmp_path, monkeypatch):
+    files = []
+    for i in range(2):
+        files.append(tmp_path / f'{i}.csv')
+        files[i].write_bytes(b'a,b\n1,2\n' * 1000)
+    # Both entries must be compressing before either of them can finish
+    barrier = threading.Barrier(2, timeout=5)
+    deflate = dataset_archive._deflate
+
+    def deflate_together(*args):
+        barrier.wait()
+        return deflate(*args)
+
+    monkeypatch.setattr(dataset_archive, '_deflate', deflate_together)
+    archive = DatasetArchive(tmp_path / 'map.zip', max_workers=2)
+    for file in files:
+        archive.write_async(file, file.name)
+    archive.close()
+
+    with ZipFile(tmp_path / 'map.zip') as zip_file:
+        assert zip_file.testzip() is None
+        assert [zip_file.read(file.name) for file in files] == [file.read_bytes() for file in files]
+
+
+def test_entries_are_written_in_the_order_they_were_opened(tmp_path, monkeypatch):
+    first_file = tmp_path / 'first.csv'
+    first_file.write_bytes(b'a,b\n1,2\n')
+    second_written = threading.Event()
+    deflate = dataset_archive._deflate
+
+    def deflate_last(*args):
+        # First entry finishes only after the entry opened after it
+        assert second_written.wait(5)
+        return deflate(*args)
+
+    monkeypatch.setattr(dataset_archive, '_deflate', deflate_last)
+    archive = DatasetArchive(tmp_path / 'map.zip')
+    first = archive.write_async(first_file, 'first.csv')
+    with archive.open('second.csv') as entry:
+        entry.write(b'c,d\n3,4\n')
+    second_written.set()
+    with archive.open('third.csv') as entry:
+        entry.write(b'e,f\n5,6\n')
+    first.result()
+    archive.close()
+
+    with ZipFile(tmp_path / 'map.zip') as zip_file:
+        assert zip_file.namelist() == ['first.csv', 'second.csv', 'third.csv']
+        assert zip_file.read('second.csv') == b'c,d\n3,4\n'
+
+
+def test_discarded_archive_is_removed(tmp_path):
+    data_file = tmp_path / 'data.csv'
+    data_file.write_bytes(b'a,b\n1,2\n')
+    (tmp_path / 'map.zip').write_bytes(b'previous map')
+    archive = DatasetArchive(tmp_path / 'map.zip')
+    archive.write(data_file, 'data.csv')
+    archive.flush()
+    assert archive.temp_path.exists()
+    archive.discard()
+
+    assert not archive.temp_path.exists()
+    # Output of the previous export is kept
+    assert (tmp_path / 'map.zip').read_bytes() == b'previous map'
+    with pytest.raises(ProcessInterruptedException):
+        with archive.open('other.csv'):
+            pass
+
+
+def test_archive_is_removed_when_discarded_during_writing(tmp_path):
+    archive = DatasetArchive(tmp_path / 'map.zip')
+    started = threading.Event()
+    errors = []
+
+    def write():
+        try:
+            with archive.open('data.csv') as entry:
+                entry.write(b'a,b\n')
+                started.set()
+                while True:
+                    entry.write(b'1,2\n')
+        except ProcessInterruptedException as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    assert started.wait(5)
+    archive.discard()
+    thread.join(5)
+
+    assert errors
+    assert not archive.temp_path.exists()
+    assert not (tmp_path / 'map.zip').exists()
+
+
+def test_entries_are_copied_without_recompressing(tmp_path, monkeypatch):
+    source = tmp_path / 'source.zip'
+    with ZipFile(source, 'w') as zip_file:
+        zip_file.writestr('stored.csv', b'a,b\n1,2\n', zipfile.ZIP_STORED)
+        # Recompressing at the default level would change the data
+        zip_file.writestr('deflated.csv', b'a,b\n1,2\n' * 1000, zipfile.ZIP_DEFLATED, compresslevel=1)
+    monkeypatch.setattr(zlib, 'decompressobj', MagicMock(side_effect=AssertionError('Entry was decompressed')))
+    archive = DatasetArchive(tmp_path / 'map.zip')
+    with archive.open('config.json') as entry:
+        entry.write(b'{}')
+    archive.copy_entries(source, ['stored.csv', 'deflated.csv'])
+    archive.close()
+    monkeypatch.undo()
+
+    with ZipFile(tmp_path / 'map.zip') as zip_file, ZipFile(source) as source_file:
+        assert zip_file.testzip() is None
+        assert zip_file.namelist() == ['config.json', 'stored.csv', 'deflated.csv']
+        for name in ('stored.csv', 'deflated.csv'):
+            assert zip_file.getinfo(name).compress_type == source_file.getinfo(name).compress_type
+            assert raw_entry_data(tmp_path / 'map.zip', name) == raw_entry_data(source, name)
+    assert archive.entry_size('deflated.csv') == len(b'a,b\n1,2\n' * 1000)
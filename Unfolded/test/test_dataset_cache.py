@@ -0,0 +1,135 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import os
+import uuid
+
+import pytest
+from PyQt5.QtCore import QVariant
+from qgis.core import QgsVectorLayer, QgsVectorFileWriter, QgsProject, QgsField
+
+from ..core.processing.dataset_cache import DatasetCache
+from ..core.processing.layer2dataset import LayerToDatasets
+from ..definitions.settings import Settings
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    Settings.dataset_cache_dir.set(str(cache_dir))
+    Settings.dataset_cache_size.set(10)
+    yield cache_dir
+    Settings.dataset_cache_dir.set(Settings.dataset_cache_dir.value)
+
+
+def test_create_key(simple_harbour_points):
+    options = {'dataset_format': 'csv'}
+    key = DatasetCache.create_key(simple_harbour_points, options)
+
+    assert key is not None
+    assert DatasetCache.create_key(simple_harbour_points, options) == key
+    assert DatasetCache.create_key(simple_harbour_points, {'dataset_format': 'arrow'}) != key
+
+
+def test_create_key_w_subset_string(countries):
+    key = DatasetCache.create_key(countries, {})
+    countries.setSubsetString('"ISO_A2" = \'FI\'')
+
+    assert DatasetCache.create_key(countries, {}) != key
+
+
+def test_create_key_changes_with_shapefile_sidecar_files(harbour_points, tmp_path):
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'ESRI Shapefile'
+    QgsVectorFileWriter.writeAsVectorFormatV2(harbour_points, str(tmp_path / 'harbours.shp'),
+                                              QgsProject.instance().transformContext(), options)
+    layer = QgsVectorLayer(str(tmp_path / 'harbours.shp'), 'harbours', 'ogr')
+    key = DatasetCache.create_key(layer, {})
+    assert key is not None
+
+    dbf_file = tmp_path / 'harbours.dbf'
+    stat = dbf_file.stat()
+    os.utime(dbf_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert DatasetCache.create_key(layer, {}) != key
+
+
+def test_create_key_w_virtual_field(harbour_points):
+    harbour_points.addExpressionField('"nimi" || \'!\'', QgsField('virtual', QVariant.String))
+    assert DatasetCache.create_key(harbour_points, {}) is None
+
+
+def test_create_key_w_memory_layer():
+    layer = QgsVectorLayer('Point?crs=EPSG:4326', 'points', 'memory')
+    assert DatasetCache.create_key(layer, {}) is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = DatasetCache(tmp_path / 'cache', 25)
+    dataset_file = tmp_path / 'dataset.csv'
+    dataset_file.write_text('a' * 10)
+
+    cache.put('first', dataset_file)
+    cache.put('second', dataset_file)
+    # Use of the first file makes the second one the least recently used
+    os.utime(cache.directory / 'second.csv', ns=(0, 0))
+    assert cache.get('first', '.csv') is not None
+    cache.put('third', dataset_file)
+
+    assert cache.get('first', '.csv') is not None
+    assert cache.get('second', '.csv') is None
+    assert cache.get('third', '.csv').read_text() == 'a' * 10
+
+
+def test_layer_to_datasets_uses_cache(cache_dir, simple_harbour_points, tmp_path):
+    first_dir, second_dir = tmp_path / 'first', tmp_path / 'second'
+    first_dir.mkdir()
+    second_dir.mkdir()
+
+    first = LayerToDatasets(uuid.uuid4(), simple_harbour_points, (0, 92, 255), first_dir)
+    assert first.cache_key is not None
+    assert first.cached_file is None
+    assert first.run(), first.exception
+
+    second = LayerToDatasets(uuid.uuid4(), simple_harbour_points, (0, 92, 255), second_dir)
+    assert second.cached_file is not None
+    assert second.run(), second.exception
+
+    assert second.result_dataset.source == first.result_dataset.source
+    assert ([field.to_dict() for field in second.result_dataset.fields] ==
+            [field.to_dict() for field in first.result_dataset.fields])
+    assert ((second_dir / second.result_dataset.source).read_bytes() ==
+            (first_dir / first.result_dataset.source).read_bytes())
+
+
+def test_layer_to_datasets_extracts_evicted_dataset(cache_dir, simple_harbour_points, tmp_path):
+    first_dir, second_dir = tmp_path / 'first', tmp_path / 'second'
+    first_dir.mkdir()
+    second_dir.mkdir()
+
+    first = LayerToDatasets(uuid.uuid4(), simple_harbour_points, (0, 92, 255), first_dir)
+    assert first.run(), first.exception
+
+    second = LayerToDatasets(uuid.uuid4(), simple_harbour_points, (0, 92, 255), second_dir)
+    assert second.cached_file is not None
+    # Evicted by another export after the task found the file in the cache
+    second.cached_file.unlink()
+    assert second.run(), second.exception
+
+    assert ((second_dir / second.result_dataset.source).read_bytes() ==
+            (first_dir / first.result_dataset.source).read_bytes())
+    assert DatasetCache(cache_dir, 10 * 1024 * 1024).get(second.cache_key, '.csv') is not None
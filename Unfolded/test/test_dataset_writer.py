@@ -0,0 +1,58 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import math
+
+import pytest
+from qgis.core import QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsProject, QgsPointXY
+
+from ..core.processing.dataset_writer import (web_mercator_to_wgs84, format_reals, format_string, format_integer,
+                                              format_real)
+
+
+@pytest.mark.parametrize('x,y', [(0.0, 0.0), (2391978.5, 8678373.2), (-13627361.0, 4544761.0),
+                                 (20037508.34, -20037508.34)])
+def test_web_mercator_to_wgs84(x, y):
+    np = pytest.importorskip('numpy')
+    # noinspection PyArgumentList
+    transform = QgsCoordinateTransform(QgsCoordinateReferenceSystem('EPSG:3857'),
+                                       QgsCoordinateReferenceSystem('EPSG:4326'), QgsProject.instance())
+    expected = transform.transform(QgsPointXY(x, y))
+    lon, lat = web_mercator_to_wgs84(np.array([x]), np.array([y]))
+
+    assert lon[0] == pytest.approx(expected.x(), abs=1e-9)
+    assert lat[0] == pytest.approx(expected.y(), abs=1e-9)
+
+
+def test_format_reals():
+    np = pytest.importorskip('numpy')
+    assert format_reals(np.array([21.48781, 3028000.0, math.nan, -0.5])) == ['21.48781', '3028000', '', '-0.5']
+
+
+@pytest.mark.parametrize('value,expected', [('Eurajoki', 'Eurajoki'), ('Hamina,Kotka', '"Hamina,Kotka"'),
+                                            ('360', '"360"'), ('say "hi"', '"say ""hi"""'), ('', ''),
+                                            (None, '')])
+def test_format_string(value, expected):
+    assert format_string(value) == expected
+
+
+def test_format_numbers():
+    assert format_integer(-99) == '"-99"'
+    assert format_integer(None) == ''
+    assert format_real(1.7) == '1.7'
+    assert format_real(None) == ''
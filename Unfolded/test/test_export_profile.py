@@ -0,0 +1,56 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import json
+import tracemalloc
+
+import pytest
+
+from ..core.export_profile import ExportProfile
+
+
+def test_stages_are_recorded_even_if_they_fail():
+    profile = ExportProfile()
+    with profile.stage('points', 'extract') as stage:
+        stage.rows = 10
+        stage.bytes_written = 2 * 1024 * 1024
+    with pytest.raises(ValueError):
+        with profile.stage('points', 'style'):
+            raise ValueError()
+    with profile.stage(None, 'write output'):
+        pass
+
+    assert [(stage.layer, stage.stage) for stage in profile.layer_stages('points')] == [('points', 'extract'),
+                                                                                        ('points', 'style')]
+    assert profile.layer_summary('points').startswith('points: 10 rows, 2.0 MB in ')
+    assert all(stage.wall_time >= 0 and stage.peak_memory is None for stage in profile.stages)
+
+
+def test_peak_memory_is_traced():
+    profile = ExportProfile()
+    tracemalloc.start()
+    try:
+        with profile.stage('points', 'extract'):
+            data = bytearray(1024 * 1024)
+        del data
+    finally:
+        tracemalloc.stop()
+
+    result = json.loads(profile.to_json())
+    assert result['stages'][0]['peak_memory'] >= 1024 * 1024
+    assert result['total_time'] >= result['stages'][0]['wall_time']
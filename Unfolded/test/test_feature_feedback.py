@@ -0,0 +1,51 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import pytest
+
+from ..core.exceptions import ProcessInterruptedException
+from ..core.processing.feature_feedback import FeatureFeedback, format_duration
+
+
+def test_feedback_reports_progress_of_processed_features():
+    feedback = FeatureFeedback(2500)
+    progress = []
+    feedback.progressChanged.connect(progress.append)
+
+    assert list(feedback.iterate(range(1000))) == list(range(1000))
+    assert list(feedback.iterate(range(1500))) == list(range(1500))
+
+    assert feedback.processed_features == 2500
+    assert progress == [40.0, 80.0, 100.0]
+    assert feedback.status().startswith('2500 / 2500 features')
+
+
+def test_feedback_cancels_iteration():
+    feedback = FeatureFeedback(10000)
+    iterated = 0
+    with pytest.raises(ProcessInterruptedException):
+        for _ in feedback.iterate(range(10000)):
+            iterated += 1
+            if iterated == 1500:
+                feedback.cancel()
+    assert iterated == 2000
+
+
+@pytest.mark.parametrize('seconds,expected', [(5, '0:05'), (125.4, '2:05'), (3725, '1:02:05')])
+def test_format_duration(seconds, expected):
+    assert format_duration(seconds) == expected
@@ -16,83 +16,98 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import csv
+import re
 import uuid
+from pathlib import Path
+from typing import Optional
 
 import pytest
-from PyQt5.QtCore import QVariant
-from qgis.core import QgsVectorLayer
+from PyQt5.QtCore import QVariant, QThread
+from qgis.core import QgsVectorLayer, QgsGeometry, QgsFeature, QgsPointXY, QgsRectangle, QgsCoordinateReferenceSystem
 
 from .conftest import get_map_config
+from ..core.processing.dataset_writer import CsvDatasetWriter
+from ..core.processing.geometry_simplifier import GeometrySimplifier
 from ..core.processing.layer2dataset import LayerToDatasets
+from ..definitions.settings import Settings
 from ..qgis_plugin_tools.tools.resources import plugin_test_data_path
 
 
+def create_alg(layer: QgsVectorLayer, output_directory: Optional[Path] = None) -> LayerToDatasets:
+    return LayerToDatasets(uuid.UUID('7d193484-21a7-47f4-8cbc-497474a39b64'), layer, (0, 92, 255), output_directory)
+
+
 @pytest.fixture
 def alg(simple_harbour_points) -> LayerToDatasets:
-    return LayerToDatasets(uuid.UUID('7d193484-21a7-47f4-8cbc-497474a39b64'), simple_harbour_points, (0, 92, 255))
+    return create_alg(simple_harbour_points)
 
 
 @pytest.mark.parametrize('layer', ['simple_harbour_points', 'simple_harbour_points_3067'])
-def test__add_geom_to_fields_w_points(alg, layer, request):
+def test__get_geometry_fields_w_points(layer, request):
     layer = request.getfixturevalue(layer)
-    original_fields = layer.fields().toList()
-    alg.layer = layer
-    alg._add_geom_to_fields()
-    fields = layer.fields().toList()
+    fields, _ = create_alg(layer)._get_geometry_fields()
 
-    assert len(fields) == len(original_fields) + 2
-    assert fields[-1].name() == 'latitude'
-    assert fields[-1].type() == QVariant.Double
-    assert fields[-2].name() == 'longitude'
-    assert fields[-2].type() == QVariant.Double
+    assert [field.name() for field in fields] == ['longitude', 'latitude']
+    assert [field.type() for field in fields] == [QVariant.Double, QVariant.Double]
 
 
 @pytest.mark.parametrize('layer', ['lines', 'polygons', 'lines_3067', 'polygons_3067'])
-def test__add_geom_to_fields_w_lines_and_polygons(alg, layer, request):
+def test__get_geometry_fields_w_lines_and_polygons(layer, request):
     layer = request.getfixturevalue(layer)
-    original_fields = layer.fields().toList()
-    alg.layer = layer
-    alg._add_geom_to_fields()
-    fields = layer.fields().toList()
+    fields, _ = create_alg(layer)._get_geometry_fields()
 
-    assert len(fields) == len(original_fields) + 1
-    assert fields[-1].name() == 'geometry'
-    assert fields[-1].type() == QVariant.String
+    assert [field.name() for field in fields] == ['geometry']
+    assert [field.type() for field in fields] == [QVariant.String]
 
 
 @pytest.mark.parametrize('layer',
                          ['simple_harbour_points', 'simple_harbour_points_3067', 'lines', 'lines_3067', 'polygons',
                           'polygons_3067'])
-def test__remove_geom_from_fields(alg, layer, request):
+def test_layer_is_not_modified(layer, request):
     layer = request.getfixturevalue(layer)
     original_fields = layer.fields().toList()
-    alg.layer = layer
-    alg._add_geom_to_fields()
-    alg._remove_geom_from_fields()
-    fields = layer.fields().toList()
+    alg = create_alg(layer)
+    status = alg.run()
 
-    assert fields == original_fields
+    assert status, alg.exception
+    assert layer.fields().toList() == original_fields
 
 
 def test__extract_fields(alg, simple_harbour_points):
     map_config = get_map_config('harbours_config_point.json')
 
-    alg._add_geom_to_fields()
     fields = alg._extract_fields()
     fields = [field.to_dict() for field in fields]
     assert fields == map_config.datasets[0].data.to_dict()['fields']
 
 
 @pytest.mark.parametrize('layer', ['simple_harbour_points', 'simple_harbour_points_3067'])
-def test__extract_all_data(alg, layer, request):
+def test__extract_all_data(layer, request):
     layer = request.getfixturevalue(layer)
     map_config = get_map_config('harbours_config_point.json')
-    alg.layer = layer
-    alg._add_geom_to_fields()
-    _, data = alg._extract_all_data()
+    _, data = create_alg(layer)._extract_all_data()
     assert data == map_config.datasets[0].data.all_data
 
 
+def test__extract_all_data_keeps_zeros_and_nulls():
+    layer = QgsVectorLayer('Point?crs=EPSG:4326&field=count:integer&field=value:double&field=name:string',
+                           'points', 'memory')
+    features = []
+    for attributes, point in (([0, 0.0, ''], (0.0, 0.0)), ([None, None, None], (1.5, -2.25))):
+        feature = QgsFeature(layer.fields())
+        feature.setAttributes(attributes)
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(*point)))
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+
+    _, data = create_alg(layer)._extract_all_data()
+
+    assert len(data) == 2
+    assert data[1] == [None, None, '', 1.5, -2.25]
+    assert list(data) == [[0, 0.0, '', 0.0, 0.0], [None, None, '', 1.5, -2.25]]
+
+
 @pytest.mark.parametrize('layer,layer_name,config',
                          [('simple_harbour_points', 'harbours', 'harbours_config_point.json'),
                           ('simple_harbour_points_3067', 'harbours', 'harbours_config_point.json'),
@@ -102,24 +117,24 @@ def test__extract_all_data(alg, layer, request):
                           ('polygons_3067', 'polygons', 'polygons_config.json'),
                           ('countries', 'countries', 'countries_config.json')
                           ])
-def test__convert_to_dataset(layer, layer_name, config, alg, request):
+def test__convert_to_dataset(layer, layer_name, config, request):
     layer: QgsVectorLayer = request.getfixturevalue(layer)
     layer.setName(layer_name)
     map_config = get_map_config(config)
-    alg.layer = layer
+    alg = create_alg(layer)
     status = alg.run()
     dataset = alg.result_dataset
     assert status, alg.exception
     assert dataset.to_dict() == map_config.datasets[0].to_dict()
 
 
+@pytest.mark.parametrize('dataset_writer', ['native', 'gdal'])
 @pytest.mark.parametrize('layer,expected_csv',
                          [('simple_harbour_points', 'harbours.csv'), ('countries', 'naturalearth_countries.csv')])
-def test_csv_export_with_output_dir(layer, expected_csv, alg, tmp_path, request):
+def test_csv_export_with_output_dir(layer, expected_csv, dataset_writer, tmp_path, request):
     layer: QgsVectorLayer = request.getfixturevalue(layer)
-    alg.output_directory = tmp_path
-    alg.layer = layer
-    alg._add_geom_to_fields()
+    alg = create_alg(layer, tmp_path)
+    alg.dataset_writer = dataset_writer
     converted_csv_name, _ = alg._extract_all_data()
 
     assert converted_csv_name == expected_csv
@@ -132,11 +147,187 @@ def test_csv_export_with_output_dir(layer, expected_csv, alg, tmp_path, request)
     assert converted_data == expected_data
 
 
-def test_unfolded_dataset_format(simple_harbour_points, alg, tmp_path):
+def test_unfolded_dataset_format(simple_harbour_points, tmp_path):
     map_config = get_map_config('harbours_config_with_unfolded_datasets.json')
-    alg.layer = simple_harbour_points
-    alg.output_directory = tmp_path
+    alg = create_alg(simple_harbour_points, tmp_path)
     status = alg.run()
     dataset = alg.result_dataset
     assert status, alg.exception
     assert dataset.to_dict() == map_config.datasets[0].to_dict()
+
+
+@pytest.fixture
+def small_partitions():
+    Settings.dataset_partition_size.set(2)
+    yield 2
+    Settings.dataset_partition_size.set(Settings.dataset_partition_size.value)
+
+
+@pytest.mark.parametrize('fid_ranges', [True, False])
+def test_csv_export_in_partitions(small_partitions, simple_harbour_points, tmp_path, fid_ranges):
+    alg = create_alg(simple_harbour_points, tmp_path)
+    if QThread.idealThreadCount() < 2:
+        pytest.skip('Partitioning requires at least two threads')
+    assert len(alg.partition_tasks) >= 2
+    assert alg.layer_to_partitions.fid_field == 'fid'
+    if not fid_ranges:
+        # Partitions of providers without a feature id field are read by their feature ids
+        alg.layer_to_partitions.fid_field = None
+
+    converted_csv_name, _ = alg._extract_all_data()
+
+    with open(plugin_test_data_path('harbours.csv'), encoding="utf-8") as f:
+        expected_data = f.readlines()
+    with open(tmp_path / converted_csv_name, encoding="utf-8") as f:
+        converted_data = f.readlines()
+    assert converted_data[0] == expected_data[0]
+    assert sorted(converted_data[1:]) == sorted(expected_data[1:])
+    assert not Path(alg.partition_dir.name).exists()
+
+
+@pytest.fixture
+def arrow_format():
+    pytest.importorskip('pyarrow')
+    Settings.dataset_format.set('arrow')
+    yield 'arrow'
+    Settings.dataset_format.set(Settings.dataset_format.value)
+
+
+@pytest.mark.parametrize('layer,expected_csv',
+                         [('simple_harbour_points', 'harbours.csv'), ('countries', 'naturalearth_countries.csv')])
+def test_arrow_export_with_output_dir(arrow_format, layer, expected_csv, tmp_path, request):
+    import pyarrow as pa
+
+    layer: QgsVectorLayer = request.getfixturevalue(layer)
+    alg = create_alg(layer, tmp_path)
+    converted_name, _ = alg._extract_all_data()
+
+    assert converted_name == Path(expected_csv).with_suffix('.arrow').name
+    with pa.memory_map(str(tmp_path / converted_name)) as source:
+        table = pa.ipc.open_file(source).read_all()
+    with open(plugin_test_data_path(expected_csv), newline='', encoding="utf-8") as f:
+        expected_rows = list(csv.reader(f))
+
+    assert table.column_names == expected_rows[0]
+    assert table.num_rows == len(expected_rows) - 1
+    if 'geometry' in table.column_names:
+        geometry_field = table.schema.field('geometry')
+        assert geometry_field.type == pa.binary()
+        assert geometry_field.metadata[b'ARROW:extension:name'] == b'geoarrow.wkb'
+        wkt = [QgsGeometry.fromWkb(wkb).asWkt(8) for wkb in table.column('geometry').to_pylist()]
+        assert wkt == [row[-1] for row in expected_rows[1:]]
+    else:
+        assert table.schema.field('longitude').type == pa.float64()
+        assert table.column('longitude').to_pylist() == pytest.approx([float(row[-2]) for row in expected_rows[1:]])
+        assert table.column('latitude').to_pylist() == pytest.approx([float(row[-1]) for row in expected_rows[1:]])
+
+
+@pytest.mark.parametrize('layer', ['lines', 'countries'])
+def test_simplification(layer, tmp_path, request):
+    layer: QgsVectorLayer = request.getfixturevalue(layer)
+    alg = LayerToDatasets(uuid.uuid4(), layer, (0, 92, 255), tmp_path, simplification_tolerance=0.1)
+    status = alg.run()
+    assert status, alg.exception
+
+    stats = GeometrySimplifier.merge(alg.simplifiers)
+    assert 0 < stats.vertices_after <= stats.vertices_before
+    assert 0 < stats.bytes_after <= stats.bytes_before
+    with open(tmp_path / alg.result_dataset.source, newline='', encoding="utf-8") as f:
+        rows = list(csv.reader(f))[1:]
+    assert len(rows) == layer.featureCount()
+    assert all(QgsGeometry.fromWkt(row[-1]).isGeosValid() for row in rows if row[-1])
+
+
+def test_simplification_is_not_applied_to_points(simple_harbour_points):
+    alg = LayerToDatasets(uuid.uuid4(), simple_harbour_points, (0, 92, 255), simplification_tolerance=0.1)
+    _, data = alg._extract_all_data()
+
+    assert data == get_map_config('harbours_config_point.json').datasets[0].data.all_data
+    assert not alg.simplifiers
+
+
+@pytest.fixture
+def coordinate_precision():
+    Settings.coordinate_precision.set(3)
+    yield 3
+
+
+@pytest.mark.parametrize('dataset_writer', ['native', 'gdal'])
+@pytest.mark.parametrize('layer', ['simple_harbour_points', 'simple_harbour_points_3067', 'countries'])
+def test_csv_export_with_coordinate_precision(coordinate_precision, layer, dataset_writer, tmp_path, request):
+    layer: QgsVectorLayer = request.getfixturevalue(layer)
+    alg = create_alg(layer, tmp_path)
+    alg.dataset_writer = dataset_writer
+    converted_csv_name, _ = alg._extract_all_data()
+
+    with open(tmp_path / converted_csv_name, newline='', encoding="utf-8") as f:
+        header, *rows = list(csv.reader(f))
+    if header[-1] == 'geometry':
+        numbers = [number for row in rows for number in re.findall(r'-?\d+\.?\d*', row[-1])]
+    else:
+        numbers = [number for row in rows for number in row[-2:]]
+    assert numbers
+    assert all(len(number.partition('.')[2]) <= coordinate_precision for number in numbers)
+
+
+@pytest.fixture
+def vectortranslate_writer():
+    pytest.importorskip('osgeo')
+    Settings.dataset_writer.set('vectortranslate')
+    yield 'vectortranslate'
+    Settings.dataset_writer.set(Settings.dataset_writer.value)
+
+
+def test_csv_export_with_vectortranslate(vectortranslate_writer, countries, tmp_path):
+    alg = create_alg(countries, tmp_path)
+    assert alg.pushdown is not None
+    assert not alg.partition_tasks
+    converted_csv_name, _ = alg._extract_all_data()
+
+    with open(plugin_test_data_path('naturalearth_countries.csv'), newline='', encoding="utf-8") as f:
+        expected_header, *expected_rows = list(csv.reader(f))
+    with open(tmp_path / converted_csv_name, newline='', encoding="utf-8") as f:
+        header, *rows = list(csv.reader(f))
+    assert header == [field.name() for field in alg._get_exported_fields()]
+    assert sorted(header) == sorted(expected_header)
+    assert len(rows) == len(expected_rows)
+
+
+@pytest.mark.parametrize('layer', ['simple_harbour_points', 'memory_points'])
+def test_vectortranslate_falls_back_to_native_writer(vectortranslate_writer, layer, tmp_path, request):
+    # Harbours have boolean and datetime fields that GDAL formats differently
+    layer = (QgsVectorLayer('Point?crs=EPSG:4326&field=name:string', 'points', 'memory') if layer == 'memory_points'
+             else request.getfixturevalue(layer))
+    alg = create_alg(layer, tmp_path)
+    assert alg.pushdown is None
+    assert isinstance(alg._create_writer(alg.source, alg.request), CsvDatasetWriter)
+
+
+def test_csv_export_with_extent(simple_harbour_points, tmp_path):
+    alg = LayerToDatasets(uuid.uuid4(), simple_harbour_points, (0, 92, 255), tmp_path,
+                          extent=QgsRectangle(20.0, 59.0, 24.0, 62.0))
+    converted_csv_name, _ = alg._extract_all_data()
+
+    with open(tmp_path / converted_csv_name, newline='', encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 11
+    assert all(float(row['longitude']) < 24.0 for row in rows)
+
+
+def test_csv_export_with_clipped_extent(countries, tmp_path):
+    extent = QgsRectangle(20.0, 59.0, 24.0, 62.0)
+    alg = LayerToDatasets(uuid.uuid4(), countries, (0, 92, 255), tmp_path, extent=extent, clip_to_extent=True)
+    converted_csv_name, _ = alg._extract_all_data()
+
+    with open(tmp_path / converted_csv_name, newline='', encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert rows
+    for row in rows:
+        bounds = QgsGeometry.fromWkt(row['geometry']).boundingBox()
+        assert extent.buffered(1e-6).contains(bounds)
+
+
+def test_vectortranslate_uses_crs_of_layer(vectortranslate_writer, countries, tmp_path):
+    countries.setCrs(QgsCoordinateReferenceSystem('EPSG:3067'))
+    alg = create_alg(countries, tmp_path)
+    assert alg.pushdown.source_crs == countries.crs().toWkt()
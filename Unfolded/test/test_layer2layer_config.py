@@ -21,7 +21,7 @@ import uuid
 import pytest
 from qgis.core import QgsVectorLayer, QgsSymbolLayerUtils
 
-from .conftest import get_map_config
+from .conftest import get_map_config, set_styles
 from ..core.exceptions import InvalidInputException
 from ..core.processing.layer2layer_config import LayerToLayerConfig
 
@@ -60,6 +60,15 @@ def test__extract_layer_with_invalid_size_units(layer, request):
     assert "Size unit" in str(execinfo)
 
 
+def test_layer_config_is_extracted_from_snapshot(simple_harbour_points):
+    alg = LayerToLayerConfig(uuid.UUID('7d193484-21a7-47f4-8cbc-497474a39b64'), simple_harbour_points)
+    set_styles(simple_harbour_points, 'harbours_categorized.qml')
+
+    map_config = get_map_config('harbours_config_point.json')
+    layer_conf = alg._extract_layer()
+    assert layer_conf.to_dict() == map_config.config.config.vis_state.layers[0].to_dict()
+
+
 def test_12():
     utils = QgsSymbolLayerUtils()
     utils.decodeSldUom('')
@@ -0,0 +1,74 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import zipfile
+from zipfile import ZipFile
+
+import pytest
+
+from ..core.map_archive_reader import MapArchiveReader
+from ..qgis_plugin_tools.tools.resources import plugin_test_data_path
+
+
+def create_archive(path, config_name, compression, dataset_files=()):
+    with ZipFile(path, 'w', compression) as zip_file:
+        zip_file.write(plugin_test_data_path('config', config_name), 'config.json')
+        for dataset_file in dataset_files:
+            zip_file.write(plugin_test_data_path(dataset_file), dataset_file)
+    return path
+
+
+@pytest.mark.parametrize('compression', [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_iter_csv_rows(tmp_path, compression):
+    path = create_archive(tmp_path / 'map.zip', 'harbours_config_with_unfolded_datasets.json', compression,
+                          ['harbours.csv'])
+    with MapArchiveReader(path) as reader:
+        dataset = reader.get_dataset('harbours')
+        batches = list(reader.iter_rows(dataset, batch_size=5))
+
+    assert [len(batch) for batch in batches] == [5, 5, 5, 1]
+    assert batches[0][0] == [1, 'Eurajoki', 85920, 213262, '2021/01/26', '2021/01/26 10:05:56', True, 21.48781,
+                             61.24682]
+
+
+def test_iter_csv_rows_of_selected_fields(tmp_path):
+    path = create_archive(tmp_path / 'map.zip', 'harbours_config_with_unfolded_datasets.json', zipfile.ZIP_STORED,
+                          ['harbours.csv'])
+    with MapArchiveReader(path) as reader:
+        rows = next(reader.iter_rows(reader.get_dataset('harbours'), ['nimi', 'tonnia_vienti']))
+
+    assert rows[:2] == [['Eurajoki', 85920], ['Forby', 10516]]
+
+
+def test_iter_embedded_rows(tmp_path):
+    path = create_archive(tmp_path / 'map.zip', 'harbours_config.json', zipfile.ZIP_DEFLATED)
+    with MapArchiveReader(path) as reader:
+        batches = list(reader.iter_rows(reader.datasets[0], ['fid', 'nimi'], batch_size=10))
+
+    assert [len(batch) for batch in batches] == [10, 6]
+    assert batches[0][:2] == [[1, 'Eurajoki'], [2, 'Forby']]
+
+
+def test_dataset_is_read_only_when_iterated(tmp_path):
+    path = create_archive(tmp_path / 'map.zip', 'harbours_config_with_unfolded_datasets.json', zipfile.ZIP_DEFLATED)
+    with MapArchiveReader(path) as reader:
+        assert reader.get_dataset('harbours').source == 'harbours.csv'
+        with pytest.raises(KeyError):
+            next(reader.iter_rows(reader.get_dataset('harbours')))
+        with pytest.raises(KeyError):
+            reader.get_dataset('missing')
@@ -16,9 +16,13 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import io
 import json
 
+import pytest
+
 from ..model.map_config import MapConfig
+from ..model.map_config_writer import write_map_config
 from ..qgis_plugin_tools.tools.resources import plugin_test_data_path
 
 
@@ -70,3 +74,14 @@ def test_unfolded_config_format():
         map_config_dict = json.load(f)
     map_config = MapConfig.from_dict(map_config_dict)
     assert map_config.to_dict() == map_config_dict
+
+
+@pytest.mark.parametrize('config_file', ['harbours_config_point.json', 'lines_config.json',
+                                         'harbours_config_with_unfolded_datasets.json'])
+@pytest.mark.parametrize('batch_size', [1, 2, 10000])
+def test_write_map_config(config_file, batch_size):
+    with open(plugin_test_data_path('config', config_file)) as f:
+        map_config = MapConfig.from_dict(json.load(f))
+    output = io.BytesIO()
+    write_map_config(map_config, output, batch_size)
+    assert output.getvalue().decode('utf-8') == json.dumps(map_config.to_dict())
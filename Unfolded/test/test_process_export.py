@@ -0,0 +1,67 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+import uuid
+
+import pytest
+from PyQt5.QtCore import QVariant
+from qgis.core import QgsVectorLayer, QgsField, QgsCoordinateReferenceSystem
+
+from ..core.processing.process_export import ProcessExporter, ProcessLayerToDatasets
+from ..qgis_plugin_tools.tools.resources import plugin_test_data_path
+
+
+@pytest.fixture
+def exporter():
+    if not ProcessExporter.is_available():
+        pytest.skip('Python interpreter for the worker processes was not found')
+    exporter = ProcessExporter(1)
+    yield exporter
+    exporter.shutdown()
+
+
+def test_only_unedited_file_layers_are_supported(harbour_points):
+    assert ProcessExporter.supports(harbour_points)
+    assert not ProcessExporter.supports(QgsVectorLayer('Point?crs=EPSG:4326', 'points', 'memory'))
+
+    harbour_points.startEditing()
+    try:
+        assert not ProcessExporter.supports(harbour_points)
+    finally:
+        harbour_points.rollBack()
+
+
+def test_layers_with_fields_or_crs_set_in_qgis_are_not_supported(harbour_points):
+    harbour_points.addExpressionField('"nimi" || \'!\'', QgsField('virtual', QVariant.String))
+    assert not ProcessExporter.supports(harbour_points)
+    harbour_points.removeExpressionField(harbour_points.fields().indexOf('virtual'))
+    assert ProcessExporter.supports(harbour_points)
+
+    harbour_points.setCrs(QgsCoordinateReferenceSystem('EPSG:3067'))
+    assert not ProcessExporter.supports(harbour_points)
+
+
+def test_dataset_is_written_in_worker_process(exporter, simple_harbour_points, tmp_path):
+    alg = ProcessLayerToDatasets(uuid.UUID('7d193484-21a7-47f4-8cbc-497474a39b64'), simple_harbour_points,
+                                 (0, 92, 255), exporter, tmp_path)
+
+    assert alg.run(), alg.exception
+    assert alg.feedback.processed_features == simple_harbour_points.featureCount()
+    with open(plugin_test_data_path('harbours.csv'), encoding='utf-8') as f:
+        expected_data = f.read()
+    assert (tmp_path / alg.result_dataset.source).read_text(encoding='utf-8') == expected_data
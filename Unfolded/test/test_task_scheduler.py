@@ -0,0 +1,94 @@
+#  Gispo Ltd., hereby disclaims all copyright interest in the program Unfolded QGIS plugin
+#  Copyright (C) 2021 Gispo Ltd (https://www.gispo.fi/).
+#
+#
+#  This file is part of Unfolded QGIS plugin.
+#
+#  Unfolded QGIS plugin is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  Unfolded QGIS plugin is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Unfolded QGIS plugin.  If not, see <https://www.gnu.org/licenses/old-licenses/gpl-2.0.en.html>.
+from unittest.mock import MagicMock
+
+from ..core.processing.task_scheduler import TaskScheduler
+
+MB = 1024 * 1024
+
+
+def create_task(name):
+    task = MagicMock()
+    task.description.return_value = name
+    return task
+
+
+def submitted_names(submit):
+    return [call.args[0].description() for call in submit.call_args_list]
+
+
+def test_style_tasks_are_submitted_first():
+    submit = MagicMock()
+    scheduler = TaskScheduler(submit)
+    style_tasks = [create_task('style 1'), create_task('style 2')]
+    scheduler.add_dataset_task(create_task('data'), MB)
+    for task in style_tasks:
+        scheduler.add_style_task(task)
+    scheduler.start()
+    assert submitted_names(submit) == ['style 1', 'style 2']
+
+    scheduler.task_finished(style_tasks[0])
+    assert submitted_names(submit) == ['style 1', 'style 2']
+    scheduler.task_finished(style_tasks[1])
+    assert submitted_names(submit) == ['style 1', 'style 2', 'data']
+
+
+def test_cheapest_dataset_tasks_are_submitted_first():
+    submit = MagicMock()
+    scheduler = TaskScheduler(submit, max_running=2)
+    tasks = {name: create_task(name) for name in ('large', 'small', 'medium')}
+    scheduler.add_dataset_task(tasks['large'], 100 * MB)
+    scheduler.add_dataset_task(tasks['small'], MB)
+    scheduler.add_dataset_task(tasks['medium'], 10 * MB)
+    scheduler.start()
+    assert submitted_names(submit) == ['small', 'medium']
+
+    scheduler.task_finished(tasks['medium'])
+    assert submitted_names(submit) == ['small', 'medium', 'large']
+
+
+def test_memory_budget():
+    submit = MagicMock()
+    scheduler = TaskScheduler(submit, memory_budget=100 * MB)
+    tasks = [create_task(str(i)) for i in range(3)]
+    scheduler.add_dataset_task(tasks[0], 60 * MB)
+    scheduler.add_dataset_task(tasks[1], 60 * MB)
+    scheduler.add_dataset_task(tasks[2], 200 * MB)
+    scheduler.start()
+    assert submitted_names(submit) == ['0']
+
+    scheduler.task_finished(tasks[0])
+    assert submitted_names(submit) == ['0', '1']
+
+    # Task exceeding the budget runs alone
+    scheduler.task_finished(tasks[1])
+    assert submitted_names(submit) == ['0', '1', '2']
+
+
+def test_cancel_queued():
+    submit = MagicMock()
+    scheduler = TaskScheduler(submit, max_running=1)
+    tasks = [create_task(str(i)) for i in range(3)]
+    for task in tasks:
+        scheduler.add_dataset_task(task, MB)
+    scheduler.start()
+
+    assert scheduler.cancel_queued() == tasks[1:]
+    scheduler.task_finished(tasks[0])
+    assert submitted_names(submit) == ['0']
@@ -33,6 +33,7 @@ from .base_panel import BasePanel
 from .progress_dialog import ProgressDialog
 from ..core.config_creator import ConfigCreator
 from ..core.exceptions import ExportException
+from ..core.processing.dataset_writer import ARROW_AVAILABLE
 from ..core.layer_handler import LayerHandler
 from ..core.utils import generate_zoom_level, random_color, get_canvas_center
 from ..definitions.gui import Panels
@@ -59,6 +60,43 @@ class ExportPanel(BasePanel):
         # Map configuration
         self.dlg.input_title.setText(QgsProject.instance().baseName())
 
+        # Datasets
+        cb_dataset_format: QComboBox = self.dlg.cb_dataset_format
+        cb_dataset_format.clear()
+        cb_dataset_format.addItems([dataset_format for dataset_format in Settings.dataset_format.get_options()
+                                    if dataset_format != 'arrow' or ARROW_AVAILABLE])
+        cb_dataset_format.setCurrentText(Settings.dataset_format.get())
+        cb_dataset_format.currentTextChanged.connect(Settings.dataset_format.set)
+
+        cb_simplification: QComboBox = self.dlg.cb_simplification
+        cb_simplification.clear()
+        cb_simplification.addItems(Settings.simplification.get_options())
+        cb_simplification.setCurrentText(Settings.simplification.get())
+        cb_simplification.currentTextChanged.connect(self.__simplification_changed)
+        self.dlg.sb_simplification_tolerance.setValue(Settings.simplification_tolerance.get())
+        self.dlg.sb_simplification_tolerance.valueChanged.connect(Settings.simplification_tolerance.set)
+        self.__simplification_changed(cb_simplification.currentText())
+
+        cb_attribute_projection: QComboBox = self.dlg.cb_attribute_projection
+        cb_attribute_projection.clear()
+        cb_attribute_projection.addItems(Settings.attribute_projection.get_options())
+        cb_attribute_projection.setCurrentText(Settings.attribute_projection.get())
+        cb_attribute_projection.currentTextChanged.connect(Settings.attribute_projection.set)
+
+        self.dlg.sb_coordinate_precision.setValue(Settings.coordinate_precision.get())
+        self.dlg.sb_coordinate_precision.valueChanged.connect(Settings.coordinate_precision.set)
+
+        canvas: QgsMapCanvas = iface.mapCanvas()
+        crs = canvas.mapSettings().destinationCrs()
+        self.dlg.extent_widget.setMapCanvas(canvas)
+        self.dlg.extent_widget.setOriginalExtent(canvas.extent(), crs)
+        self.dlg.extent_widget.setCurrentExtent(canvas.extent(), crs)
+        self.dlg.extent_widget.setOutputCrs(crs)
+        # Dialog is hidden while the extent is drawn on the canvas
+        self.dlg.extent_widget.toggleDialogVisibility.connect(self.dlg.setVisible)
+        self.dlg.cb_extent.toggled.connect(self.__extent_toggled)
+        self.__extent_toggled(self.dlg.cb_extent.isChecked())
+
         # Visualization state
         cb_layer_blending: QComboBox = self.dlg.cb_layer_blending
         cb_layer_blending.clear()
@@ -78,6 +116,7 @@ class ExportPanel(BasePanel):
 
         # Export button
         self.dlg.btn_export.clicked.connect(self.run)
+        self.dlg.btn_export_styles.clicked.connect(lambda _: self.run('_run_style_only'))
 
         # Studio button
         self.dlg.btn_open_studio.setIcon(QIcon(resources_path('icons', 'icon.svg')))
@@ -90,6 +129,14 @@ class ExportPanel(BasePanel):
         # Setup dynamic contents
         self.__refreshed()
 
+    def __simplification_changed(self, simplification: str):
+        Settings.simplification.set(simplification)
+        self.dlg.sb_simplification_tolerance.setEnabled(simplification == 'tolerance')
+
+    def __extent_toggled(self, checked: bool):
+        self.dlg.extent_widget.setEnabled(checked)
+        self.dlg.cb_clip_to_extent.setEnabled(checked)
+
     def __refreshed(self):
         """ Set up dynamic contents """
         self.__setup_layers_to_export()
@@ -154,7 +201,11 @@ class ExportPanel(BasePanel):
 
         return layers_with_visibility
 
-    def _run(self):
+    def _run_style_only(self):
+        """ Exports map to configuration reusing the datasets of the previous export """
+        self._run(style_only=True)
+
+    def _run(self, style_only: bool = False):
         """ Exports map to configuration """
         title = self.dlg.input_title.text()
         description = self.dlg.input_description.toPlainText()
@@ -178,18 +229,15 @@ class ExportPanel(BasePanel):
         # Vis state
         layer_blending = self.dlg.cb_layer_blending.currentText()
 
-        self.progress_dialog = ProgressDialog(len(layers_with_visibility) * 2, self.dlg)
-        self.progress_dialog.show()
-        self.progress_dialog.aborted.connect(self.__aborted)
-
         self.config_creator = ConfigCreator(title, description, output_dir)
-        self.config_creator.completed.connect(self.__completed)
-        self.config_creator.canceled.connect(self.__aborted)
-        self.config_creator.tasks_complete.connect(
-            lambda: self.progress_dialog.status_label.setText(tr("Writing config file to the disk...")))
-        self.config_creator.progress_bar_changed.connect(self.__progress_bar_changed)
+        if style_only:
+            self.config_creator.set_base_configuration(self.config_creator.created_configuration_path)
+
         self.config_creator.set_map_style(basemap)
         self.config_creator.set_map_state(center, zoom)
+        if self.dlg.cb_extent.isChecked():
+            self.config_creator.set_extent(self.dlg.extent_widget.outputExtent(), self.dlg.extent_widget.outputCrs(),
+                                           self.dlg.cb_clip_to_extent.isChecked())
         self.config_creator.set_animation_config(None, 1)
         self.config_creator.set_vis_state_values(layer_blending)
         self.config_creator.set_interaction_config_values(tooltip_enabled, brush_enabled, geocoder_enabled,
@@ -199,11 +247,21 @@ class ExportPanel(BasePanel):
             layer, is_visible = layer_info
             self.config_creator.add_layer(uuid.uuid4(), layer, random_color(), is_visible)
 
+        self.progress_dialog = ProgressDialog(len(self.config_creator.tasks), self.dlg)
+        self.progress_dialog.show()
+        self.progress_dialog.aborted.connect(self.__aborted)
+
+        self.config_creator.completed.connect(self.__completed)
+        self.config_creator.canceled.connect(self.__aborted)
+        self.config_creator.tasks_complete.connect(
+            lambda: self.progress_dialog.status_label.setText(tr("Writing config file to the disk...")))
+        self.config_creator.progress_bar_changed.connect(self.__progress_bar_changed)
+
         self.config_creator.start_config_creation()
 
-    def __progress_bar_changed(self, i: int, progress: int):
+    def __progress_bar_changed(self, i: int, progress: int, status: str):
         if self.progress_dialog:
-            self.progress_dialog.update_progress_bar(i, progress)
+            self.progress_dialog.update_progress_bar(i, progress, status)
 
     def __aborted(self):
         if self.config_creator:
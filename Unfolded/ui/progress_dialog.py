@@ -38,6 +38,7 @@ class ProgressDialog(QDialog, FORM_CLASS):
         QDialog.__init__(self, parent)
         self.setupUi(self)
         self.progress_per_tasks = [0] * number_of_tasks
+        self.status_per_tasks = [''] * number_of_tasks
         self.progress_bar: QProgressBar = self.progress_bar
         self.status_label: QLabel = self.status_label
 
@@ -46,10 +47,12 @@ class ProgressDialog(QDialog, FORM_CLASS):
         # noinspection PyUnresolvedReferences
         self.aborted.emit()
 
-    def update_progress_bar(self, task_number: int, progress: int):
-        """ Update progress bar with progress of a task """
+    def update_progress_bar(self, task_number: int, progress: int, status: str = ''):
+        """ Update progress bar with progress of a task and show the statuses of the running tasks """
         self.progress_per_tasks[task_number] = progress
+        self.status_per_tasks[task_number] = status if progress < 100 else ''
         self._update_progress_bar()
+        self.status_label.setText('\n'.join(status for status in self.status_per_tasks if status))
 
     def _update_progress_bar(self):
         self.progress_bar.setValue(min(97, int(sum(self.progress_per_tasks) / len(self.progress_per_tasks))))
@@ -60,6 +60,13 @@ class SettingsPanel(BasePanel):
         f_conf_output.setFilePath(Settings.conf_output_dir.get())
         f_conf_output.fileChanged.connect(self.__conf_output_dir_changed)
 
+        # Dataset cache
+        f_dataset_cache_dir: QgsFileWidget = self.dlg.f_dataset_cache_dir
+        f_dataset_cache_dir.setFilePath(Settings.dataset_cache_dir.get())
+        f_dataset_cache_dir.fileChanged.connect(self.__dataset_cache_dir_changed)
+        self.dlg.sb_dataset_cache_size.setValue(Settings.dataset_cache_size.get())
+        self.dlg.sb_dataset_cache_size.valueChanged.connect(Settings.dataset_cache_size.set)
+
         # Logging
         self.dlg.combo_box_log_level_file.clear()
         self.dlg.combo_box_log_level_console.clear()
@@ -87,6 +94,10 @@ class SettingsPanel(BasePanel):
         if new_dir:
             Settings.conf_output_dir.set(new_dir)
 
+    def __dataset_cache_dir_changed(self, new_dir: str):
+        if new_dir:
+            Settings.dataset_cache_dir.set(new_dir)
+
     def __mapbox_token_changed(self, new_token: str):
         if new_token:
             Settings.mapbox_api_token.set(new_token)